@@ -0,0 +1,90 @@
+"""Compare the throughput of ParserPDB and ParserCIF on equivalent structures.
+
+The structures are built by tiling the atoms of a template PDB file until reaching the requested size,
+and writing them both as PDB and as mmCIF ('_atom_site' loop). Usage:
+
+    python benchmarks/bench_parsers.py [--template testdata/1akx.pdb] [--mbytes 100] [--repeat 3] [--dir /tmp]
+"""
+import argparse
+import time
+from pathlib import Path
+
+import molprisma as mp
+
+TAGS_ATOM_SITE = (
+    "group_PDB", "id", "type_symbol", "label_atom_id", "label_alt_id", "label_comp_id", "label_asym_id",
+    "label_entity_id", "label_seq_id", "pdbx_PDB_ins_code", "Cartn_x", "Cartn_y", "Cartn_z", "occupancy",
+    "B_iso_or_equiv", "pdbx_formal_charge", "auth_seq_id", "auth_comp_id", "auth_asym_id", "auth_atom_id",
+    "pdbx_PDB_model_num",
+)
+
+# ------------------------------------------------------------------------------
+def to_cif_row(line: str, serial: int) -> str:
+    def field(start, end, quote = False):
+        value = line[start:end].strip()
+        if not value: return '?'
+        if quote and ("'" in value): return f'"{value}"'
+        return value
+
+    atom_name = field(12, 16, quote = True)
+    return ' '.join((
+        line[:6].strip(), str(serial), field(76, 78), atom_name, field(16, 17).replace('?', '.'),
+        field(17, 20), field(21, 22), '1', field(22, 26), field(26, 27), field(30, 38), field(38, 46),
+        field(46, 54), field(54, 60), field(60, 66), field(78, 80), field(22, 26), field(17, 20),
+        field(21, 22), atom_name, '1',
+    ))
+
+# ------------------------------------------------------------------------------
+def write_structures(path_template: Path, nbytes: int, folder: Path) -> tuple[Path, Path]:
+    atoms = [
+        line.ljust(80) for line in path_template.read_text().splitlines()
+        if line.startswith(("ATOM", "HETATM"))
+    ]
+    path_pdb = folder / f"bench_{nbytes >> 20}MB.pdb"
+    path_cif = folder / f"bench_{nbytes >> 20}MB.cif"
+    with open(path_pdb, 'w') as file_pdb, open(path_cif, 'w') as file_cif:
+        file_cif.write("data_BENCH\n#\nloop_\n" + ''.join(f"_atom_site.{tag}\n" for tag in TAGS_ATOM_SITE))
+        serial = 0
+        while file_cif.tell() < nbytes:
+            block_pdb, block_cif = [], []
+            for line in atoms:
+                serial += 1
+                block_pdb.append(f"{line[:6]}{serial % 100000:5d}{line[11:]}\n")
+                block_cif.append(to_cif_row(line, serial) + '\n')
+            file_pdb.write(''.join(block_pdb))
+            file_cif.write(''.join(block_cif))
+        file_pdb.write("END\n")
+        file_cif.write("#\n")
+    return path_pdb, path_cif
+
+# ------------------------------------------------------------------------------
+def bench(parser_class, path: Path, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser_class(path, cache = False).parse()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# ------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--template", type = Path, default = Path(__file__).parent.parent / "testdata" / "1akx.pdb")
+    parser.add_argument("--mbytes", type = int, default = 100, help = "approximate size of the mmCIF file")
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--dir", type = Path, default = Path("/tmp"))
+    args = parser.parse_args()
+
+    path_pdb, path_cif = write_structures(args.template, args.mbytes << 20, args.dir)
+    for parser_class, path in ((mp.ParserPDB, path_pdb), (mp.ParserCIF, path_cif)):
+        seconds = bench(parser_class, path, args.repeat)
+        mbytes = path.stat().st_size / (1 << 20)
+        print(f"{parser_class.__name__:10} {mbytes:8.1f} MB {seconds:8.2f} s {mbytes / seconds:8.1f} MB/s")
+
+
+################################################################################
+if __name__ == "__main__":
+    main()
+
+
+################################################################################
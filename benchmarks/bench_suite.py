@@ -0,0 +1,194 @@
+"""Time the hot paths of MolPrisma on synthetic PDB files, and compare the results against a stored baseline.
+
+Each size in --nlines gets a synthetic file (see generate_pdb.py, cached in --dir), on which these operations are timed:
+    parse                   ParserPDB.parse
+    parse/cached            ParserPDB.parse, loading the MolCache entry stored by a previous parse (in a temporary cache directory)
+    init_filters            MolData.init_filters
+    count_lines/<state>     MolData.count_lines right after switching to a filter state (i.e. rebuilding the visible rows)
+    iter_lines/<state>      MolData.iter_lines of one screen of rows (not decoded yet), in the middle of the visible ones
+    iter_lines/filterkey    MolData.iter_lines of one screen of rows, through the per-row MolData.match_filters
+    get_attr_array          TUIMolPrisma._get_attr_array of one screen of rows (with its templates cache emptied)
+    frame/full              a whole frame of TUIMolPrisma, rendered to a headless backend
+    frame/scroll            a frame after scrolling down one row
+
+The best time of --repeat runs is written as JSON to --output. When the --baseline file exists, any operation slower
+than its baseline by more than --tolerance (and by more than --min-seconds) is reported and the exit code is 1. Usage:
+
+    python benchmarks/bench_suite.py [--nlines 10000 100000 1000000] [--repeat 3] [--output results.json]
+    python benchmarks/bench_suite.py --save-baseline # store the results as the new baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import prismatui as pr
+
+import molprisma as mp
+from generate_pdb import write_pdb
+
+PATH_BASELINE = Path(__file__).parent / "baseline.json"
+H_SCREEN = 50
+W_SCREEN = 200
+STATES_FILTERS = { # name: (kinds hidden, filter keys and how many times they are cycled)
+    "all"     : ((), {}),
+    "no_meta" : ((mp.MolKind.META,), {}),
+    "chain"   : ((mp.MolKind.META,), {"[c]hain": 1}),
+    "altloc"  : ((mp.MolKind.META,), {"alt[l]oc": 2}),
+    "combined": ((mp.MolKind.META,), {"[c]hain": 2, "[r]esname": 1, "[a]tomname": 1}),
+}
+
+# //////////////////////////////////////////////////////////////////////////////
+class NullBackend(pr.Backend):
+    """Headless prismatui backend: frames are fully rendered, but written nowhere"""
+    def __init__(self, h: int, w: int):
+        super().__init__()
+        self.h, self.w = h, w
+
+    def set_nodelay(self, boolean): pass
+    def sleep(self, ms): pass
+    def write_text(self, y, x, chars, attr = 0): pass
+    def get_size(self, update = False): return self.h, self.w
+    def supports_color(self): return False
+    def init_color(self, i, r, g, b): pass
+    def init_pair(self, i, fg, bg): pass
+    def get_color_pair(self, i): return i << 8
+    def resize(self, h, w): pass
+    def strong_reset(self): pass
+    def _start(self): pass
+    def _end(self): pass
+    def _refresh(self): pass
+    def _get_key(self): return -1
+
+
+# ------------------------------------------------------------------------------
+def timeit(func: callable, repeat: int, setup: callable = lambda: None) -> float:
+    """Best time of 'repeat' calls to 'func', each one preceded by an (untimed) call to 'setup'"""
+    best = float("inf")
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# ------------------------------------------------------------------------------
+def set_filters_state(mol: mp.MolData, name: str):
+    kinds_hidden, presses = STATES_FILTERS[name]
+    mol.reset_filter_idxs()
+    for kind in (mp.MolKind.META, mp.MolKind.ATOM, mp.MolKind.HETE):
+        mol.set_kind_shown(kind, kind not in kinds_hidden)
+    for key,n in presses.items():
+        for _ in range(n): mol.next_filter(key)
+    mol.current_line = 0
+
+# ------------------------------------------------------------------------------
+def make_tui(mol: mp.MolData) -> mp.TUIMolPrisma:
+    pr.set_backend(NullBackend(H_SCREEN, W_SCREEN))
+    tui = mp.TUIMolPrisma(mol)
+    tui._on_start()
+    tui._on_resize()
+    return tui
+
+# ------------------------------------------------------------------------------
+def bench_file(path: Path, repeat: int) -> dict[str, float]:
+    timings = {}
+    timings["parse"] = timeit(lambda: mp.ParserPDB(path, cache = False).parse(), repeat)
+    with tempfile.TemporaryDirectory() as dir_cache, mock.patch.dict(os.environ, {"MOLPRISMA_CACHE_DIR": dir_cache}):
+        mp.ParserPDB(path, cache = True).parse()
+        timings["parse/cached"] = timeit(lambda: mp.ParserPDB(path, cache = True).parse(), repeat)
+
+    mol = mp.ParserPDB(path, cache = False).parse()
+    timings["init_filters"] = timeit(mol.init_filters, repeat)
+
+    nlines = H_SCREEN - 2 - mp.TUIMolPrisma.H_GUIDES
+    for name in STATES_FILTERS:
+        def setup(): # start from another state, so the visible rows must be rebuilt
+            set_filters_state(mol, "all" if name != "all" else "no_meta")
+            mol.count_lines()
+            set_filters_state(mol, name)
+        timings[f"count_lines/{name}"] = timeit(mol.count_lines, repeat, setup)
+        mol.current_line = mol.count_lines() // 2
+        timings[f"iter_lines/{name}"] = timeit(lambda: list(mol.iter_lines(nlines = nlines)), repeat, mol._buffer._windows.clear)
+
+    set_filters_state(mol, "altloc")
+    timings["iter_lines/filterkey"] = timeit(lambda: list(mol.iter_lines(mol.match_filters, nlines)), repeat, mol._buffer._windows.clear)
+
+    set_filters_state(mol, "all")
+    tui = make_tui(mol)
+    lines = list(mol.iter_lines(nlines = nlines))
+    timings["get_attr_array"] = timeit(lambda: [tui._get_attr_array(line) for line in lines], repeat, tui._attr_rows.clear)
+    timings["frame/full"] = timeit(tui._on_update, repeat, tui.on_resize)
+    def setup(): tui._keys = [pr.KEY_DOWN] # read by the previous frame, see TUIMolPrisma._read_keys
+    line = mol.current_line
+    timings["frame/scroll"] = timeit(tui._on_update, repeat, setup)
+    assert mol.current_line == line + repeat, "the scrolling frames didn't scroll"
+    return timings
+
+# ------------------------------------------------------------------------------
+def compare(results: dict, baseline: dict, tolerance: float, min_seconds: float) -> list[str]:
+    """Return a description of every timing of 'results' that regressed with respect to 'baseline'"""
+    regressions = []
+    for size,timings in results["timings"].items():
+        for op,seconds in timings.items():
+            seconds_base = baseline["timings"].get(size, {}).get(op, None)
+            if seconds_base is None: continue
+            if seconds > seconds_base * tolerance and seconds - seconds_base > min_seconds:
+                regressions.append(f"{op} ({size} lines): {seconds_base:.4f} s -> {seconds:.4f} s ({seconds / seconds_base:.2f}x)")
+    return regressions
+
+# ------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nlines", type = int, nargs = '+', default = [10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--dir", type = Path, default = Path("/tmp"), help = "where the synthetic files are cached")
+    parser.add_argument("--output", type = Path, default = None)
+    parser.add_argument("--baseline", type = Path, default = PATH_BASELINE)
+    parser.add_argument("--save-baseline", action = "store_true")
+    parser.add_argument("--tolerance", type = float, default = 1.25, help = "slowdown ratio reported as a regression")
+    parser.add_argument("--min-seconds", type = float, default = 0.002, help = "ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "system": platform.system(),
+            "repeat": args.repeat, "seed": args.seed,
+        },
+        "timings": {},
+    }
+    for nlines in args.nlines:
+        path = args.dir / f"synthetic_{nlines}_{args.seed}.pdb"
+        if not path.exists(): write_pdb(path, nlines, args.seed)
+        timings = bench_file(path, args.repeat)
+        results["timings"][str(nlines)] = timings
+        for op,seconds in timings.items():
+            print(f"{nlines:>10} {op:24} {seconds * 1000:10.2f} ms")
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent = 4))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent = 4))
+        return
+
+    if not args.baseline.exists(): return
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance, args.min_seconds)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions: sys.exit(1)
+
+
+################################################################################
+if __name__ == "__main__":
+    main()
+
+
+################################################################################
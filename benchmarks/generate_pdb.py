@@ -0,0 +1,116 @@
+"""Deterministic generator of synthetic PDB files of arbitrary size, for benchmarking.
+
+The structures are made of many chains of residues (with a few alternate locations), ligands and waters as HETATM rows,
+and metadata rows (header, remarks, TER, CONECT...), so every row kind and filter gets exercised. Usage:
+
+    python benchmarks/generate_pdb.py output.pdb [--nlines 1000000] [--seed 0]
+"""
+import argparse
+import random
+from itertools import islice
+from pathlib import Path
+
+CHAIN_IDS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+RESIDUES = {
+    "ALA": ("N", "CA", "C", "O", "CB"),
+    "GLY": ("N", "CA", "C", "O"),
+    "SER": ("N", "CA", "C", "O", "CB", "OG"),
+    "LEU": ("N", "CA", "C", "O", "CB", "CG", "CD1", "CD2"),
+    "LYS": ("N", "CA", "C", "O", "CB", "CG", "CD", "CE", "NZ"),
+    "ASP": ("N", "CA", "C", "O", "CB", "CG", "OD1", "OD2"),
+    "PHE": ("N", "CA", "C", "O", "CB", "CG", "CD1", "CD2", "CE1", "CE2", "CZ"),
+    "MET": ("N", "CA", "C", "O", "CB", "CG", "SD", "CE"),
+}
+LIGANDS = {
+    "HEM": ("FE", "NA", "NB", "NC", "ND", "C1A", "C2A", "C3A", "C4A", "CMA"),
+    "SO4": ("S", "O1", "O2", "O3", "O4"),
+    "MG":  ("MG",),
+}
+ELEMENTS_TWO_LETTERS = ("FE", "MG")
+NRESIDUES_CHAIN = (50, 400)
+PROB_ALTLOC = 0.03
+PROB_INSERTION = 0.01
+NLIGANDS_CHAIN = (0, 3)
+NWATERS_CHAIN = (0, 40)
+
+# ------------------------------------------------------------------------------
+def format_atom(group: str, serial: int, name: str, altloc: str, resname: str, chain: str, resseq: int,
+    icode: str, xyz: tuple[float, float, float], occupancy: float, bfactor: float, element: str
+) -> str:
+    name = name if len(name) == 4 else f" {name:<3}"
+    x, y, z = xyz
+    return (
+        f"{group:<6}{serial % 100000:5d} {name:<4}{altloc:1}{resname:>3} {chain:1}{resseq % 10000:4d}{icode:1}   "
+        f"{x:8.3f}{y:8.3f}{z:8.3f}{occupancy:6.2f}{bfactor:6.2f}          {element:>2}  \n"
+    )
+
+# ------------------------------------------------------------------------------
+def iter_rows(seed: int = 0):
+    """Endlessly yield the rows of a synthetic structure, always the same ones for a given 'seed'"""
+    rng = random.Random(seed)
+    yield "HEADER    SYNTHETIC STRUCTURE                     01-JAN-00   XXXX              \n"
+    yield "TITLE     GENERATED BY MOLPRISMA'S BENCHMARK SUITE                              \n"
+    for i in range(20):
+        yield f"REMARK 900 LINE {i:<64d}\n"
+
+    serial = 0
+    idx_chain = 0
+    while True:
+        chain = CHAIN_IDS[idx_chain % len(CHAIN_IDS)]
+        idx_chain += 1
+        origin = [rng.uniform(-500, 500) for _ in range(3)]
+
+        def next_atom(group, name, altloc, resname, resseq, icode, occupancy = 1.0):
+            nonlocal serial
+            serial += 1
+            xyz = tuple(o + rng.uniform(-20, 20) for o in origin)
+            return format_atom(group, serial, name, altloc, resname, chain, resseq, icode, xyz, occupancy, rng.uniform(5, 80),
+                name if name in ELEMENTS_TWO_LETTERS else name[0]
+            )
+
+        for resseq in range(1, rng.randint(*NRESIDUES_CHAIN) + 1):
+            resname = rng.choice(tuple(RESIDUES.keys()))
+            icode = 'A' if rng.random() < PROB_INSERTION else ' '
+            altlocs = "AB" if rng.random() < PROB_ALTLOC else ' '
+            for altloc in altlocs:
+                occupancy = 1.0 if altloc == ' ' else 0.5
+                for name in RESIDUES[resname]:
+                    yield next_atom("ATOM", name, altloc, resname, resseq, icode, occupancy)
+        serial += 1
+        yield f"TER   {serial % 100000:5d}      {resname:>3} {chain:1}{resseq % 10000:4d}".ljust(80) + '\n'
+
+        for i in range(rng.randint(*NLIGANDS_CHAIN)):
+            resname = rng.choice(tuple(LIGANDS.keys()))
+            for name in LIGANDS[resname]:
+                yield next_atom("HETATM", name, ' ', resname, 1001 + i, ' ')
+            yield f"CONECT{serial % 100000:5d}{(serial - 1) % 100000:5d}".ljust(80) + '\n'
+
+        for i in range(rng.randint(*NWATERS_CHAIN)):
+            yield next_atom("HETATM", "O", ' ', "HOH", 2001 + i, ' ')
+
+# ------------------------------------------------------------------------------
+def write_pdb(path: Path, nlines: int, seed: int = 0, nlines_block: int = 1 << 16) -> Path:
+    """Write a synthetic PDB of exactly 'nlines' rows (the last one being END) at 'path'"""
+    rows = islice(iter_rows(seed), max(nlines - 1, 0))
+    with open(path, 'w') as file:
+        while block := list(islice(rows, nlines_block)):
+            file.write(''.join(block))
+        file.write("END".ljust(80) + '\n')
+    return path
+
+# ------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type = Path)
+    parser.add_argument("--nlines", type = int, default = 1_000_000)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+    write_pdb(args.path, args.nlines, args.seed)
+
+
+################################################################################
+if __name__ == "__main__":
+    main()
+
+
+################################################################################
@@ -1,10 +1,32 @@
 from .misc.pdb_constants import LENGTH_RECORD, PDB_CONSTANTS
 from .misc.enums import MolKind
 from .misc.utils import Utils
+from .misc.cache import Cache
+from .misc.compression import Compression
+from .misc.watcher import Watcher
+from .misc.profiler import Profiler
 
 from .data.pdb_section import PDBSection
 from .data.mol_line import MolLine
+from .data.mol_buffer import MolBuffer
+from .data.mol_columns import MolColumns
+from .data.mol_index import MolIndex
+from .data.mol_models import MolModels
+from .data.mol_hierarchy import MolHierarchy
+from .data.mol_grid import MolGrid
+from .data.mol_selection import MolSelection
+from .data.mol_sorted import MolSorted
+from .data.mol_stats import MolStats
+from .data.mol_validator import MolValidator
+from .data.mol_export import MolExport
+from .data.mol_diff import MolDiff
 from .data.mol_data import MolData
+from .data.mol_cache import MolCache
 
+from .parsers.parser import Parser
 from .parsers.parser_pdb import ParserPDB
+from .parsers.parser_cif import ParserCIF
+from .data.mol_session import MolSession
 from .interface.tui import TUIMolPrisma
+from .interface.query import QueryMolPrisma
+from .interface.validate import ValidateMolPrisma
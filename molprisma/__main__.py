@@ -1,17 +1,165 @@
+import argparse
+import os
 import sys
-from pathlib import Path
 
 import molprisma as mp
 
+ARGS_FOLLOW = ("--follow",) # no short flag, as -f is --format in molprisma query
+ARG_PROFILE = "--profile"
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 def main():
-    if len(sys.argv) < 2:
-        print("usage: molprisma [path_pdb]")
+    if len(sys.argv) > 1 and sys.argv[1] == "query":
+        exit(main_query(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "validate":
+        exit(main_validate(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "diff":
+        exit(main_diff(sys.argv[2:]))
+
+    args = sys.argv[1:]
+    follow = any(arg in ARGS_FOLLOW for arg in args)
+    profiler = mp.Profiler.from_env()
+    if ARG_PROFILE in args: # followed by the path of the report
+        idx = args.index(ARG_PROFILE)
+        if idx + 1 == len(args) or args[idx + 1].startswith('-'):
+            print_usage()
+            exit(-1)
+        profiler = mp.Profiler(args[idx + 1])
+        del args[idx : idx + 2]
+
+    paths = mp.MolSession.find_paths([arg for arg in args if arg not in ARGS_FOLLOW])
+    if not paths:
+        print_usage()
         exit(-1)
 
-    PATH_STRUCT = Path(sys.argv[1])
-    mol = mp.ParserPDB(PATH_STRUCT).parse()
+    session = mp.MolSession(paths, init_mol = mp.TUIMolPrisma.init_mol, follow = follow)
+    if profiler is not None: profiler.start()
+    try:
+        mol = session.open(0) # the rest of the file keeps being parsed while browsing, and its neighbours get prefetched
+        mp.TUIMolPrisma(mol, session, profiler).run()
+    finally:
+        session.close()
+        if profiler is not None:
+            profiler.stop()
+            print(f"Profile written to '{profiler.path}'", file = sys.stderr)
+
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+def print_usage():
+    print("usage: molprisma [--follow] [--profile path_report] [path_pdb | path_cif | directory | 'glob_pattern'] ...")
+    print("       molprisma query [options] [paths...] (see molprisma query --help)")
+    print("       molprisma validate [-j jobs] [paths...] (see molprisma validate --help)")
+    print("       molprisma diff [-t tolerance] path_before path_after (see molprisma diff --help)")
+    print("       --follow: keep showing the rows appended to the (uncompressed PDB) files, e.g. by a running simulation")
+    print(f"       --profile: time each stage and frame, writing a JSON report (or cProfile stats, if it ends with .prof) on exit. " +\
+        f"Same as setting ${mp.Profiler.ENV_PATH}")
+
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+def main_query(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog = "molprisma query",
+        description = "Print the rows of PDB files matching the same filters as the interactive viewer. " +\
+            "Rows are written to stdout (or the -o file), file after file, and a summary of each file to stderr."
+    )
+    parser.add_argument("paths", nargs = '*', help = "PDB files, optionally compressed ('-' or nothing for stdin)")
+    for key in mp.MolData.KEYS_FILTERS:
+        name = key.replace('[', '').replace(']', '')
+        short = key[key.index('[') + 1]
+        parser.add_argument(f"-{short}", f"--{name}", metavar = "VALUE", help = f"only rows with this {name}")
+
+    parser.add_argument("-s", "--select", metavar = "EXPR",
+        help = "only atoms matching this selection, e.g. 'chain A and resname ALA,GLY and bfactor > 40 and not altloc B'"
+    )
+    parser.add_argument("--no-atoms",   action = "store_true", help = "hide ATOM rows")
+    parser.add_argument("--no-hetatms", action = "store_true", help = "hide HETATM rows")
+    parser.add_argument("--metadata",   action = "store_true", help = "show the other rows (hidden by default)")
+    parser.add_argument("-f", "--format", choices = mp.MolExport.FORMATS,
+        help = "write the rows as they are (pdb, the default) or the sections of the atoms as a table (parquet and arrow need pyarrow)"
+    )
+    parser.add_argument("-o", "--output", metavar = "PATH",
+        help = "write the rows to this file instead of stdout, in the format given by its suffix unless --format is given"
+    )
+    parser.add_argument("-j", "--jobs", type = int, default = os.cpu_count() or 1, help = "number of worker processes")
+    args = parser.parse_args(argv)
+
+    try:
+        fmt = mp.MolExport.get_format(args.output, args.format) if args.output else (args.format or "pdb")
+    except ValueError as e:
+        parser.error(str(e))
+    if fmt in mp.MolExport.FORMATS_COLUMNAR and not args.output:
+        parser.error(f"the {fmt} format needs an output file (-o)")
+
+    values = {}
+    for key in mp.MolData.KEYS_FILTERS:
+        value = getattr(args, key.replace('[', '').replace(']', ''))
+        if value is not None: values[key] = value
+
+    try:
+        query = mp.QueryMolPrisma(values, {
+            mp.MolKind.ATOM: not args.no_atoms,
+            mp.MolKind.HETE: not args.no_hetatms,
+            mp.MolKind.META: args.metadata,
+        }, args.select, fmt)
+    except ValueError as e:
+        parser.error(str(e))
+    if not args.output: return 0 if query.run(args.paths, args.jobs) else 1
+
+    try:
+        export = mp.MolExport(args.output, fmt)
+    except (ImportError, OSError) as e:
+        parser.error(str(e))
+    with export:
+        return 0 if query.run(args.paths, args.jobs, export) else 1
+
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+def main_validate(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog = "molprisma validate",
+        description = "Check the ATOM/HETATM rows of PDB files against the fixed-width PDB layout, same as the 'x' key of the viewer. " +\
+            "Errors are written to stdout as 'path:line:column: message', and a summary of each file to stderr. " +\
+            "Exits with 1 if any file has errors or can't be read."
+    )
+    parser.add_argument("paths", nargs = '*',
+        help = "PDB files (optionally compressed), directories or glob patterns ('-' or nothing for stdin). mmCIF files are skipped."
+    )
+    parser.add_argument("-j", "--jobs", type = int, default = os.cpu_count() or 1, help = "number of worker processes")
+    args = parser.parse_args(argv)
+
+    paths = [
+        path if path == mp.QueryMolPrisma.PATH_STDIN else str(path)
+        for path in (mp.MolSession.find_paths(args.paths) if args.paths else [])
+        if not mp.ParserCIF.is_cif(path)
+    ]
+    if args.paths and not paths: parser.error("no PDB files found")
+    return 0 if mp.ValidateMolPrisma().run(paths, args.jobs) else 1
+
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+def main_diff(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog = "molprisma diff",
+        description = "Compare the atoms of two structures, matched by chain, residue number, insertion code, atom name and altloc " +\
+            "(and model), and browse the ones changed, added or removed with the changed cells highlighted. " +\
+            "Exits with 1 if they differ, like diff."
+    )
+    parser.add_argument("path_before", help = "PDB or mmCIF file, optionally compressed")
+    parser.add_argument("path_after",  help = "PDB or mmCIF file, optionally compressed")
+    parser.add_argument("-t", "--tolerance", type = float, default = 0.0, metavar = "ANGSTROMS",
+        help = "atoms that moved this much or less keep their coordinates as unchanged"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        mols = [mp.MolSession.get_parser_class(path)(path).parse() for path in (args.path_before, args.path_after)]
+    except (OSError, ValueError) as e: # unreadable or malformed
+        parser.error(str(e))
+    diff = mp.MolDiff(*mols, args.tolerance)
+    print(f"{diff.name}: {diff.nchanged} atoms changed, {diff.nadded} added, {diff.nremoved} removed, {diff.nunchanged} unchanged", file = sys.stderr)
+    if not len(diff): return 0
+
+    mol = diff.build_mol()
+    mp.TUIMolPrisma.init_mol(mol)
     mp.TUIMolPrisma(mol).run()
+    return 1
 
 
 ################################################################################
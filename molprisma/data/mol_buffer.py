@@ -0,0 +1,219 @@
+import re
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolBuffer:
+    """Contiguous storage of raw text rows, addressed through arrays of line offsets"""
+    CHAR_NEWLINE = ord('\n')
+    CHAR_RETURN  = ord('\r')
+    CHAR_SPACE   = ord(' ')
+
+    NBYTES_SCAN_BLOCK = 1 << 26 # newlines are searched in blocks of this size, bounding temporary memory
+    NROWS_WINDOW = 256 # rows are decoded and cached in windows of this size
+    MAX_CACHED_WINDOWS = 64
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        self._data   = np.empty(0, dtype = np.uint8)
+        self._starts = np.empty(0, dtype = np.int64)
+        self._ends   = np.empty(0, dtype = np.int64)
+        self._nbytes: int = 0
+        self._nrows: int = 0
+        self._windows: OrderedDict[int, list[str]] = OrderedDict() # LRU cache of decoded rows
+
+    # --------------------------------------------------------------------------
+    def __len__(self):
+        return self._nrows
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def from_bytes(cls, data: bytes | np.ndarray, lo: int = 0, hi: int | None = None) -> "MolBuffer":
+        """Index the rows of 'data', which is referenced instead of copied.
+        If given, only the rows inside data[lo:hi] are indexed (offsets remain relative to the whole 'data')."""
+        buffer = cls()
+        buffer._data = np.frombuffer(data, dtype = np.uint8) if isinstance(data, bytes) else data
+        buffer._starts, buffer._ends = cls._split_lines(buffer._data[lo:hi])
+        buffer._starts += lo
+        buffer._ends   += lo
+        buffer._nrows = len(buffer._starts)
+        buffer._nbytes = int(buffer._ends[-1]) if buffer._nrows else 0 # bytes after the last row aren't needed
+        return buffer
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def from_mmap(cls, path: str | Path) -> "MolBuffer":
+        """Memory-map the file at 'path' instead of reading it: only the line offsets are kept in memory,
+        and rows are decoded from the mapping when requested"""
+        if Path(path).stat().st_size == 0:
+            return cls()
+        return cls.from_bytes(np.memmap(path, dtype = np.uint8, mode = 'r'))
+
+    # --------------------------------------------------------------------------
+    def reset(self):
+        self.__init__()
+
+    # --------------------------------------------------------------------------
+    def extend(self, other: "MolBuffer"):
+        """Append all the rows of another buffer at the end of this one"""
+        self._windows.pop(self._nrows // self.NROWS_WINDOW, None) # the last window might be incomplete
+        if not self._nrows: # nothing to preserve, adopt the other buffer's arrays without copying
+            self._data, self._starts, self._ends = other._data, other._starts, other._ends
+            self._nbytes, self._nrows = other._nbytes, other._nrows
+            return
+
+        nrows = self._nrows + other._nrows
+        self._starts = mp.Utils.ensure_capacity(self._starts, nrows)
+        self._ends   = mp.Utils.ensure_capacity(self._ends,   nrows)
+
+        if other._data is not self._data and self._is_same_mapping(other._data): # e.g. a file mapped again after growing
+            self._data = other._data
+
+        if other._data is self._data: # e.g. consecutive chunks of the same file, only the offsets are new
+            self._starts[self._nrows:nrows] = other._starts[:other._nrows]
+            self._ends  [self._nrows:nrows] = other._ends  [:other._nrows]
+            self._nbytes = max(self._nbytes, other._nbytes)
+            self._nrows  = nrows
+            return
+
+        nbytes = self._nbytes + other._nbytes
+
+        if other._nbytes: # e.g. appending empty rows doesn't need to touch the data
+            if not self._data.flags.writeable: # e.g. adopted from np.frombuffer
+                self._data = self._data.copy()
+            self._data = mp.Utils.ensure_capacity(self._data, nbytes)
+            self._data[self._nbytes:nbytes] = other._data[:other._nbytes]
+        self._starts[self._nrows :nrows ] = other._starts[:other._nrows] + self._nbytes
+        self._ends  [self._nrows :nrows ] = other._ends  [:other._nrows] + self._nbytes
+        self._nbytes = nbytes
+        self._nrows  = nrows
+
+    # --------------------------------------------------------------------------
+    def get_text(self, idx: int) -> str:
+        idx_window, offset = divmod(idx, self.NROWS_WINDOW)
+        window = self._windows.get(idx_window, None)
+        if window is None:
+            window = self._decode_window(idx_window)
+            self._windows[idx_window] = window
+            if len(self._windows) > self.MAX_CACHED_WINDOWS:
+                self._windows.popitem(last = False)
+        else:
+            self._windows.move_to_end(idx_window)
+        return window[offset]
+
+    # --------------------------------------------------------------------------
+    def get_lengths(self) -> np.ndarray:
+        return self._ends[:self._nrows] - self._starts[:self._nrows]
+
+    # --------------------------------------------------------------------------
+    def get_records(self, lo: int, hi: int, col_start: int = 0, col_end: int = mp.LENGTH_RECORD) -> np.ndarray:
+        """Return the characters [col_start,col_end[ of the rows [lo,hi[ as a uint8 matrix, right-padded with spaces.
+        The returned matrix might be a read-only view of the buffer."""
+        starts = self._starts[lo:hi]
+        lengths = self._ends[lo:hi] - starts
+        cols = np.arange(col_start, col_end)
+
+        ### fast path: equally spaced rows long enough (the usual 80 characters + newline) can be viewed without gathering
+        if len(starts) and lengths.min() >= col_end:
+            stride = int(starts[1] - starts[0]) if len(starts) > 1 else 0
+            if (stride > 0) and (starts[-1] - starts[0] == stride * (len(starts) - 1)) and (np.diff(starts) == stride).all():
+                return np.lib.stride_tricks.as_strided(
+                    self._data[starts[0] + col_start:], shape = (len(starts), len(cols)),
+                    strides = (stride, 1), writeable = False
+                )
+
+        return self._gather_records(starts, lengths, cols)
+
+    # --------------------------------------------------------------------------
+    def get_records_at(self, rows: np.ndarray, col_start: int = 0, col_end: int = mp.LENGTH_RECORD) -> np.ndarray:
+        """Same as get_records, for the given rows only (e.g. a few scattered ones)"""
+        starts = self._starts[rows]
+        return self._gather_records(starts, self._ends[rows] - starts, np.arange(col_start, col_end))
+
+    # --------------------------------------------------------------------------
+    def join_rows(self, rows: np.ndarray) -> bytes:
+        """Return the raw text of the given (sorted) rows, each followed by a newline.
+        Runs of rows that are contiguous in the data are copied at once, newlines included."""
+        if not len(rows): return b''
+        starts, ends = self._starts[rows], self._ends[rows]
+        firsts = np.flatnonzero(np.concatenate(([True], starts[1:] != ends[:-1] + 1)))
+        lasts = np.append(firsts[1:], len(rows)) - 1
+        data = memoryview(self._data)
+        return b'\n'.join([data[start:end] for start,end in zip(starts[firsts].tolist(), ends[lasts].tolist())]) + b'\n'
+
+    # --------------------------------------------------------------------------
+    def find_rows(self, regex: re.Pattern, lo: int, hi: int) -> np.ndarray:
+        """Return the rows in [lo,hi[ with a match of the bytes 'regex' (compiled with re.MULTILINE, so that '^'/'$' anchor to rows).
+        Their contiguous text is scanned in bulk by the regex engine, resuming at the next row after each match.
+        A match running past the end of its row is searched again within that row alone, as match_rows does."""
+        rows = []
+        if lo >= hi: return np.array(rows, dtype = np.int64)
+        data = memoryview(self._data)
+        starts, ends = self._starts[lo:hi], self._ends[lo:hi]
+        pos, endpos = int(starts[0]), int(ends[-1])
+        while (match := regex.search(data, pos, endpos)) is not None:
+            i = int(np.searchsorted(starts, match.start(), side = "right")) - 1
+            if match.end() <= ends[i] or regex.search(data, int(starts[i]), int(ends[i])) is not None:
+                rows.append(lo + i) # not spanning several rows, or with a shorter match within it
+            if i + 1 == len(starts): break
+            pos = int(starts[i + 1])
+        return np.array(rows, dtype = np.int64)
+
+    # --------------------------------------------------------------------------
+    def match_rows(self, regex: re.Pattern, rows: np.ndarray) -> np.ndarray:
+        """Mask of the given 'rows' with a match of the bytes 'regex', searched one by one (e.g. when they're scattered)"""
+        data = memoryview(self._data)
+        return np.array([
+            regex.search(data, start, end) is not None
+            for start,end in zip(self._starts[rows].tolist(), self._ends[rows].tolist())
+        ], dtype = bool)
+
+    # --------------------------------------------------------------------------
+    def _gather_records(self, starts: np.ndarray, lengths: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        idxs = starts[:,None] + cols[None,:]
+        np.minimum(idxs, max(self._nbytes - 1, 0), out = idxs)
+        records = self._data[idxs] if self._nbytes else np.empty(idxs.shape, dtype = np.uint8)
+        records[cols[None,:] >= lengths[:,None]] = self.CHAR_SPACE
+        return records
+
+    # --------------------------------------------------------------------------
+    def _is_same_mapping(self, data: np.ndarray) -> bool:
+        """Whether 'data' memory-maps the same file as the current data, from the same offset, and at least as far"""
+        if not (isinstance(self._data, np.memmap) and isinstance(data, np.memmap)): return False
+        if self._data.filename is None: return False
+        return (data.filename, data.offset) == (self._data.filename, self._data.offset) and len(data) >= self._nbytes
+
+    # --------------------------------------------------------------------------
+    def _decode_window(self, idx_window: int) -> list[str]:
+        lo = idx_window * self.NROWS_WINDOW
+        hi = min(lo + self.NROWS_WINDOW, self._nrows)
+        return [
+            self._data[start:end].tobytes().decode(errors = "replace")
+            for start,end in zip(self._starts[lo:hi].tolist(), self._ends[lo:hi].tolist())
+        ]
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _split_lines(cls, data: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Return the (starts, ends) offsets of every line in 'data', following str.splitlines semantics for '\\n' and '\\r\\n'"""
+        newlines = np.concatenate([np.empty(0, dtype = np.int64)] + [
+            np.flatnonzero(data[lo : lo + cls.NBYTES_SCAN_BLOCK] == cls.CHAR_NEWLINE) + lo
+            for lo in range(0, len(data), cls.NBYTES_SCAN_BLOCK)
+        ])
+        starts = np.concatenate(([0], newlines + 1)).astype(np.int64)
+        ends   = np.concatenate((newlines, [len(data)])).astype(np.int64)
+        if starts[-1] == len(data): # trailing newline (or empty data) doesn't start a new row
+            starts = starts[:-1]
+            ends   = ends  [:-1]
+
+        has_return = ends > starts
+        has_return[has_return] = data[ends[has_return] - 1] == cls.CHAR_RETURN
+        ends[has_return] -= 1
+        return starts, ends
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,189 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolCache:
+    """Persistent binary copy of a fully parsed MolData (line offsets, kinds, parsed columns, filter references and index),
+    stored in the Cache directory as raw arrays that later opens memory-map instead of parsing the source file again.
+    The text of the rows is read from the file holding them at the same offsets (e.g. the PDB file itself), or embedded otherwise.
+
+    Layout: MAGIC, the length of the JSON header (uint64), the header, and every array aligned to ALIGNMENT bytes."""
+    SUFFIX = ".parsed"
+    MAGIC = b"MOLPRISM"
+    VERSION = 2 # bumped whenever the layout or the meaning of the arrays changes, invalidating older entries
+    ALIGNMENT = 64
+    NBYTES_WRITE = 1 << 24 # arrays are written in blocks of this size, checking for cancellation in between
+
+    # --------------------------------------------------------------------------
+    def __init__(self, path_source: str | Path, name_parser: str):
+        """The identity of 'path_source' (path, size, modification time and content fingerprint) is taken right away,
+        so that an entry stored after parsing still describes the file as it was when opened"""
+        self.path_source = Path(path_source)
+        self.name_parser = name_parser
+        self.path = mp.Cache.get_path(self.path_source, self.SUFFIX)
+        self.fingerprint = mp.Cache.get_fingerprint(self.path_source)
+
+    # --------------------------------------------------------------------------
+    def load(self) -> mp.MolData | None:
+        """Return the MolData stored for the source file (memory-mapped, and fully parsed), or None if there's no valid entry.
+        Entries that can't be used (outdated, corrupted or whose text file is gone) are removed."""
+        path = mp.Cache.find(self.path_source, self.SUFFIX)
+        if path is None: return
+
+        try:
+            raw = np.memmap(path, dtype = np.uint8, mode = 'r')
+            if raw[:len(self.MAGIC)].tobytes() != self.MAGIC: raise ValueError("not a parse cache entry")
+            nbytes_header = int(raw[len(self.MAGIC) : len(self.MAGIC) + 8].view("<u8")[0])
+            lo = len(self.MAGIC) + 8
+            header = json.loads(raw[lo : lo + nbytes_header].tobytes())
+            if (header["version"], header["parser"], header["fingerprint"]) != (self.VERSION, self.name_parser, self.fingerprint):
+                raise ValueError("outdated entry")
+
+            lo = self._align(lo + nbytes_header)
+            arrays = {
+                name: raw[lo + offset : lo + offset + int(np.prod(shape)) * np.dtype(dtype).itemsize].view(dtype).reshape(shape)
+                for name,(dtype, shape, offset) in header["arrays"].items()
+            }
+            text = arrays.pop("text") if header["text"] is None else self._map_text(header["text"])
+            return self._build(header, arrays, text)
+
+        except (OSError, ValueError, KeyError, TypeError):
+            mp.Cache.remove(path)
+
+    # --------------------------------------------------------------------------
+    def store(self, mol: mp.MolData, path_text: str | Path | None = None, should_stop: callable = lambda: False) -> bool:
+        """Write 'mol' (which must be fully parsed) as the entry of the source file, then evict older entries if needed.
+        'path_text' is the file holding the text of its rows at the same offsets, if any (otherwise the text is embedded).
+        Returns False if the entry couldn't be written or 'should_stop' returned True meanwhile."""
+        with mol.lock:
+            header, arrays = self._dump(mol, path_text)
+
+        offset = 0
+        header["arrays"] = {}
+        for name,arr in arrays.items():
+            header["arrays"][name] = (arr.dtype.str, arr.shape, offset)
+            offset = self._align(offset + arr.nbytes)
+        encoded = json.dumps(header, default = int).encode() # e.g. model rows given as NumPy integers
+
+        path_tmp = Path(f"{self.path}.{os.getpid()}{mp.Cache.SUFFIX_TMP}")
+        completed = False
+        try:
+            self.path.parent.mkdir(parents = True, exist_ok = True)
+            with open(path_tmp, "wb") as file:
+                file.write(self.MAGIC + np.uint64(len(encoded)).astype("<u8").tobytes() + encoded)
+                lo = self._align(file.tell())
+                for name,arr in arrays.items():
+                    file.seek(lo + header["arrays"][name][2])
+                    data = np.ascontiguousarray(arr).reshape(-1).view(np.uint8)
+                    for start in range(0, len(data), self.NBYTES_WRITE):
+                        if should_stop(): return False
+                        file.write(memoryview(data[start : start + self.NBYTES_WRITE]))
+                file.truncate(lo + offset)
+            os.replace(path_tmp, self.path)
+            completed = True
+        except OSError:
+            return False
+        finally:
+            if not completed: mp.Cache.remove(path_tmp)
+
+        mp.Cache.evict(keep = self.path)
+        return True
+
+    # --------------------------------------------------------------------------
+    def _dump(self, mol: mp.MolData, path_text: str | Path | None) -> tuple[dict, dict[str, np.ndarray]]:
+        nrows = len(mol)
+        buffer, columns, index, models = mol._buffer, mol._columns, mol._index, mol._models
+        assert mol.progress >= 1, "Only fully parsed MolData can be cached"
+        if len(index) != nrows: mol.update_filters(len(index)) # e.g. the terminator row isn't indexed until browsed
+
+        header = {
+            "version": self.VERSION,
+            "parser": self.name_parser,
+            "fingerprint": self.fingerprint,
+            "name": mol.name,
+            "width": mol._width,
+            "filter_refs": mol._filter_refs,
+            "models": (models._starts, models._ends, models._numbers),
+            "text": None,
+        }
+        arrays = {
+            "starts": buffer._starts[:nrows],
+            "ends"  : buffer._ends[:nrows],
+            "kinds" : columns.get_kinds(),
+        }
+        if path_text is None:
+            arrays["text"] = buffer._data[:buffer._nbytes]
+        else:
+            header["text"] = {"path": str(Path(path_text).resolve()), "size": Path(path_text).stat().st_size}
+
+        for name,_,_ in mp.MolColumns.iter_layout():
+            arrays[f"field/{name}"] = columns.get_field(name)
+        nbytes_packed = index._get_nbytes_packed()
+        for kind,mask in index._masks_kinds.items():
+            arrays[f"mask/{kind.name}"] = mask[:nbytes_packed]
+        for key in index._codes.keys():
+            arrays[f"codes/{key}"] = index.get_codes(key)
+        for (key, kind),counts in index._counts.items():
+            arrays[f"counts/{key}/{kind.name}"] = counts
+        return header, arrays
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _build(header: dict, arrays: dict[str, np.ndarray], text: np.ndarray) -> mp.MolData:
+        mol = mp.MolData(header["name"])
+        mol.init_sections()
+        nrows = len(arrays["kinds"])
+
+        buffer = mol._buffer
+        buffer._data, buffer._starts, buffer._ends = text, arrays["starts"], arrays["ends"]
+        buffer._nrows = nrows
+        buffer._nbytes = int(buffer._ends[-1]) if nrows else 0
+
+        columns = mol._columns
+        columns._size, columns._kinds = nrows, arrays["kinds"]
+        for name in columns._fields.keys():
+            columns._fields[name] = arrays[f"field/{name}"]
+
+        index = mol._index
+        index._nrows = nrows
+        for kind in mp.MolKind:
+            index._masks_kinds[kind] = arrays[f"mask/{kind.name}"]
+        for key in mol.KEYS_FILTERS.keys():
+            index._codes[key] = arrays[f"codes/{key}"]
+            for kind in (mp.MolKind.ATOM, mp.MolKind.HETE):
+                index._counts[(key, kind)] = arrays[f"counts/{key}/{kind.name}"]
+
+        for key,refs in header["filter_refs"].items():
+            mol._filter_refs[key][:] = refs
+        starts, ends, numbers = header["models"]
+        if starts:
+            mol._models._starts, mol._models._ends, mol._models._numbers = starts, ends, numbers
+            mol._models._idxs_numbers = {number: i for i,number in enumerate(numbers)}
+            mol.current_model = 0
+        mol._width = header["width"]
+        mol.progress = 1.0
+        return mol
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _map_text(info: dict) -> np.ndarray:
+        """Memory-map the file holding the text of the rows. It's either the source file (whose identity is already checked)
+        or a cache entry derived from it (e.g. a decompressed copy, keyed by the source), so only its size is checked."""
+        path = Path(info["path"])
+        size = path.stat().st_size
+        if size != info["size"]: raise ValueError(f"'{path}' changed since the entry was stored")
+        if not size: return np.empty(0, dtype = np.uint8)
+        return np.memmap(path, dtype = np.uint8, mode = 'r')
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _align(cls, offset: int) -> int:
+        return -(-offset // cls.ALIGNMENT) * cls.ALIGNMENT
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,242 @@
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolColumns:
+    """Typed per-section arrays, parsed once from the fixed-width records of a MolData"""
+    DTYPES_NUMERIC = {
+        "SERIAL_NUM"          : np.int32,
+        "RESIDUE_SEQUENCE_NUM": np.int32,
+        "X_COORDINATES"       : np.float32,
+        "Y_COORDINATES"       : np.float32,
+        "Z_COORDINATES"       : np.float32,
+        "OCCUPANCY"           : np.float32,
+        "TEMPERATURE_FACTOR"  : np.float32,
+    }
+    NDECIMALS = {"X_COORDINATES": 3, "Y_COORDINATES": 3, "Z_COORDINATES": 3, "OCCUPANCY": 2, "TEMPERATURE_FACTOR": 2} # as written in PDB files
+    MISSING_INT = np.iinfo(np.int32).min # placeholder for blank or unparsable integer fields
+    MISSING_FLOAT = np.nan               # placeholder for blank or unparsable float fields
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        self._size: int = 0
+        self._kinds = np.empty(0, dtype = np.int8)
+        self._fields: dict[str, np.ndarray] = {
+            name: np.empty(0, dtype = self._get_dtype(name, start, end))
+            for name, start, end in self.iter_layout()
+        }
+
+    # --------------------------------------------------------------------------
+    def __len__(self):
+        return self._size
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def iter_layout():
+        """Yield the (name, start, end) of every PDB section defined in PDB_CONSTANTS"""
+        for key,start in mp.PDB_CONSTANTS.items():
+            if not key.endswith("_START"): continue
+            name = key[:-6]
+            end = mp.PDB_CONSTANTS.get(f"{name}_END", None)
+            if end is None: continue
+            yield name, start, end
+
+    # --------------------------------------------------------------------------
+    def reset(self):
+        self.__init__()
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def from_buffer(cls, buffer: "mp.MolBuffer", kinds: np.ndarray, nrows_chunk: int = 1 << 16) -> "MolColumns":
+        """Parse the sections of every row of 'buffer' (classified by the MolKind values in 'kinds'), in chunks of rows"""
+        columns = cls()
+        columns.reserve(len(buffer) + 1) # +1 as a NONE terminator line usually follows
+        for start in range(0, len(buffer), nrows_chunk):
+            end = min(start + nrows_chunk, len(buffer))
+            columns.extend(buffer.get_records(start, end), kinds[start:end])
+        return columns
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def from_chars(cls, kinds: np.ndarray, fields: dict[str, np.ndarray]) -> "MolColumns":
+        """Parse the sections of atom rows given as separate (nrows, width) uint8 matrices of space-padded characters,
+        e.g. the values of a mmCIF file, whose width isn't limited to the one of the PDB sections. Absent sections are left blank."""
+        columns = cls()
+        columns._size = len(kinds)
+        columns._kinds = np.asarray(kinds, dtype = np.int8)
+        is_atom = np.ones(len(kinds), dtype = bool)
+        for name, start, end in cls.iter_layout():
+            chars = fields.get(name, None)
+            if chars is None:
+                dtype = cls._get_dtype(name, start, end)
+                columns._fields[name] = np.full(len(kinds), cls._get_missing(dtype), dtype = dtype)
+            else:
+                columns._fields[name] = cls._parse_field(name, chars, is_atom)
+        return columns
+
+    # --------------------------------------------------------------------------
+    def reserve(self, size: int):
+        """Preallocate room for 'size' rows, avoiding repeated reallocations when the final size is known"""
+        self._kinds = mp.Utils.ensure_capacity(self._kinds, size)
+        for name,arr in self._fields.items():
+            self._fields[name] = mp.Utils.ensure_capacity(arr, size)
+
+    # --------------------------------------------------------------------------
+    def extend(self, records: np.ndarray, kinds: np.ndarray):
+        """Parse and append the fields of 'records', a (nrows, LENGTH_RECORD) uint8 matrix
+        whose rows are described by the MolKind values in 'kinds'"""
+        size = self._size + len(records)
+        self._kinds = mp.Utils.ensure_capacity(self._kinds, size)
+        self._kinds[self._size:size] = kinds
+
+        is_atom = (kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value)
+        for name, start, end in self.iter_layout():
+            values = self.parse_section(name, records[:, start:end], is_atom)
+            arr = mp.Utils.ensure_capacity(self._fields[name], size)
+            arr[self._size:size] = values
+            self._fields[name] = arr
+
+        self._size = size
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def parse_section(cls, name: str, chars: np.ndarray, is_atom: np.ndarray) -> np.ndarray:
+        """Parse the section 'name' of some rows, given as a (nrows, width) uint8 matrix of its characters.
+        Only ATOM/HETATM rows (the ones in 'is_atom') hold section data, everything else is blank."""
+        dtype = cls.DTYPES_NUMERIC.get(name, f"S{chars.shape[1]}")
+        if not is_atom.any(): # e.g. a whole chunk of metadata
+            return np.full(len(chars), cls._get_missing(dtype), dtype = dtype)
+        values = cls._parse_field(name, chars, is_atom)
+        values[~is_atom] = cls._get_missing(values.dtype)
+        return values
+
+    # --------------------------------------------------------------------------
+    def extend_columns(self, other: "MolColumns"):
+        """Append all the rows of another (already parsed) MolColumns"""
+        if not self._size: # nothing to preserve, adopt the other's arrays without copying
+            self._size, self._kinds, self._fields = other._size, other._kinds, dict(other._fields)
+            return
+
+        size = self._size + other._size
+        self._kinds = mp.Utils.ensure_capacity(self._kinds, size)
+        self._kinds[self._size:size] = other.get_kinds()
+        for name,arr in self._fields.items():
+            dtype = np.promote_types(arr.dtype, other._fields[name].dtype) # e.g. wider strings from a mmCIF file
+            if dtype != arr.dtype: arr = arr.astype(dtype)
+            arr = mp.Utils.ensure_capacity(arr, size)
+            arr[self._size:size] = other.get_field(name)
+            self._fields[name] = arr
+        self._size = size
+
+    # --------------------------------------------------------------------------
+    def select_rows(self, rows: np.ndarray) -> "MolColumns":
+        """New MolColumns holding only the given rows, in their order"""
+        columns = type(self)()
+        columns._size = len(rows)
+        columns._kinds = self.get_kinds()[rows]
+        columns._fields = {name: self.get_field(name)[rows] for name in self._fields}
+        return columns
+
+    # --------------------------------------------------------------------------
+    def get_kinds(self) -> np.ndarray:
+        return self._kinds[:self._size]
+
+    # --------------------------------------------------------------------------
+    def get_field(self, name: str) -> np.ndarray:
+        return self._fields[name][:self._size]
+
+    # --------------------------------------------------------------------------
+    def is_numeric(self, name: str) -> bool:
+        return name in self.DTYPES_NUMERIC
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_mask_valid(cls, values: np.ndarray) -> np.ndarray:
+        """Mask of the 'values' that aren't the placeholder of missing ones"""
+        if np.issubdtype(values.dtype, np.floating): return ~np.isnan(values)
+        if np.issubdtype(values.dtype, np.integer): return values != cls.MISSING_INT
+        return values != b''
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _get_dtype(cls, name: str, start: int, end: int):
+        return cls.DTYPES_NUMERIC.get(name, f"S{end - start}")
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _parse_field(cls, name: str, chars: np.ndarray, is_atom: np.ndarray) -> np.ndarray:
+        """Parse a (nrows, width) uint8 matrix holding the characters of a section.
+        Rows outside 'is_atom' are parsed too, but they won't fall back to the slow path when malformed."""
+        dtype = cls.DTYPES_NUMERIC.get(name, None)
+        if dtype is None:
+            return np.char.strip(np.ascontiguousarray(chars).view(f"S{chars.shape[1]}")[:,0])
+
+        is_int = np.issubdtype(dtype, np.integer)
+        missing = cls._get_missing(dtype)
+        values, blank, valid = cls._parse_decimals(chars, allow_point = not is_int)
+        values = values.astype(dtype)
+        values[blank] = missing
+
+        ### rare malformed values (exponents, misplaced signs...) fall back to per-value parsing
+        cast = int if is_int else float
+        for i in np.flatnonzero(~valid & is_atom):
+            values[i] = cls._parse_value(chars[i].tobytes(), cast, missing)
+        return values
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _get_missing(cls, dtype):
+        if np.issubdtype(dtype, np.integer): return cls.MISSING_INT
+        if np.issubdtype(dtype, np.floating): return cls.MISSING_FLOAT
+        return b''
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _parse_decimals(chars: np.ndarray, allow_point: bool = True) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorized parsing of space-padded decimal numbers such as ' -12.345', one character column at a time.
+        Returns the parsed values and the masks of blank and well-formed rows."""
+        nrows = len(chars)
+        mantissa  = np.zeros(nrows, dtype = np.int64)
+        ndecimals = np.zeros(nrows, dtype = np.int64)
+        started   = np.zeros(nrows, dtype = bool) # a non-space character was found
+        finished  = np.zeros(nrows, dtype = bool) # a space was found after the value
+        has_point = np.zeros(nrows, dtype = bool)
+        has_digit = np.zeros(nrows, dtype = bool)
+        negative  = np.zeros(nrows, dtype = bool)
+        invalid   = np.zeros(nrows, dtype = bool)
+
+        for column in np.ascontiguousarray(chars.T):
+            digits = column - np.uint8(ord('0')) # non-digits wrap around to values >= 10
+            is_digit = digits < 10
+            is_space = column == mp.MolBuffer.CHAR_SPACE
+            is_point = column == ord('.')
+            is_minus = column == ord('-')
+            is_sign  = is_minus | (column == ord('+'))
+
+            invalid |= ~(is_digit | is_space | is_point | is_sign)
+            invalid |= ~is_space & finished
+            invalid |= is_sign & started
+            invalid |= is_point & (has_point | (not allow_point))
+
+            np.copyto(mantissa, mantissa * 10 + digits, where = is_digit)
+            ndecimals += is_digit & has_point
+            finished  |= is_space & started
+            started   |= ~is_space
+            has_point |= is_point
+            has_digit |= is_digit
+            negative  |= is_minus
+
+        values = mantissa / 10.0 ** ndecimals
+        values[negative] *= -1
+        blank = ~started
+        return values, blank, blank | (has_digit & ~invalid)
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _parse_value(value: bytes, cast: callable, missing):
+        try: return cast(value)
+        except ValueError: return missing
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -1,3 +1,9 @@
+import math
+import re
+import threading
+from itertools import islice
+
+import numpy as np
 import prismatui as pr
 
 import molprisma as mp
@@ -13,12 +19,20 @@ class MolData:
         "alt[l]oc"   : "ALTLOC",
     }
 
+    NROWS_SEARCH_BLOCK = (1 << 10, 1 << 16) # visible rows searched at once, first and at most (doubling in between)
+    RATIO_SEARCH_SPARSE = 8 # visible rows this sparse (rows spanned per visible one) are searched one by one instead of in bulk
+    NROWS_STATS_BACKGROUND = 1 << 17 # statistics over more visible rows than this can be computed on a background thread
+
     # --------------------------------------------------------------------------
     def __init__(self, name = ""):
         self.name: str = name
         self.nsections = 0
         self.current_line: int = 0 # a.k.a row
         self.current_section: int | None = None # a.k.a column
+        self.current_model: int | None = None # index of the MODEL block being shown (None if there are no models)
+        self.progress: float = 1.0 # fraction of the source already parsed, less than 1 while parsing in the background
+        self.following: bool = False # whether rows keep being appended as the source grows (no NONE terminator is added then)
+        self.lock = threading.RLock() # held by whoever reads or extends the data while it's being parsed in the background
 
         self._filter_refs: dict[str, list[str]] = {
             k: [] for k in self.KEYS_FILTERS.keys()
@@ -28,22 +42,84 @@ class MolData:
             k: None for k in self.KEYS_FILTERS.keys()
         } # stores the current index of every filter (None if disabled)
 
+        self._kinds_shown: dict[mp.MolKind, bool] = {
+            kind: True for kind in mp.MolKind if kind != mp.MolKind.NONE
+        } # NONE (terminator) rows are always shown
+
+        self._near: tuple[int, float, bool] | None = None # (center row, radius in Å, around its whole residue) of the spatial filter
+        self._selection: str | None = None # text of the MolSelection filter (compiled on use, so the data stays picklable)
+        self._ranges: dict[str, tuple[float | None, float | None]] = {} # per numeric section, (min, max) of its range filter
+        self._fold: str | None = None # level of the groups (see MolHierarchy.LEVELS) shown as a single summary line, if any
+        self._expanded: frozenset[int] = frozenset() # groups of that level shown unfolded anyway
+
         self._idxs_chars2idxs_sects = [None for _ in range(mp.LENGTH_RECORD)]
-        self._lines: list[mp.MolLine] = []
+        self._buffer = mp.MolBuffer()   # raw text of every row
+        self._columns = mp.MolColumns() # typed section data of every row
+        self._index = mp.MolIndex()     # masks of every kind/filter value and the currently visible rows
+        self._models = mp.MolModels()   # row ranges of the MODEL/ENDMDL blocks
+        self._hierarchy = mp.MolHierarchy() # row ranges of the residues and chains, extended along with the index
+        self._grid: mp.MolGrid | None = None # spatial index of the atoms, built on the first spatial query
+        self._sorted = mp.MolSorted()   # sorted permutation of every numeric section, built on its first range filter
+        self._validator: mp.MolValidator | None = None # format errors of every row, checked on the first call to 'validate'
+        self._diff: mp.MolDiff | None = None # comparison whose atoms are the rows, if built by MolDiff.build_mol
+        self._cache_choices: dict[tuple[int, str], np.ndarray] = {} # per model and filter key, the filter refs found in the model
+        self._cache_visible: tuple[tuple, np.ndarray] | None = None # visible rows of the current model / near the center, with their state
+        self._cache_folded: tuple[tuple, np.ndarray] | None = None # visible rows left by the fold, with their state
+        self._cache_selection: tuple[str, int, np.ndarray] | None = None # mask of the rows selected, with its text and the rows it covers
+        self._cache_ranges: tuple[tuple, np.ndarray] | None = None # mask of the rows within every range filter, with their state
+        self._cache_stats: tuple[tuple, dict[str, mp.MolStats]] | None = None # statistics of the visible atoms per section, with their state
+        self._cache_facets: dict[str, tuple[tuple, int, np.ndarray]] = {} # per filter key, its counts with their state and the rows they cover
+        self._thread_stats: threading.Thread | None = None # computing statistics in the background, see MolData.get_stats
         self._sections: list[mp.PDBSection] = []
+        self._width: int = 0 # rows are right-padded up to this length when yielded
 
     # --------------------------------------------------------------------------
     def __len__(self):
-        return len(self._lines)
+        return len(self._columns)
+
+    # --------------------------------------------------------------------------
+    def __getstate__(self): # e.g. sent back by a worker process
+        state = self.__dict__.copy()
+        del state["lock"]
+        state["_thread_stats"] = None
+        return state
+
+    # --------------------------------------------------------------------------
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
 
     # --------------------------------------------------------------------------
     def reset(self):
         self.current_line = 0
         self.current_section = None
+        self.current_model = None
         self._idxs_chars2idxs_sects = [None for _ in range(mp.LENGTH_RECORD)]
         for v in self._filter_refs.values(): v.clear()
-        self._lines.clear()
+        self.reset_filter_idxs()
+        self._near = None
+        self._selection = None
+        self._ranges.clear()
+        self._fold = None
+        self._expanded = frozenset()
+        self._grid = None
+        self._sorted.reset()
+        self._validator = None
+        self._diff = None
+        self._buffer.reset()
+        self._columns.reset()
+        self._index.reset()
+        self._models.reset()
+        self._hierarchy.reset()
+        self._cache_choices.clear()
+        self._cache_visible = None
+        self._cache_folded = None
+        self._cache_selection = None
+        self._cache_ranges = None
+        self._cache_stats = None
+        self._cache_facets.clear()
         self._sections.clear()
+        self._width = 0
 
     # --------------------------------------------------------------------------
     def init_sections(self):
@@ -62,42 +138,168 @@ class MolData:
 
     # --------------------------------------------------------------------------
     def init_filters(self):
+        selected = {
+            k: self._filter_refs[k][idx] for k,idx in self._filter_idxs.items() if idx is not None
+        }
+        for v in self._filter_refs.values(): v.clear()
+        self._index.reset()
+        self.update_filters()
+
+        for k,ref in selected.items(): # keep the active filters if their values still exist
+            refs = self._filter_refs[k]
+            self._filter_idxs[k] = refs.index(ref) if ref in refs else None
+
+    # --------------------------------------------------------------------------
+    def update_filters(self, lo: int = 0):
+        """Index the rows from 'lo' onwards, merging their values into the (sorted) filter references.
+        Rows indexed before keep their codes, unless new reference values had to be inserted among the old ones."""
+        kinds = self._columns.get_kinds()[lo:]
+        is_atom = (kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value)
+        codes, remaps = {}, {}
         for k,name_section in self.KEYS_FILTERS.items():
-            self._filter_refs[k] = list(sorted(set(
-                line.get_section_data(name_section) for line in self._lines
-            ) - {None}))
+            values, inverse = mp.Utils.unique_bytes(self._columns.get_field(name_section)[lo:][is_atom])
+            refs_old = self._filter_refs[k]
+            refs_new = [v.decode() for v in values]
+            refs = sorted(set(refs_old).union(refs_new))
+            dtype = np.int16 if len(refs) < np.iinfo(np.int16).max else np.int32
+
+            pos = {ref: i for i,ref in enumerate(refs)}
+            if len(refs) != len(refs_old):
+                remaps[k] = np.array([pos[ref] for ref in refs_old], dtype = dtype)
+                idx = self._filter_idxs[k]
+                if idx is not None: self._filter_idxs[k] = pos[refs_old[idx]]
+                refs_old[:] = refs
+
+            codes[k] = np.full(len(kinds), -1, dtype = dtype)
+            codes[k][is_atom] = np.array([pos[ref] for ref in refs_new], dtype = dtype)[inverse]
+
+        self._index.extend(kinds, codes, remaps)
+        self._hierarchy.extend(self._buffer, self._columns, len(self))
+        self._cache_choices.clear()
+        if remaps: self._cache_facets.clear() # counted by outdated codes
 
     # --------------------------------------------------------------------------
     def append(self, line: mp.MolLine):
-        self._lines.append(line)
+        self.extend([line])
 
     # --------------------------------------------------------------------------
     def extend(self, lines: list[mp.MolLine]):
-        self._lines.extend(lines)
+        if not lines: return
+        data = '\n'.join(line.text for line in lines).encode()
+        kinds = np.array([line.kind.value for line in lines], dtype = np.int8)
+        self.extend_buffer(mp.MolBuffer.from_bytes(data + b'\n'), kinds)
+
+    # --------------------------------------------------------------------------
+    def extend_buffer(self, buffer: mp.MolBuffer, kinds: np.ndarray, nrows_chunk: int = 1 << 16):
+        """Append the rows of 'buffer' (classified by the MolKind values in 'kinds'), parsing their sections in chunks"""
+        self.extend_parsed(buffer, mp.MolColumns.from_buffer(buffer, kinds, nrows_chunk))
+
+    # --------------------------------------------------------------------------
+    def extend_parsed(self, buffer: mp.MolBuffer, columns: mp.MolColumns):
+        """Append rows whose sections were already parsed, e.g. by a background parser outside of the lock"""
+        assert len(buffer) == len(columns), "The buffer and the columns must hold the same rows"
+        self._buffer.extend(buffer)
+        self._columns.extend_columns(columns)
+        lengths = buffer.get_lengths()
+        if len(lengths): self._width = max(self._width, int(lengths.max()))
+
+    # --------------------------------------------------------------------------
+    def extend_models(self, rows_model: list[int], numbers: list[int | None], rows_endmdl: list[int]):
+        """Register the MODEL and ENDMDL records found at the given rows. The first model becomes the current one."""
+        self._models.extend(rows_model, numbers, rows_endmdl)
+        self._cache_choices.clear()
+        if self.current_model is None and len(self._models):
+            self.current_model = 0
 
     # --------------------------------------------------------------------------
     def pad_lines(self):
-        max_line_length = max(len(line.text) for line in self._lines)
-        for line in self._lines:
-            line.text = line.text.ljust(max_line_length)
+        lengths = self._buffer.get_lengths()
+        self._width = int(lengths.max()) if len(lengths) else 0
 
     # --------------------------------------------------------------------------
     def count_lines(self, filterkey: callable = None) -> int:
+        """Count the rows accepted by 'filterkey'. If it's None, count the
+        rows visible according to the current filters and shown kinds (O(1) once cached)."""
         if filterkey is None:
-            filterkey = lambda _: 1
-        return sum(filterkey(line) for line in self._lines)
+            return len(self.get_visible_rows())
+        return sum(map(filterkey, self._iter_all_lines()))
 
     # --------------------------------------------------------------------------
-    def iter_lines(self, filterkey: callable, nlines: int = None):
+    def iter_lines(self, filterkey: callable = None, nlines: int = None):
+        """Yield up to 'nlines' rows accepted by 'filterkey', starting at 'current_line'.
+        If 'filterkey' is None, the visible rows index is sliced instead of scanning every row."""
         if nlines is None:
-            nlines = len(self._lines) - self.current_line
+            nlines = len(self) - self.current_line
 
-        lines = tuple(
-            filter(filterkey, self._lines)
-        )[self.current_line : self.current_line+nlines]
+        if filterkey is None:
+            rows = self.get_visible_rows()[self.current_line : self.current_line + nlines]
+            for idx in rows:
+                yield self.get_line(int(idx))
+            return
 
-        for line in lines:
-            yield line
+        yield from islice(
+            filter(filterkey, self._iter_all_lines()),
+            self.current_line, self.current_line + nlines
+        )
+
+    # --------------------------------------------------------------------------
+    def get_visible_rows(self) -> np.ndarray:
+        """Return the indices of the rows shown: the ones matching the filters (see get_filtered_rows),
+        except for the rows of folded groups, replaced by their first one (shown as a summary line, see set_fold)"""
+        rows = self.get_filtered_rows()
+        if self._fold is None: return rows
+        state = (self._get_visible_state(), self._fold, self._expanded)
+        if self._cache_folded is None or self._cache_folded[0] != state:
+            self._cache_folded = (state, self._fold_rows(rows))
+        return self._cache_folded[1]
+
+    # --------------------------------------------------------------------------
+    def get_filtered_rows(self) -> np.ndarray:
+        """Return the indices of the rows matching the active filters and shown kinds
+        (and belonging to the current model, near the center of the spatial filter, in the selection and ranges, if any)"""
+        if len(self._index) != len(self): self.update_filters(len(self._index))
+        if self.current_model is None and self._near is None and self._selection is None and not self._ranges:
+            return self._index.get_visible_rows(self._filter_idxs, self._kinds_shown)
+
+        state = self._get_visible_state()
+        if self._cache_visible is None or self._cache_visible[0] != state:
+            if self._near is None:
+                rows = self._index.get_visible_rows(self._filter_idxs, self._kinds_shown)
+            else: # the rows near the center are few, check them alone instead of combining every mask
+                rows = self._index.select_rows(self._get_rows_near(), self._filter_idxs, self._kinds_shown)
+            self._cache_visible = (state, self._select_rows(rows))
+        return self._cache_visible[1]
+
+    # --------------------------------------------------------------------------
+    def get_stats(self, name: str, wait: bool = True) -> mp.MolStats | None:
+        """Statistics of the section 'name' over the visible atoms (ATOM/HETATM rows).
+        They're kept until the visible rows change, so going back and forth between sections doesn't compute them again.
+        If not 'wait' and there are many visible rows, they're computed on a background thread instead (one at a time),
+        returning None until they're ready (the caller is expected to ask again later)."""
+        state = self._get_visible_state()
+        if self._cache_stats is None or self._cache_stats[0] != state:
+            self._cache_stats = (state, {})
+        stats = self._cache_stats[1].get(name, None)
+        if stats is not None: return stats
+
+        rows = self.get_filtered_rows()
+        if wait or len(rows) <= self.NROWS_STATS_BACKGROUND:
+            stats = self._compute_stats(name, *self._gather_stats(name, rows))
+            self._cache_stats[1][name] = stats
+            return stats
+        if self._thread_stats is None or not self._thread_stats.is_alive():
+            args = (name, *self._gather_stats(name, rows), state)
+            self._thread_stats = threading.Thread(target = self._compute_stats_background, args = args, daemon = True)
+            self._thread_stats.start()
+        return None
+
+    # --------------------------------------------------------------------------
+    def get_line(self, idx: int) -> mp.MolLine:
+        if self._fold is not None and self._is_folded(idx): # summary of its group
+            return mp.MolLine(self._describe_group(idx).ljust(self._width), mp.MolKind.META)
+        text = self._buffer.get_text(idx).ljust(self._width)
+        kind = mp.MolKind(int(self._columns.get_kinds()[idx]))
+        return mp.MolLine(text, kind, idx)
 
     # --------------------------------------------------------------------------
     def iter_sections(self):
@@ -117,34 +319,383 @@ class MolData:
     def next_column(self):
         self.current_section = mp.Utils.next_cyclic(self.current_section, self.nsections)
 
+    # --------------------------------------------------------------------------
+    def get_filter_counts(self, key: str) -> np.ndarray:
+        """Number of rows that each reference value of the filter 'key' would show, given everything else shown (e.g. the other filters).
+        They're kept while everything else stays the same, so cycling through the values of a filter only counts the other filters again,
+        and the rows appended since (e.g. while parsing in the background) are counted on their own."""
+        self._assert_key(key)
+        if len(self._index) != len(self): self.update_filters(len(self._index))
+        if self.current_model is None and self._near is None and self._selection is None and not self._ranges and \
+            all(idx is None for k,idx in self._filter_idxs.items() if k != key): # nothing else to combine with
+            return self._index.count_values(key, self._kinds_shown, len(self._filter_refs[key]))
+
+        state = self._get_facet_state(key)
+        cached = self._cache_facets.get(key, None)
+        if cached is None or cached[0] != state:
+            cached = (state, 0, np.zeros(len(self._filter_refs[key]), dtype = np.int64))
+        _, lo, counts = cached
+        if lo < len(self):
+            codes = self._index.get_codes(key)[self._get_rows_facet(key, lo)]
+            counts = counts + np.bincount(codes[codes >= 0], minlength = len(counts))
+        self._cache_facets[key] = (state, len(self), counts)
+        return counts
+
     # --------------------------------------------------------------------------
     def next_filter(self, key):
+        """Move the filter 'key' to its next reference value found in the current model, skipping those that wouldn't show any row"""
         self._assert_key(key)
-        vals = self._filter_refs[key]
-        self._filter_idxs[key] = mp.Utils.next_cyclic(
-            self._filter_idxs[key], len(vals)
+        choices = self._get_filter_choices(key)
+        choices = choices[self.get_filter_counts(key)[choices] > 0]
+        if not len(choices): return # e.g. no atoms parsed yet
+
+        idx = self._filter_idxs[key]
+        pos = int(np.searchsorted(choices, idx)) if idx is not None else None
+        if (pos is not None) and (pos == len(choices) or choices[pos] != idx): # value missing in this model, restart
+            pos = None
+        pos = mp.Utils.next_cyclic(pos, len(choices))
+        self._filter_idxs[key] = None if pos is None else int(choices[pos])
+
+    # --------------------------------------------------------------------------
+    def filter_near(self, radius: float, residue: bool = False) -> bool:
+        """Show only the rows within 'radius' Å of the atom at 'current_line' (or of any atom of its residue), on top of the other filters.
+        The center stays the same row while browsing (e.g. other models are compared against its coordinates), and 'current_line' is moved to it.
+        Returns False if the row at 'current_line' isn't an atom with coordinates."""
+        rows = self.get_visible_rows()
+        if not (0 <= self.current_line < len(rows)) or not radius >= 0: return False
+        row = int(rows[self.current_line])
+        if np.isnan(self._get_xyz([row])).any(): return False
+
+        self._near = (row, float(radius), residue)
+        self.current_line = self._get_line_of_row(row)
+        return True
+
+    # --------------------------------------------------------------------------
+    def clear_near(self):
+        self._near = None
+
+    # --------------------------------------------------------------------------
+    def describe_near(self) -> str | None:
+        """Text describing the spatial filter, if any, e.g. '5 Å of residue HEM A 201'"""
+        if self._near is None: return
+        row, radius, residue = self._near
+        atomname, resname, chain, icode = (
+            self._columns.get_field(name)[row].decode() for name in ("ATOM_NAME", "RESIDUE_NAME", "CHAIN_ID", "RESIDUE_INSERTION_CODE")
         )
+        resseq = self._columns.get_field("RESIDUE_SEQUENCE_NUM")[row]
+        name_residue = f"{resname} {chain} {resseq}{icode}"
+        return f"{radius:g} Å of " + (f"residue {name_residue}" if residue else f"atom {atomname} of {name_residue}") + f" (row {row + 1})"
+
+    # --------------------------------------------------------------------------
+    def find(self, pattern: str, backward: bool = False) -> bool:
+        """Move 'current_line' to the next (or previous) visible row whose text matches the regex 'pattern', wrapping around.
+        Rows are searched in growing blocks from the top one, so near matches are found right away.
+        Returns False if no visible row matches, and raises a ValueError if 'pattern' isn't a valid regex."""
+        try: regex = re.compile(pattern.encode(), re.MULTILINE)
+        except re.error as e: raise ValueError(f"Invalid pattern, {e}") from None
+
+        visible = self.get_filtered_rows() # folded rows are searched too
+        nvisible = len(visible)
+        if not nvisible: return False
+        lo, hi = self._get_span_top()
+        spans = ((0, lo), (lo, nvisible)) if backward else ((hi, nvisible), (0, hi)) # the top row itself goes last
+        for start,end in spans:
+            for a,b in self._iter_search_blocks(start, end, backward):
+                found = np.flatnonzero(self._match_visible(regex, visible[a:b]))
+                if len(found):
+                    self.current_line = self._get_line_of_row(int(visible[a + int(found[-1] if backward else found[0])]))
+                    return True
+        return False
+
+    # --------------------------------------------------------------------------
+    def jump_serial(self, serial: int) -> bool:
+        """Move 'current_line' to the next visible atom with the given serial number (wrapping around). Returns False if there's none."""
+        return self._jump_rows(self._sorted.get_rows(self._columns, "SERIAL_NUM", serial, serial))
+
+    # --------------------------------------------------------------------------
+    def jump_residue(self, chain: str, resseq: int, icode: str = "") -> bool:
+        """Move 'current_line' to the first visible atom of the next occurrence of a residue (wrapping around),
+        e.g. of another model when all of them are shown. Returns False if there's none."""
+        rows = self._sorted.get_rows(self._columns, "RESIDUE_SEQUENCE_NUM", resseq, resseq) # few rows, checked directly
+        rows = rows[
+            (self._columns.get_field("CHAIN_ID")[rows] == chain.strip().encode()) &
+            (self._columns.get_field("RESIDUE_INSERTION_CODE")[rows] == icode.strip().encode())
+        ]
+        return self._jump_rows(rows)
+
+    # --------------------------------------------------------------------------
+    def validate(self) -> mp.MolValidator:
+        """Check the rows against the PDB layout (see MolValidator), only the ones appended since the last call after the first one.
+        From then on, their errors are available through get_errors."""
+        if self._validator is None: self._validator = mp.MolValidator()
+        get_field = lambda name, lo, hi: self._columns.get_field(name)[lo:hi] # already parsed
+        self._validator.extend_buffer(self._buffer, self._columns.get_kinds(), len(self), get_field)
+        return self._validator
+
+    # --------------------------------------------------------------------------
+    def is_validated(self) -> bool:
+        return self._validator is not None
+
+    # --------------------------------------------------------------------------
+    def get_error_flags(self, idx: int) -> int:
+        """Flags of the checks failed by the row 'idx' (see MolValidator), 0 if it's fine or wasn't validated yet"""
+        if self._validator is None or idx >= len(self._validator): return 0
+        return int(self._validator.get_flags()[idx])
+
+    # --------------------------------------------------------------------------
+    def get_errors(self, idx: int) -> list[str]:
+        """Messages of the checks failed by the row 'idx', if validated"""
+        return mp.MolValidator.describe(self.get_error_flags(idx))
+
+    # --------------------------------------------------------------------------
+    def next_error(self, backward: bool = False) -> bool:
+        """Move 'current_line' to the next (or previous) visible row with format errors, wrapping around.
+        Validates the rows not checked yet first. Returns False if no visible row has errors."""
+        pos = self._get_visible_positions(self.validate().get_rows_invalid())
+        if not len(pos): return False
+        if backward:
+            above = pos[pos < self.current_line]
+            self.current_line = int(above[-1] if len(above) else pos[-1])
+        else:
+            below = pos[pos > self.current_line]
+            self.current_line = int(below[0] if len(below) else pos[0])
+        return True
+
+    # --------------------------------------------------------------------------
+    def set_diff(self, diff: mp.MolDiff):
+        self._diff = diff
+
+    # --------------------------------------------------------------------------
+    def get_diff(self) -> mp.MolDiff | None:
+        return self._diff
+
+    # --------------------------------------------------------------------------
+    def get_diff_flags(self, idx: int) -> int:
+        """Flags of the fields changed in the row 'idx' (see MolDiff), 0 if it's not an atom compared"""
+        if self._diff is None or idx >= len(self._diff): return 0
+        return int(self._diff.get_flags()[idx])
+
+    # --------------------------------------------------------------------------
+    def export(self, path: str, fmt: str | None = None) -> int:
+        """Write the visible rows (folded or not) to 'path' (see MolExport for the formats), chunk by chunk.
+        Returns the number of rows written."""
+        rows = self.get_filtered_rows()
+        kinds = self._columns.get_kinds()
+        with mp.MolExport(path, fmt) as export:
+            for start in range(0, len(rows), mp.MolExport.NROWS_CHUNK):
+                chunk = rows[start:start + mp.MolExport.NROWS_CHUNK]
+                get_field = lambda name, chunk = chunk: self._columns.get_field(name)[chunk]
+                export.write_rows(self._buffer, chunk, kinds[chunk], get_field)
+        return export.nrows
+
+    # --------------------------------------------------------------------------
+    def next_group(self, level: str, backward: bool = False) -> bool:
+        """Move 'current_line' to the start of the next (or previous) residue or chain ('level', see MolHierarchy.LEVELS) with shown rows.
+        Going backward from within a group moves to its start first. Returns False if there's no such group.
+        Only a few binary searches are done (skipping the groups without shown rows), whatever the size of the data."""
+        shown = self.get_visible_rows()
+        if not len(shown): return False
+        hierarchy = self._get_hierarchy()
+        line = min(self.current_line, len(shown) - 1)
+        group = hierarchy.get_group(int(shown[line]), level)
+        if not backward:
+            if group + 1 >= hierarchy.count(level): return False
+            pos = self._find_group_line(shown, self._search(shown, hierarchy.get_range(group + 1, level)[0]), level)
+            if pos is None: return False
+            self.current_line = pos
+            return True
+
+        if group < 0: return False
+        pos = self._search(shown, hierarchy.get_range(group, level)[0])
+        while pos >= line: # already at the start of the group (or the top row isn't in it): look for the previous one
+            if pos == 0: return False
+            row = int(shown[pos - 1])
+            group = hierarchy.get_group(row, level)
+            if group < 0: return False
+            start, end = hierarchy.get_range(group, level)
+            line, pos = pos - 1, self._search(shown, start)
+            if row < end: break
+        self.current_line = pos
+        return True
+
+    # --------------------------------------------------------------------------
+    def set_fold(self, level: str | None):
+        """Show every residue or chain ('level', see MolHierarchy.LEVELS) as a single summary line, or every row again (None).
+        The top row stays at the top (its summary line, if folded)."""
+        assert level is None or level in mp.MolHierarchy.LEVELS, f"Invalid fold level: '{level}'"
+        shown = self.get_visible_rows()
+        row = int(shown[min(self.current_line, len(shown) - 1)]) if len(shown) else None
+        self._fold = level
+        self._expanded = frozenset()
+        if row is not None: self.current_line = self._get_line_of_row(row)
+
+    # --------------------------------------------------------------------------
+    def get_fold(self) -> str | None:
+        return self._fold
+
+    # --------------------------------------------------------------------------
+    def toggle_expanded(self) -> bool:
+        """Unfold the group at 'current_line', or fold it back if unfolded.
+        Returns False if nothing is folded or the top row isn't part of a group."""
+        shown = self.get_visible_rows()
+        if self._fold is None or not len(shown): return False
+        row = int(shown[min(self.current_line, len(shown) - 1)])
+        hierarchy = self._get_hierarchy()
+        group = hierarchy.get_group(row, self._fold)
+        if group < 0 or row >= hierarchy.get_range(group, self._fold)[1]: return False
+        self._expanded ^= {group}
+        self.current_line = self._get_line_of_row(row)
+        return True
+
+    # --------------------------------------------------------------------------
+    def set_selection(self, text: str | None):
+        """Show only the rows picked by a selection expression (see MolSelection), on top of the other filters.
+        An empty 'text' (or None) clears it. Raises a ValueError, keeping the previous selection, if 'text' isn't valid."""
+        text = (text or "").strip()
+        if text: mp.MolSelection.compile(text)
+        self._selection = text or None
+
+    # --------------------------------------------------------------------------
+    def get_selection(self) -> str | None:
+        return self._selection
+
+    # --------------------------------------------------------------------------
+    def set_range(self, name: str, lo: float | None, hi: float | None):
+        """Show only the atoms whose value for the numeric section 'name' is within [lo,hi], on top of the other filters.
+        Either bound can be None (no bound), and both being None clears the range of 'name'."""
+        assert self._columns.is_numeric(name), f"Can't filter a range of the non-numeric section '{name}'"
+        assert all(bound is None or math.isfinite(bound) for bound in (lo, hi)), f"Invalid range bounds {lo}:{hi}"
+        if lo is None and hi is None: self._ranges.pop(name, None)
+        else: self._ranges[name] = (lo, hi)
+
+    # --------------------------------------------------------------------------
+    def clear_ranges(self):
+        self._ranges.clear()
+
+    # --------------------------------------------------------------------------
+    def get_ranges(self) -> dict[str, tuple[float | None, float | None]]:
+        return dict(self._ranges)
+
+    # --------------------------------------------------------------------------
+    def describe_ranges(self) -> str | None:
+        """Text describing the range filters, if any, e.g. 'bfactor 40: resseq 10:20' (sections by their shortest alias)"""
+        if not self._ranges: return
+        aliases = {}
+        for alias,name in mp.MolSelection.ALIASES.items():
+            if len(alias) > 1 and (name not in aliases or len(alias) < len(aliases[name])): aliases[name] = alias
+        format_bound = lambda bound: "" if bound is None else f"{bound:g}"
+        return ' '.join(
+            f"{aliases.get(name, name.lower())} {format_bound(lo)}:{format_bound(hi)}" for name,(lo, hi) in self._ranges.items()
+        )
+
+    # --------------------------------------------------------------------------
+    def count_models(self) -> int:
+        return len(self._models)
+
+    # --------------------------------------------------------------------------
+    def get_model_number(self) -> int | None:
+        """Serial number of the current model, as written in its MODEL record"""
+        if self.current_model is None: return
+        return self._models.get_number(self.current_model)
+
+    # --------------------------------------------------------------------------
+    def prev_model(self):
+        if self.current_model is None: return
+        self.set_model(max(0, self.current_model - 1))
+
+    # --------------------------------------------------------------------------
+    def next_model(self):
+        if self.current_model is None: return
+        self.set_model(min(len(self._models) - 1, self.current_model + 1))
+
+    # --------------------------------------------------------------------------
+    def jump_model(self, number: int) -> bool:
+        """Show the model with the given serial number. Returns False if there's no such model."""
+        idx = self._models.find_number(number)
+        if idx is None: return False
+        self.set_model(idx)
+        return True
+
+    # --------------------------------------------------------------------------
+    def set_model(self, idx: int):
+        """Show the idx-th model, and prefetch the filter values and first rows of its neighbours"""
+        assert 0 <= idx < len(self._models), f"Invalid model index: {idx}"
+        self.current_model = idx
+        for neighbour in (idx - 1, idx + 1):
+            if not (0 <= neighbour < len(self._models)): continue
+            for key in self._filter_refs.keys():
+                self._get_filter_choices(key, neighbour)
+            start, end = self._models.get_range(neighbour, len(self))
+            if start < end: self._buffer.get_text(start)
+
+    # --------------------------------------------------------------------------
+    def get_view_state(self) -> dict:
+        """Return what's being browsed (position, column, model, filters, shown kinds and fold), e.g. to restore it after parsing the file again.
+        Filters are stored by value, as their indices might change."""
+        return {
+            "current_line": self.current_line,
+            "current_section": self.current_section,
+            "current_model": self.current_model,
+            "filters": {k: self._filter_refs[k][idx] for k,idx in self._filter_idxs.items() if idx is not None},
+            "kinds_shown": dict(self._kinds_shown),
+            "near": self._near,
+            "selection": self._selection,
+            "ranges": dict(self._ranges),
+            "fold": self._fold,
+            "expanded": sorted(self._expanded),
+        }
+
+    # --------------------------------------------------------------------------
+    def set_view_state(self, state: dict):
+        """Restore a state given by get_view_state. Filter values and models not found (yet) in the data are ignored."""
+        self.current_line = state["current_line"]
+        self.current_section = state["current_section"]
+        if state["current_model"] is not None and state["current_model"] < len(self._models):
+            self.current_model = state["current_model"]
+        self.reset_filter_idxs()
+        for k,ref in state["filters"].items():
+            refs = self._filter_refs[k]
+            if ref in refs: self._filter_idxs[k] = refs.index(ref)
+        self._kinds_shown.update(state["kinds_shown"])
+        near = state.get("near", None)
+        self._near = near if near is not None and near[0] < len(self) else None
+        self._selection = state.get("selection", None)
+        self._ranges = dict(state.get("ranges", {}))
+        self._fold = state.get("fold", None)
+        self._expanded = frozenset(state.get("expanded", ()))
 
     # --------------------------------------------------------------------------
     def reset_filter_idxs(self):
         for k in self._filter_idxs.keys():
             self._filter_idxs[k] = None
 
+    # --------------------------------------------------------------------------
+    def set_kind_shown(self, kind: mp.MolKind, shown: bool):
+        assert kind in self._kinds_shown, f"Can't toggle the visibility of '{kind}' rows"
+        self._kinds_shown[kind] = shown
+
+    # --------------------------------------------------------------------------
+    def is_kind_shown(self, kind: mp.MolKind) -> bool:
+        return self._kinds_shown.get(kind, True)
+
     # --------------------------------------------------------------------------
     def any_filter_active(self):
-        return any(idx is not None for idx in self._filter_idxs.values())
+        return self._near is not None or self._selection is not None or bool(self._ranges) or \
+            any(idx is not None for idx in self._filter_idxs.values())
 
     # --------------------------------------------------------------------------
     def get_filter_render_data(self, key: str, w_max = int) -> tuple[str, list[int]]:
         """Return 'chars' and 'attrs' data for rendering a filter's state with PrismaTUI"""
         self._assert_key(key)
-        vals = [v if v else "''" for v in self._filter_refs[key]]
+        choices = self._get_filter_choices(key).tolist()
+        counts = self.get_filter_counts(key)
+        vals = [(self._filter_refs[key][i] or "''") + f"({self._format_count(counts[i])})" for i in choices]
         idx = self._filter_idxs[key]
 
         chars = ' '.join(vals)
         mask = ' '.join(
-            len(v)*('!' if idx == i else ' ')
-            for i,v in enumerate(vals)
+            len(v)*('!' if idx == i else ('.' if not counts[i] else ' '))
+            for i,v in zip(choices, vals)
         )
 
         xpos_highlight = mask.find('!')
@@ -152,7 +703,7 @@ class MolData:
         chars = chars[xoffset:]
         mask  = mask [xoffset:]
 
-        attrs = [[pr.A_REVERSE if m == '!' else pr.A_NORMAL for m in mask]]
+        attrs = [[pr.A_REVERSE if m == '!' else (pr.A_DIM if m == '.' else pr.A_NORMAL) for m in mask]]
         return chars, attrs
 
     # --------------------------------------------------------------------------
@@ -169,11 +720,325 @@ class MolData:
         if idx is None: return True
 
         key_pdb_section = self.KEYS_FILTERS[key]
-        to_evaluate = line.get_section_data(key_pdb_section)
+        to_evaluate = self._get_section_data(line, key_pdb_section)
         if to_evaluate is None: return False
 
         return to_evaluate.strip() == vals[idx]
 
+    # --------------------------------------------------------------------------
+    def _get_section_data(self, line: mp.MolLine, name_section: str) -> str | None:
+        """Same as MolLine.get_section_data, but served from the parsed columns when the line belongs to this MolData"""
+        if line.idx is None:
+            return line.get_section_data(name_section)
+        if line.kind not in (mp.MolKind.ATOM, mp.MolKind.HETE): return
+        return self._columns.get_field(name_section)[line.idx].decode()
+
+    # --------------------------------------------------------------------------
+    def _get_filter_choices(self, key: str, idx_model: int | None = None) -> np.ndarray:
+        """Return the (sorted) indices of the filter references of 'key' found in a model (by default, the current one).
+        They are computed once per model, so only the models actually browsed pay for it."""
+        if idx_model is None: idx_model = self.current_model
+        if idx_model is None:
+            return np.arange(len(self._filter_refs[key]))
+
+        choices = self._cache_choices.get((idx_model, key), None)
+        if choices is None:
+            if len(self._index) != len(self): self.update_filters(len(self._index))
+            start, end = self._models.get_range(idx_model, len(self))
+            choices = np.unique(self._index.get_codes(key)[start:end])
+            choices = choices[choices >= 0]
+            self._cache_choices[(idx_model, key)] = choices
+        return choices
+
+    # --------------------------------------------------------------------------
+    def _get_facet_state(self, key: str) -> tuple:
+        """Everything the counts of the filter 'key' depend on, except for the rows covered: the visible state without that filter"""
+        return (
+            self.current_model, self._near, self._selection, tuple(self._ranges.items()),
+            tuple((k, idx) for k,idx in self._filter_idxs.items() if k != key), tuple(self._kinds_shown.items()),
+        )
+
+    # --------------------------------------------------------------------------
+    def _get_rows_facet(self, key: str, lo: int = 0) -> np.ndarray:
+        """Rows from 'lo' onwards that would be visible if the filter 'key' was disabled"""
+        if self._filter_idxs[key] is None:
+            rows = self.get_filtered_rows()
+            return rows[self._search(rows, lo):]
+        filter_idxs = self._filter_idxs | {key: None}
+        if self._near is None:
+            rows = self._index.get_rows(lo, len(self), filter_idxs, self._kinds_shown)
+        else:
+            rows = self._index.select_rows(self._get_rows_near(), filter_idxs, self._kinds_shown)
+            rows = rows[self._search(rows, lo):]
+        return self._select_rows(rows)
+
+    # --------------------------------------------------------------------------
+    def _select_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Filter the sorted 'rows' (already matching the filters and kinds shown) down to the current model, selection and ranges, if any"""
+        if self.current_model is not None:
+            rows = self._models.select_rows(rows, self.current_model, len(self))
+        if self._selection is not None:
+            rows = rows[self._get_mask_selection()[rows]]
+        if self._ranges:
+            rows = rows[self._get_mask_ranges()[rows]]
+        return rows
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _format_count(count: int) -> str:
+        """Short form of a count, e.g. 964, 12.3k, 1.2M"""
+        if count < 1000: return str(count)
+        if count < 1_000_000: return f"{count / 1e3:.3g}k"
+        return f"{count / 1e6:.3g}M"
+
+    # --------------------------------------------------------------------------
+    def _get_rows_near(self) -> np.ndarray:
+        """Rows within the radius of the spatial filter's center (sorted). The grid is only rebuilt once the data doubled since it was built:
+        rows appended since then (e.g. still being parsed) are measured one by one, which costs at most as much as the rebuild would."""
+        if self._grid is None or 2 * len(self._grid) < len(self):
+            self._grid = mp.MolGrid.from_columns(self._columns)
+
+        row, radius, residue = self._near
+        centers = self._get_xyz(self._get_residue_rows(row) if residue else [row])
+        centers = centers[~np.isnan(centers).any(axis = 1)]
+        rows = self._grid.query(centers, radius)
+
+        lo = len(self._grid)
+        if lo < len(self):
+            rows_new = np.flatnonzero(mp.MolGrid.get_mask_near(self._get_xyz(slice(lo, len(self))), centers, radius)) + lo
+            rows = np.concatenate((rows, rows_new))
+        return rows
+
+    # --------------------------------------------------------------------------
+    def _get_mask_selection(self) -> np.ndarray:
+        """Mask of the rows in the selection, or terminator rows (always visible). It's kept while the selection stays
+        the same, only evaluating the rows appended since (e.g. still being parsed) instead of all of them."""
+        text, lo, mask = self._cache_selection if self._cache_selection is not None else (None, 0, None)
+        if text != self._selection: lo, mask = 0, np.empty(0, dtype = bool)
+        if lo < len(self):
+            mask = mp.Utils.ensure_capacity(mask, len(self))
+            mask[lo:len(self)] = mp.MolSelection.compile(self._selection).evaluate_columns(self._columns, lo)
+            mask[lo:len(self)] |= self._columns.get_kinds()[lo:] == mp.MolKind.NONE.value
+            self._cache_selection = (self._selection, len(self), mask)
+        return mask[:len(self)]
+
+    # --------------------------------------------------------------------------
+    def _get_visible_state(self) -> tuple:
+        """Everything the visible rows depend on"""
+        return (
+            self.current_model, self._near, self._selection, tuple(self._ranges.items()), len(self),
+            tuple(self._filter_idxs.items()), tuple(self._kinds_shown.items()),
+        )
+
+    # --------------------------------------------------------------------------
+    def _match_visible(self, regex: re.Pattern, rows: np.ndarray) -> np.ndarray:
+        """Mask of the (sorted, visible) 'rows' matching 'regex'. Their whole span is scanned in bulk, unless they're sparse in it."""
+        lo, hi = int(rows[0]), int(rows[-1]) + 1
+        if hi - lo > self.RATIO_SEARCH_SPARSE * len(rows):
+            return self._buffer.match_rows(regex, rows)
+        return np.isin(rows, self._buffer.find_rows(regex, lo, hi), assume_unique = True)
+
+    # --------------------------------------------------------------------------
+    def _iter_search_blocks(self, start: int, end: int, backward: bool):
+        """Split [start,end[ into blocks of doubling size, from its start (or its end, if 'backward')"""
+        size, size_max = self.NROWS_SEARCH_BLOCK
+        while start < end:
+            if backward:
+                yield max(start, end - size), end
+                end = max(start, end - size)
+            else:
+                yield start, min(end, start + size)
+                start = min(end, start + size)
+            size = min(2 * size, size_max)
+
+    # --------------------------------------------------------------------------
+    def _jump_rows(self, rows: np.ndarray) -> bool:
+        """Move 'current_line' to the first visible one of the sorted 'rows' below the top row (wrapping around).
+        Consecutive visible rows count as one (e.g. the atoms of a residue), landing on the first of them."""
+        pos = self._get_visible_positions(rows)
+        pos = pos[np.diff(pos, prepend = -2) != 1]
+        if not len(pos): return False
+        below = pos[pos > self.current_line]
+        self.current_line = int(below[0] if len(below) else pos[0])
+        return True
+
+    # --------------------------------------------------------------------------
+    def _get_visible_positions(self, rows: np.ndarray) -> np.ndarray:
+        """Positions among the shown rows of the visible ones of the sorted 'rows' (those of a folded group, once at its summary line)"""
+        visible = self.get_filtered_rows()
+        pos = np.searchsorted(visible, rows)
+        valid = pos < len(visible)
+        valid[valid] = visible[pos[valid]] == rows[valid]
+        if self._fold is None: return pos[valid]
+        return np.unique(np.searchsorted(self.get_visible_rows(), rows[valid], side = "right") - 1)
+
+    # --------------------------------------------------------------------------
+    def _get_line_of_row(self, row: int) -> int:
+        """Position among the shown rows of the visible 'row' (the summary line of its group, if folded)"""
+        if self._fold is None: return self._search(self.get_visible_rows(), row)
+        return max(0, self._search(self.get_visible_rows(), row, "right") - 1)
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _search(rows: np.ndarray, row: int, side: str = "left") -> int:
+        """np.searchsorted for a single row, cast to the dtype of 'rows' so that they aren't all cast to a wider one"""
+        return int(np.searchsorted(rows, rows.dtype.type(row), side = side))
+
+    # --------------------------------------------------------------------------
+    def _get_span_top(self) -> tuple[int, int]:
+        """[start,end[ positions among the visible rows (see get_filtered_rows) of the ones at 'current_line' (all those of its group, if folded)"""
+        shown = self.get_visible_rows()
+        row = int(shown[min(self.current_line, len(shown) - 1)])
+        visible = self.get_filtered_rows()
+        start = self._search(visible, row)
+        if self._fold is None or not self._is_folded(row): return start, start + 1
+        _, end = self._get_hierarchy().get_range(self._get_hierarchy().get_group(row, self._fold), self._fold)
+        return start, self._search(visible, end)
+
+    # --------------------------------------------------------------------------
+    def _get_hierarchy(self) -> mp.MolHierarchy:
+        """Residues and chains of every row (catching up with the rows not indexed by update_filters, e.g. loaded from the cache)"""
+        if len(self._hierarchy) != len(self):
+            self._hierarchy.extend(self._buffer, self._columns, len(self))
+        return self._hierarchy
+
+    # --------------------------------------------------------------------------
+    def _fold_rows(self, rows: np.ndarray) -> np.ndarray:
+        """The visible 'rows', leaving only the first one of every folded group"""
+        hierarchy = self._get_hierarchy()
+        groups = hierarchy.get_groups(rows, self._fold)
+        inside = groups >= 0 # not past the last atom of the group either (e.g. TER records)
+        inside[inside] = rows[inside] < hierarchy.get_ends(self._fold)[groups[inside]]
+        kept = ~inside | (np.diff(np.where(inside, groups, -1), prepend = -1) != 0)
+        if self._expanded:
+            kept |= inside & np.isin(groups, np.fromiter(self._expanded, dtype = np.int64))
+        return rows[kept]
+
+    # --------------------------------------------------------------------------
+    def _is_folded(self, row: int) -> bool:
+        """Whether the shown 'row' stands for its whole group"""
+        hierarchy = self._get_hierarchy()
+        group = hierarchy.get_group(row, self._fold)
+        if group < 0 or group in self._expanded: return False
+        return row < hierarchy.get_range(group, self._fold)[1]
+
+    # --------------------------------------------------------------------------
+    def _describe_group(self, row: int) -> str:
+        """Summary line of the folded group of 'row', e.g. '+ residue ALA A 52   12 rows'"""
+        hierarchy = self._get_hierarchy()
+        group = hierarchy.get_group(row, self._fold)
+        start, end = hierarchy.get_range(group, self._fold)
+        visible = self.get_filtered_rows()
+        nrows = self._search(visible, end) - self._search(visible, start)
+        resname, chain, icode = (
+            self._columns.get_field(name)[start].decode() for name in ("RESIDUE_NAME", "CHAIN_ID", "RESIDUE_INSERTION_CODE")
+        )
+        chain = chain or "''" # blank chain ID
+        if self._fold == "chain":
+            return f"+ chain {chain}   {hierarchy.count_residues(group)} residues   {nrows} rows"
+        resseq = self._columns.get_field("RESIDUE_SEQUENCE_NUM")[start]
+        return f"+ residue {resname} {chain} {resseq}{icode}   {nrows} rows"
+
+    # --------------------------------------------------------------------------
+    def _find_group_line(self, shown: np.ndarray, pos: int, level: str) -> int | None:
+        """First of the shown rows from 'pos' onwards belonging to a group (skipping e.g. TER records and the rows after the last group)"""
+        hierarchy = self._get_hierarchy()
+        while pos < len(shown):
+            row = int(shown[pos])
+            group = hierarchy.get_group(row, level)
+            if group >= 0 and row < hierarchy.get_range(group, level)[1]: return pos
+            if group + 1 >= hierarchy.count(level): return
+            pos = self._search(shown, hierarchy.get_range(group + 1, level)[0])
+
+    # --------------------------------------------------------------------------
+    def _get_mask_ranges(self) -> np.ndarray:
+        """Mask of the rows within every range filter, or terminator rows (always visible)"""
+        state = (tuple(self._ranges.items()), len(self))
+        if self._cache_ranges is None or self._cache_ranges[0] != state:
+            mask = self._columns.get_kinds() == mp.MolKind.NONE.value
+            masks = [self._sorted.get_mask(self._columns, name, lo, hi) for name,(lo, hi) in self._ranges.items()]
+            mask |= np.logical_and.reduce(masks)
+            self._cache_ranges = (state, mask)
+        return self._cache_ranges[1]
+
+    # --------------------------------------------------------------------------
+    def _gather_stats(self, name: str, rows: np.ndarray) -> tuple[np.ndarray, list[str] | None]:
+        """Values of the section 'name' for the atoms among 'rows', and the references of their codes if the index codes them.
+        Both are copies, so they can be used once the lock is released (e.g. the data is reset when a followed file is truncated)."""
+        kinds = self._columns.get_kinds()[rows]
+        rows = rows[(kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value)]
+        key = next((k for k,v in self.KEYS_FILTERS.items() if v == name), None)
+        if key is not None: # its values are already coded by the index
+            return self._index.get_codes(key)[rows], list(self._filter_refs[key])
+        return self._columns.get_field(name)[rows], None
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _compute_stats(name: str, values: np.ndarray, refs: list[str] | None) -> mp.MolStats:
+        if refs is not None: return mp.MolStats.from_codes(name, values, refs)
+        return mp.MolStats.from_values(name, values)
+
+    # --------------------------------------------------------------------------
+    def _compute_stats_background(self, name: str, values: np.ndarray, refs: list[str] | None, state: tuple):
+        """Target of the thread started by get_stats, given copies of the values gathered under the lock. The lock is only
+        taken again to check that the visible rows are still the same, before computing and before storing the result."""
+        with self.lock:
+            if self._cache_stats is None or self._cache_stats[0] != state: return
+        stats = self._compute_stats(name, values, refs)
+        with self.lock:
+            if self._cache_stats is not None and self._cache_stats[0] == state:
+                self._cache_stats[1][name] = stats
+
+    # --------------------------------------------------------------------------
+    def _get_residue_rows(self, row: int, nrows_window: int = 256) -> np.ndarray:
+        """Rows of the atoms of the same residue as 'row' (same chain, number, insertion code and name), searched around it
+        and within its model: they're contiguous, except for the non-atom rows between them (e.g. ANISOU records)"""
+        lo, hi = (0, len(self)) if self.current_model is None else self._models.get_range(self.current_model, len(self))
+        fields = [self._columns.get_field(name) for name in ("CHAIN_ID", "RESIDUE_SEQUENCE_NUM", "RESIDUE_INSERTION_CODE", "RESIDUE_NAME")]
+        kinds = self._columns.get_kinds()
+        def get_same(a: int, b: int) -> tuple[np.ndarray, np.ndarray]: # masks of the atom rows in [a,b[ and of those in the residue
+            is_atom = (kinds[a:b] == mp.MolKind.ATOM.value) | (kinds[a:b] == mp.MolKind.HETE.value)
+            same = is_atom.copy()
+            for field in fields: same &= field[a:b] == field[row]
+            return is_atom, same
+
+        start = row
+        while start > lo:
+            a = max(lo, start - nrows_window)
+            is_atom, same = get_same(a, start)
+            others = np.flatnonzero(is_atom & ~same)
+            if len(others):
+                start = a + int(others[-1]) + 1
+                break
+            start = a
+
+        end = row + 1
+        while end < hi:
+            b = min(hi, end + nrows_window)
+            is_atom, same = get_same(end, b)
+            others = np.flatnonzero(is_atom & ~same)
+            if len(others):
+                end += int(others[0])
+                break
+            end = b
+
+        return np.flatnonzero(get_same(start, end)[1]) + start
+
+    # --------------------------------------------------------------------------
+    def _get_xyz(self, rows) -> np.ndarray:
+        """(nrows, 3) coordinates of the given rows (an array, list or slice of them), NaN for rows without them"""
+        return np.stack([self._columns.get_field(name)[rows] for name in mp.MolGrid.NAMES_COORDINATES], axis = 1)
+
+    # --------------------------------------------------------------------------
+    def _get_mask_atoms(self) -> np.ndarray:
+        kinds = self._columns.get_kinds()
+        return (kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value)
+
+    # --------------------------------------------------------------------------
+    def _iter_all_lines(self):
+        for idx in range(len(self)):
+            yield self.get_line(idx)
+
     # --------------------------------------------------------------------------
     def _assert_key(self, key: str):
         assert key in self._filter_refs, \
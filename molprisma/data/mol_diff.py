@@ -0,0 +1,221 @@
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolDiff:
+    """Atom by atom comparison of two MolData, e.g. a model before and after refinement, or two docking outputs.
+    Atoms are matched by identity (model, chain, residue number, insertion code, atom name and altloc): the key of every atom
+    is packed into a single integer, the keys of both files are factorized together with one sort, and each factorized key
+    indexes a direct-address table of the atoms of the second file (the k-th atom with a key in one file matching the k-th one in the other).
+    Coordinate deltas and changed sections are then computed for all the matched pairs at once.
+    Each compared atom gets a bit per changed section (see get_fields), or the ADDED/REMOVED flag if it's only in one of the files."""
+    NAMES_KEY = ("CHAIN_ID", "RESIDUE_SEQUENCE_NUM", "RESIDUE_INSERTION_CODE", "ATOM_NAME", "ALTLOC")
+    NAMES_IGNORED = ("SERIAL_NUM",) # renumbered whenever atoms are added or removed before them
+    NAMES_XYZ = ("X_COORDINATES", "Y_COORDINATES", "Z_COORDINATES")
+    NAME_RECORD = "RECORD" # ATOM vs HETATM
+    SPAN_RECORD = (0, 6)
+    FLAG_ADDED   = 1 << 30
+    FLAG_REMOVED = 1 << 31
+    MAX_KEY = 1 << 62 # packed keys stay below this, so that they fit in an int64
+
+    _fields: dict[str, tuple[int, int]] | None = None
+
+    # --------------------------------------------------------------------------
+    def __init__(self, mol_a: "mp.MolData", mol_b: "mp.MolData", tolerance: float = 0.0):
+        """Compare the atoms of 'mol_a' (before) and 'mol_b' (after). Atoms that moved 'tolerance' Å or less keep their coordinates as unchanged."""
+        self.name = f"{mol_a.name} → {mol_b.name}"
+        self.tolerance = tolerance
+        self._mols = (mol_a, mol_b)
+        atoms_a, atoms_b = (np.flatnonzero(mol._get_mask_atoms()) for mol in self._mols)
+        keys = self._get_keys(atoms_a, atoms_b)
+        matches = self._join(keys[:len(atoms_a)], keys[len(atoms_a):]) # index in atoms_b of each atom of atoms_a, or -1
+        is_matched = matches >= 0
+        pairs_a, pairs_b = atoms_a[is_matched], atoms_b[matches[is_matched]]
+        flags, deltas = self._compare(pairs_a, pairs_b)
+        is_changed = flags != 0
+        is_added = np.ones(len(atoms_b), dtype = bool)
+        is_added[matches[is_matched]] = False
+
+        ### order as in the second file, with the removed atoms right after the one matching the last matched atom before them
+        anchors = np.where(is_matched, matches, -1)
+        anchors = np.maximum.accumulate(anchors) if len(anchors) else anchors # furthest match so far, in case the second file reorders atoms
+        positions = np.concatenate((
+            2 * matches[is_matched][is_changed], 2 * np.flatnonzero(is_added), 2 * anchors[~is_matched] + 1
+        ))
+        order = np.argsort(positions, kind = "stable")
+        self.nchanged = int(np.count_nonzero(is_changed))
+        self.nadded = int(np.count_nonzero(is_added))
+        self.nremoved = len(atoms_a) - len(pairs_a)
+        self.nunchanged = len(pairs_a) - self.nchanged
+
+        self._rows_a = np.concatenate((pairs_a[is_changed], np.full(self.nadded, -1), atoms_a[~is_matched]))[order]
+        self._rows_b = np.concatenate((pairs_b[is_changed], atoms_b[is_added], np.full(self.nremoved, -1)))[order]
+        self._flags = np.concatenate((
+            flags[is_changed], np.full(self.nadded, self.FLAG_ADDED, dtype = np.uint32), np.full(self.nremoved, self.FLAG_REMOVED, dtype = np.uint32)
+        ))[order]
+        self._deltas = np.concatenate((deltas[is_changed], np.full(self.nadded + self.nremoved, np.nan, dtype = np.float32)))[order]
+
+    # --------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._flags)
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_fields(cls) -> dict[str, tuple[int, int]]:
+        """Every compared field with its [start,end[ columns. The i-th field sets the i-th bit of the flags when changed."""
+        if cls._fields is not None: return cls._fields
+        cls._fields = {cls.NAME_RECORD: cls.SPAN_RECORD} | {
+            name: (start, end) for name, start, end in mp.MolColumns.iter_layout()
+            if name not in cls.NAMES_KEY and name not in cls.NAMES_IGNORED
+        }
+        return cls._fields
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_spans(cls, flags: int) -> list[tuple[int, int]]:
+        """[start,end[ columns of the fields changed in a row with the given flags"""
+        return [span for i,span in enumerate(cls.get_fields().values()) if flags >> i & 1]
+
+    # --------------------------------------------------------------------------
+    def build_mol(self) -> "mp.MolData":
+        """MolData listing the changed and added atoms (rows of the second file) and the removed ones (rows of the first file)"""
+        mol_a, mol_b = self._mols
+        is_removed = self._rows_b < 0
+        rows_a, rows_b = self._rows_a[is_removed], self._rows_b[~is_removed]
+        buffer = mp.MolBuffer.from_bytes(mol_a._buffer.join_rows(rows_a))
+        buffer.extend(mp.MolBuffer.from_bytes(mol_b._buffer.join_rows(rows_b)))
+        columns = mol_a._columns.select_rows(rows_a)
+        columns.extend_columns(mol_b._columns.select_rows(rows_b))
+        rows = np.empty(len(self), dtype = np.int64) # of the concatenated buffer, in the order of the comparison
+        rows[is_removed] = np.arange(len(rows_a))
+        rows[~is_removed] = np.arange(len(rows_b)) + len(rows_a)
+
+        mol = mp.MolData(self.name)
+        mol.init_sections()
+        mol.extend_parsed(mp.MolBuffer.from_bytes(buffer.join_rows(rows)), columns.select_rows(rows))
+        mol.update_filters()
+        mol.append(mp.MolLine('', mp.MolKind.NONE))
+        mol.pad_lines()
+        mol.set_diff(self)
+        return mol
+
+    # --------------------------------------------------------------------------
+    def get_flags(self) -> np.ndarray:
+        return self._flags
+
+    # --------------------------------------------------------------------------
+    def describe(self, idx: int) -> str:
+        """What changed in the idx-th atom compared, e.g. 'moved 0.412 Å, TEMPERATURE_FACTOR 20.00 → 25.30'"""
+        mol_a, mol_b = self._mols
+        flags = int(self._flags[idx])
+        row_a, row_b = int(self._rows_a[idx]), int(self._rows_b[idx])
+        if flags & self.FLAG_ADDED: return f"added (line {row_b + 1} of {mol_b.name})"
+        if flags & self.FLAG_REMOVED: return f"removed (line {row_a + 1} of {mol_a.name})"
+
+        changes = [f"moved {self._deltas[idx]:.3f} Å"] if any(flags >> i & 1 for i in self._get_bits(self.NAMES_XYZ)) else []
+        for i,name in enumerate(self.get_fields()):
+            if not flags >> i & 1 or name in self.NAMES_XYZ: continue
+            if name == self.NAME_RECORD:
+                old, new = (mp.MolKind(mol._columns.get_kinds()[row]).name for mol,row in zip(self._mols, (row_a, row_b)))
+            else:
+                old, new = (self._format_value(mol._columns, name, row) for mol,row in zip(self._mols, (row_a, row_b)))
+            changes.append(f"{name} {old} → {new}")
+        return ", ".join(changes)
+
+    # --------------------------------------------------------------------------
+    def _get_keys(self, atoms_a: np.ndarray, atoms_b: np.ndarray) -> np.ndarray:
+        """Identity of every atom of both files (atoms_a's first), packed into an int64 per atom.
+        Each field takes the range of its values in the packed key, or the number of distinct ones if the range doesn't fit."""
+        keys = np.zeros(len(atoms_a) + len(atoms_b), dtype = np.int64)
+        nkeys = 1 # distinct values the keys so far can take
+        fields = [np.concatenate([mol._models.get_idxs(atoms, len(mol)) for mol,atoms in zip(self._mols, (atoms_a, atoms_b))])]
+        for name in self.NAMES_KEY:
+            fields.append(np.concatenate([self._get_integers(mol._columns.get_field(name)[atoms]) for mol,atoms in zip(self._mols, (atoms_a, atoms_b))]))
+
+        for values in fields:
+            if not len(values): break
+            lo, hi = int(values.min()), int(values.max())
+            nvalues = hi - lo + 1
+            if nkeys * nvalues >= self.MAX_KEY: # e.g. atom names, take their codes instead
+                _, values = np.unique(values, return_inverse = True)
+                lo, nvalues = 0, int(values.max()) + 1
+            if nkeys * nvalues >= self.MAX_KEY:
+                _, keys = np.unique(keys, return_inverse = True)
+                nkeys = int(keys.max()) + 1
+            keys = keys * nvalues + (values - lo)
+            nkeys *= nvalues
+        return keys
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _get_integers(values: np.ndarray) -> np.ndarray:
+        """int64 version of a column, with strings of up to 8 bytes taken as integers themselves (e.g. 4-letter atom names)"""
+        if values.dtype.kind != 'S': return values.astype(np.int64)
+        if values.dtype.itemsize <= 8: return values.astype("S8").view("<i8") # ASCII, so never negative
+        return np.unique(values, return_inverse = True)[1].astype(np.int64) # e.g. long mmCIF chain names
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _join(cls, keys_a: np.ndarray, keys_b: np.ndarray) -> np.ndarray:
+        """Index in 'keys_b' of the key matching each of 'keys_a' (-1 if none).
+        The k-th occurrence of a key in 'keys_a' matches its k-th occurrence in 'keys_b'."""
+        _, codes = np.unique(np.concatenate((keys_a, keys_b)), return_inverse = True)
+        codes_a, codes_b = codes[:len(keys_a)], codes[len(keys_a):]
+        order_b = np.argsort(codes_b, kind = "stable")
+        counts_b = np.bincount(codes_b, minlength = int(codes.max()) + 1 if len(codes) else 0)
+        firsts_b = np.cumsum(counts_b) - counts_b # direct-address table: where the atoms of each key start in order_b
+
+        ranks_a = cls._get_ranks(codes_a)
+        is_matched = ranks_a < counts_b[codes_a]
+        matches = np.full(len(keys_a), -1, dtype = np.int64)
+        matches[is_matched] = order_b[firsts_b[codes_a[is_matched]] + ranks_a[is_matched]]
+        return matches
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _get_ranks(codes: np.ndarray) -> np.ndarray:
+        """Occurrences of the same code before each one of 'codes'"""
+        order = np.argsort(codes, kind = "stable")
+        codes_sorted = codes[order]
+        firsts = np.flatnonzero(np.diff(codes_sorted, prepend = -1) != 0)
+        ranks = np.empty(len(codes), dtype = np.int64)
+        ranks[order] = np.arange(len(codes)) - np.repeat(firsts, np.diff(np.append(firsts, len(codes))))
+        return ranks
+
+    # --------------------------------------------------------------------------
+    def _compare(self, rows_a: np.ndarray, rows_b: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Flags of the fields changed between the matched 'rows_a' and 'rows_b', and how far each atom moved (in Å)"""
+        (columns_a, columns_b) = (mol._columns for mol in self._mols)
+        xyz_a, xyz_b = (np.stack([columns.get_field(name)[rows] for name in self.NAMES_XYZ], axis = 1)
+            for columns,rows in ((columns_a, rows_a), (columns_b, rows_b)))
+        deltas = np.sqrt(((xyz_b - xyz_a) ** 2).sum(axis = 1))
+        moved = ~(deltas <= self.tolerance) # NaN too, e.g. coordinates missing in one of the files
+
+        flags = np.zeros(len(rows_a), dtype = np.uint32)
+        for i,name in enumerate(self.get_fields()):
+            if name == self.NAME_RECORD:
+                changed = columns_a.get_kinds()[rows_a] != columns_b.get_kinds()[rows_b]
+            else:
+                values_a, values_b = columns_a.get_field(name)[rows_a], columns_b.get_field(name)[rows_b]
+                changed = values_a != values_b
+                if values_a.dtype.kind == 'f': changed &= ~(np.isnan(values_a) & np.isnan(values_b))
+                if name in self.NAMES_XYZ: changed &= moved
+            flags |= changed.astype(np.uint32) << np.uint32(i)
+        return flags, deltas
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _get_bits(cls, names: tuple[str, ...]) -> list[int]:
+        return [i for i,name in enumerate(cls.get_fields()) if name in names]
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _format_value(columns: mp.MolColumns, name: str, row: int) -> str:
+        value = columns.get_field(name)[row]
+        if isinstance(value, bytes): return repr(value.decode())
+        if name in mp.MolColumns.NDECIMALS: return f"{value:.{mp.MolColumns.NDECIMALS[name]}f}"
+        return str(value)
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,244 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolExport:
+    """Writes rows to a file as a PDB subset (their raw text, untouched), or the sections of the atom rows
+    (see MolColumns.iter_layout) as CSV, Parquet or Arrow IPC (the last two need pyarrow). Rows are given in chunks
+    (see write_rows) and written through a large buffer, so memory stays bounded by the chunk whatever the number of rows.
+    Columnar formats get a row group (or record batch) per chunk."""
+    FORMATS = ("pdb", "csv", "parquet", "arrow")
+    FORMATS_COLUMNAR = ("parquet", "arrow")
+    SUFFIXES = {
+        ".pdb": "pdb", ".ent": "pdb", ".csv": "csv",
+        ".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow",
+    }
+    NAME_RECORD = "RECORD_NAME" # first column of the tabular formats, 'ATOM' or 'HETATM'
+    NROWS_CHUNK = 1 << 16 # rows formatted at once
+    NBYTES_BUFFER = 1 << 22 # of the output file
+    PATH_STDOUT = "-"
+
+    # --------------------------------------------------------------------------
+    def __init__(self, path: str | Path, fmt: str | None = None):
+        """Open 'path' (PATH_STDOUT for the standard output) for writing in the format 'fmt', guessed from its suffix if not given.
+        Raises a ValueError if the format is unknown, and an ImportError if it needs pyarrow and it isn't installed."""
+        self.path = str(path)
+        self.format = self.get_format(path, fmt)
+        self.nrows: int = 0 # rows written so far
+        self._pa = self._import_pyarrow() if self.format in self.FORMATS_COLUMNAR else None
+        self._writer = None # pyarrow writer of the columnar formats
+        self._header: bool = self.format == "csv" # whether the CSV header is still to be written
+        self._file = sys.stdout.buffer if self.path == self.PATH_STDOUT else open(self.path, "wb", buffering = self.NBYTES_BUFFER)
+
+    # --------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # --------------------------------------------------------------------------
+    def __exit__(self, *args):
+        self.close()
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_format(cls, path: str | Path, fmt: str | None = None) -> str:
+        if fmt is None:
+            fmt = next((cls.SUFFIXES[s.lower()] for s in reversed(Path(path).suffixes) if s.lower() in cls.SUFFIXES), None)
+            if fmt is None: raise ValueError(f"Unknown export format for '{path}', use one of the suffixes {', '.join(cls.SUFFIXES)}")
+        fmt = fmt.lower()
+        if fmt not in cls.FORMATS: raise ValueError(f"Unknown export format '{fmt}', use one of {', '.join(cls.FORMATS)}")
+        return fmt
+
+    # --------------------------------------------------------------------------
+    def write_rows(self, buffer: mp.MolBuffer, rows: np.ndarray, kinds: np.ndarray, get_field: callable):
+        """Write the (sorted) 'rows' of 'buffer', described by their MolKind values in 'kinds' (see format_rows).
+        Big sets of rows should be given in chunks of about NROWS_CHUNK rows."""
+        if self.format in self.FORMATS_COLUMNAR: # no need to go through an IPC stream
+            kinds, get_field = self._select_atoms(kinds, get_field)
+            self._write_table(self.get_table(kinds, get_field))
+            self.nrows += len(kinds)
+            return
+        if self._header: self.write(self.get_header_csv())
+        self.write(self.format_rows(self.format, buffer, rows, kinds, get_field))
+        if self.format == "pdb": self.nrows += int(np.count_nonzero(kinds != mp.MolKind.NONE.value))
+        else: self.nrows += int(np.count_nonzero((kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value)))
+
+    # --------------------------------------------------------------------------
+    def write(self, data: bytes):
+        """Write data already formatted (e.g. by format_rows in a worker process), the CSV header included:
+        the text of the PDB/CSV rows, or an Arrow IPC stream for the columnar formats"""
+        self._header = False
+        if not data: return
+        if self._pa is None:
+            self._file.write(data)
+        else:
+            self._write_table(self._pa.ipc.open_stream(data).read_all())
+
+    # --------------------------------------------------------------------------
+    def flush(self):
+        self._file.flush()
+
+    # --------------------------------------------------------------------------
+    def close(self):
+        """Finish the file, which is valid (e.g. with just a header) even if no rows were written"""
+        if self._header: self.write(self.get_header_csv())
+        if self._pa is not None:
+            if self._writer is None: self._write_table(self._pa.table({}, schema = self._get_schema(self._pa)))
+            self._writer.close()
+            self._writer = None
+        if self._file is sys.stdout.buffer: self._file.flush()
+        else: self._file.close()
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def format_rows(cls, fmt: str, buffer: mp.MolBuffer, rows: np.ndarray, kinds: np.ndarray, get_field: callable) -> bytes:
+        """Bytes of the (sorted) 'rows' of 'buffer' in the format 'fmt', described by their MolKind values in 'kinds'.
+        'get_field(name)' returns their parsed values of the section 'name' (as in MolColumns.get_field), only called for the
+        tabular formats, which only hold the ATOM/HETATM rows. Columnar formats give an Arrow IPC stream, to be passed to 'write'."""
+        if fmt == "pdb": return buffer.join_rows(rows[kinds != mp.MolKind.NONE.value]) # terminators aren't part of the data
+        kinds, get_field = cls._select_atoms(kinds, get_field)
+        if fmt == "csv": return cls.format_csv(kinds, get_field)
+
+        pa = cls._import_pyarrow()
+        table = cls.get_table(kinds, get_field)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_header_csv(cls) -> bytes:
+        return ','.join([cls.NAME_RECORD] + [name for name,_,_ in mp.MolColumns.iter_layout()]).encode() + b'\n'
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def format_csv(cls, kinds: np.ndarray, get_field: callable) -> bytes:
+        """CSV lines of atom rows described by the MolKind values in 'kinds', one column per section (see format_rows for 'get_field').
+        Numbers are written with the decimals of the PDB format, and missing ones left empty.
+        Every column is formatted as a matrix of characters, all of them then copied at once to their place in the lines."""
+        if not len(kinds): return b''
+        columns = [cls._get_chars_text(np.where(kinds == mp.MolKind.HETE.value, b"HETATM", b"ATOM"))]
+        for name,_,_ in mp.MolColumns.iter_layout():
+            values = get_field(name)
+            if name not in mp.MolColumns.DTYPES_NUMERIC:
+                columns.append(cls._get_chars_text(cls._quote_csv(values)))
+            else:
+                columns.append(cls._get_chars_number(values, mp.MolColumns.NDECIMALS.get(name, 0)))
+
+        lengths = sum(length for _,_,length in columns) + len(columns) # each one followed by a comma, or the newline
+        ends = np.cumsum(lengths)
+        text = np.empty(int(ends[-1]), dtype = np.uint8)
+        pos = ends - lengths
+        for i,(chars, firsts, length) in enumerate(columns):
+            cols = np.arange(chars.shape[1])
+            mask = (cols >= firsts[:,None]) & (cols < (firsts + length)[:,None])
+            text[((pos - firsts)[:,None] + cols)[mask]] = chars[mask]
+            pos += length
+            text[pos] = ord(',') if i < len(columns) - 1 else ord('\n')
+            pos += 1
+        return text.tobytes()
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_table(cls, kinds: np.ndarray, get_field: callable):
+        """pyarrow Table of the given atom rows (see format_csv), numeric sections being typed and nullable"""
+        pa = cls._import_pyarrow()
+        arrays = [pa.array(np.where(kinds == mp.MolKind.HETE.value, b"HETATM", b"ATOM")).cast(pa.string())]
+        for name,_,_ in mp.MolColumns.iter_layout():
+            values = get_field(name)
+            if name in mp.MolColumns.DTYPES_NUMERIC:
+                arrays.append(pa.array(values, mask = ~mp.MolColumns.get_mask_valid(values)))
+            else:
+                arrays.append(pa.array(values, type = pa.binary()).cast(pa.string()))
+        return pa.Table.from_arrays(arrays, schema = cls._get_schema(pa))
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _quote_csv(values: np.ndarray) -> np.ndarray:
+        """Same 'values' (bytes), with the few holding commas or quotes quoted"""
+        quoted = (np.char.find(values, b',') >= 0) | (np.char.find(values, b'"') >= 0)
+        if not quoted.any(): return values
+        values = values.astype(object)
+        values[quoted] = [b'"' + v.replace(b'"', b'""') + b'"' for v in values[quoted]]
+        return values.astype(bytes)
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _get_chars_text(values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(chars, firsts, lengths) of the text 'values': the characters of the i-th value are chars[i, firsts[i]:firsts[i] + lengths[i]]"""
+        chars = np.ascontiguousarray(values).view(np.uint8).reshape(len(values), -1)
+        return chars, np.zeros(len(values), dtype = np.int64), np.count_nonzero(chars, axis = 1)
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _get_chars_number(values: np.ndarray, ndecimals: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Same as _get_chars_text for numbers, written with 'ndecimals' decimals (none for integers), right-aligned in 'chars'.
+        The digits of every value are taken at once from the integers they're scaled to. Missing values are left empty."""
+        valid = mp.MolColumns.get_mask_valid(values)
+        scaled = np.where(valid, values, 0).astype(np.float64)
+        if ndecimals: scaled = np.round(scaled * 10 ** ndecimals)
+        scaled = scaled.astype(np.int64)
+        magnitudes = np.abs(scaled)
+
+        ndigits = np.searchsorted(10 ** np.arange(1, 19, dtype = np.int64), magnitudes, side = "right") + 1
+        np.maximum(ndigits, ndecimals + 1, out = ndigits) # a zero before the point
+        width = int(ndigits.max(initial = 1)) + (ndecimals > 0) + 1 # digits, point and sign
+        chars = np.full((len(values), width), ord('0'), dtype = np.uint8)
+        rest = magnitudes.copy()
+        for col in range(width - 1, 0, -1):
+            if ndecimals and col == width - 1 - ndecimals:
+                chars[:,col] = ord('.')
+                continue
+            rest, digits = np.divmod(rest, 10)
+            chars[:,col] += digits.astype(np.uint8)
+
+        lengths = ndigits + (ndecimals > 0) + (scaled < 0)
+        firsts = width - lengths
+        negative = np.flatnonzero(scaled < 0)
+        chars[negative, firsts[negative]] = ord('-')
+        lengths[~valid] = 0
+        return chars, firsts, lengths
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _get_schema(cls, pa):
+        types = {np.dtype(np.int32): pa.int32(), np.dtype(np.float32): pa.float32()}
+        return pa.schema([(cls.NAME_RECORD, pa.string())] + [
+            (name, types[np.dtype(mp.MolColumns.DTYPES_NUMERIC[name])] if name in mp.MolColumns.DTYPES_NUMERIC else pa.string())
+            for name,_,_ in mp.MolColumns.iter_layout()
+        ])
+
+    # --------------------------------------------------------------------------
+    def _write_table(self, table):
+        if self._writer is None:
+            if self.format == "parquet":
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self._file, self._get_schema(self._pa))
+            else:
+                self._writer = self._pa.ipc.new_file(self._file, self._get_schema(self._pa))
+        if table.num_rows or self.format == "parquet": self._writer.write_table(table)
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _select_atoms(cls, kinds: np.ndarray, get_field: callable) -> tuple[np.ndarray, callable]:
+        """Kinds and 'get_field' of the ATOM/HETATM rows among the given ones"""
+        is_atom = (kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value)
+        if is_atom.all(): return kinds, get_field
+        return kinds[is_atom], lambda name: get_field(name)[is_atom]
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _import_pyarrow():
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Exporting to Parquet or Arrow needs pyarrow, install it with 'pip install pyarrow'") from None
+        return pyarrow
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,112 @@
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolGrid:
+    """Uniform grid over the coordinates of the atom rows of a MolData, for finding the atoms near some points
+    in time proportional to the atoms around them. The atoms are sorted by cell, and only the occupied cells are stored
+    (sorted by key, each pointing to its slice of atoms), so memory stays linear whatever the extent of the structure."""
+    SIZE_CELL = 4.0 # Å
+    NAMES_COORDINATES = ("X_COORDINATES", "Y_COORDINATES", "Z_COORDINATES")
+    NELEMENTS_BLOCK = 1 << 18 # max (point, center) pairs measured at once
+
+    # --------------------------------------------------------------------------
+    def __init__(self, rows: np.ndarray, xyz: np.ndarray, size_cell: float | None = None):
+        """'rows' are the indices of the atoms in the MolData, and 'xyz' their (natoms, 3) coordinates"""
+        self.size_cell = size_cell or self.SIZE_CELL
+        self._nrows_source: int = 0 # rows of the MolData when built, see MolGrid.from_columns
+        self._blocks: dict[int, np.ndarray] = {} # offsets of the cells around a center's own one, by reach
+        self._origin = xyz.min(axis = 0) if len(xyz) else np.zeros(3, dtype = np.float32)
+        cells = self._get_cells(xyz)
+        self._dims = cells.max(axis = 0) + 1 if len(cells) else np.ones(3, dtype = np.int64)
+
+        keys = self._get_keys(cells)
+        order = np.argsort(keys, kind = "stable") # atoms of the same cell keep their row order
+        keys = keys[order]
+        self._rows = rows[order]
+        self._xyz = np.ascontiguousarray(xyz[order])
+
+        firsts = np.flatnonzero(np.diff(keys, prepend = -1)) if len(keys) else np.empty(0, dtype = np.int64)
+        self._keys_cells = keys[firsts]
+        self._starts_cells = np.append(firsts, len(keys)) # atoms of the i-th occupied cell: [starts[i], starts[i+1][
+
+    # --------------------------------------------------------------------------
+    def __len__(self):
+        return self._nrows_source
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def from_columns(cls, columns: mp.MolColumns) -> "MolGrid":
+        """Index every row of 'columns' with valid X/Y/Z coordinates (i.e. the atoms)"""
+        xyz = np.stack([columns.get_field(name) for name in cls.NAMES_COORDINATES], axis = 1)
+        rows = np.flatnonzero(~np.isnan(xyz).any(axis = 1))
+        grid = cls(rows, xyz[rows])
+        grid._nrows_source = len(columns)
+        return grid
+
+    # --------------------------------------------------------------------------
+    def query(self, centers: np.ndarray, radius: float) -> np.ndarray:
+        """Return the sorted rows of the atoms within 'radius' Å of any of the (ncenters, 3) 'centers'.
+        Only the atoms of the cells around each center are measured (or of the cells in the bounding box of all the spheres, if fewer)."""
+        centers = np.asarray(centers, dtype = np.float64).reshape(-1, 3)
+        if not len(centers) or not len(self._keys_cells) or radius < 0: return np.empty(0, dtype = self._rows.dtype)
+
+        lo = np.maximum(self._get_cells(centers.min(axis = 0) - radius), 0)
+        hi = np.minimum(self._get_cells(centers.max(axis = 0) + radius), self._dims - 1)
+        if (hi < lo).any(): return np.empty(0, dtype = self._rows.dtype)
+
+        reach = int(min(np.ceil(radius / self.size_cell), self._dims.max())) # cells around a center's own one
+        if len(centers) * (2 * reach + 1) ** 3 < np.prod(hi - lo + 1):
+            block = self._blocks.get(reach, None)
+            if block is None: block = self._blocks[reach] = self._get_block(-reach, reach)
+            cells = self._get_cells(centers)[:, None, :] + block[None, :, :]
+            cells = cells.reshape(-1, 3)
+            cells = cells[((cells >= lo) & (cells <= hi)).all(axis = 1)]
+            keys = np.unique(self._get_keys(cells))
+        else:
+            keys = self._get_keys(self._get_block(lo, hi))
+
+        pos = np.searchsorted(self._keys_cells, keys)
+        occupied = pos < len(self._keys_cells)
+        occupied[occupied] = self._keys_cells[pos[occupied]] == keys[occupied]
+        pos = pos[occupied]
+
+        ### indices of the atoms of every candidate cell, without looping over the cells
+        starts, ends = self._starts_cells[pos], self._starts_cells[pos + 1]
+        lengths = ends - starts
+        candidates = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+        near = self.get_mask_near(self._xyz[candidates], centers, radius)
+        return np.sort(self._rows[candidates[near]])
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_mask_near(cls, xyz: np.ndarray, centers: np.ndarray, radius: float) -> np.ndarray:
+        """Which of the (npoints, 3) 'xyz' are within 'radius' of any of the 'centers' (never the NaN ones).
+        Centers are measured in blocks, keeping the distance matrices under NELEMENTS_BLOCK values."""
+        near = np.zeros(len(xyz), dtype = bool)
+        nblock = max(1, cls.NELEMENTS_BLOCK // max(1, len(xyz)))
+        for start in range(0, len(centers), nblock):
+            diffs = xyz[:, None, :] - centers[None, start : start + nblock, :]
+            near |= (np.einsum("ijk,ijk->ij", diffs, diffs) <= radius * radius).any(axis = 1)
+        return near
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _get_block(lo: np.ndarray | int, hi: np.ndarray | int) -> np.ndarray:
+        """(ncells, 3) coordinates of the cells from 'lo' to 'hi' (both included), per axis"""
+        lo, hi = np.broadcast_to(lo, 3), np.broadcast_to(hi, 3)
+        ranges = (np.arange(a, b + 1) for a,b in zip(lo, hi))
+        return np.stack(np.meshgrid(*ranges, indexing = "ij"), axis = -1).reshape(-1, 3)
+
+    # --------------------------------------------------------------------------
+    def _get_cells(self, xyz: np.ndarray) -> np.ndarray:
+        return np.floor((xyz - self._origin) / self.size_cell).astype(np.int64)
+
+    # --------------------------------------------------------------------------
+    def _get_keys(self, cells: np.ndarray) -> np.ndarray:
+        return (cells[..., 0] * self._dims[1] + cells[..., 1]) * self._dims[2] + cells[..., 2]
+
+
+# //////////////////////////////////////////////////////////////////////////////
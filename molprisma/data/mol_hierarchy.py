@@ -0,0 +1,135 @@
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolHierarchy:
+    """Chain → residue → row ranges of a MolData. Residues are runs of atom rows with the same chain, number and insertion code
+    (other rows in between, e.g. ANISOU records, don't split them), and chains are runs of residues with the same chain ID.
+    Both are also split by TER, MODEL and ENDMDL records, so every model has its own residues and chains.
+    Every row knows its residue (the last one started at or before it), so finding the group of a row takes constant time."""
+    LEVELS = ("residue", "chain")
+    RECORDS_BREAK = (b"TER", b"MODEL", b"ENDMDL")
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        self._nrows: int = 0
+        self._nresidues: int = 0
+        self._nchains: int = 0
+        self._residues = np.empty(0, dtype = np.int32)       # residue of each row (-1 before the first one)
+        self._starts = np.empty(0, dtype = np.int64)         # first row of each residue
+        self._ends = np.empty(0, dtype = np.int64)           # row after the last atom of each residue
+        self._chains = np.empty(0, dtype = np.int32)         # chain of each residue
+        self._firsts_chains = np.empty(0, dtype = np.int64)  # first residue of each chain
+        self._last_key: tuple | None = None # (chain, number, insertion code) of the last atom row
+        self._broken: bool = False # whether a break record came after the last atom row
+
+    # --------------------------------------------------------------------------
+    def __len__(self):
+        return self._nrows
+
+    # --------------------------------------------------------------------------
+    def reset(self):
+        self.__init__()
+
+    # --------------------------------------------------------------------------
+    def extend(self, buffer: mp.MolBuffer, columns: mp.MolColumns, hi: int):
+        """Index the rows from the last ones indexed up to 'hi' (rows appended to the residue being indexed extend it)"""
+        lo = self._nrows
+        if hi <= lo: return
+        kinds = columns.get_kinds()[lo:hi]
+        atoms = np.flatnonzero((kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value))
+        is_meta = kinds == mp.MolKind.META.value
+        is_break = np.zeros(hi - lo, dtype = bool)
+        if is_meta.any():
+            records = buffer.get_records_at(np.flatnonzero(is_meta) + lo, 0, max(map(len, self.RECORDS_BREAK)))
+            is_break[is_meta] = np.logical_or.reduce([
+                (records[:, :len(record)] == np.frombuffer(record, dtype = np.uint8)).all(axis = 1) for record in self.RECORDS_BREAK
+            ])
+        self._residues = mp.Utils.ensure_capacity(self._residues, hi)
+        self._nrows = hi
+        if not len(atoms):
+            self._residues[lo:hi] = self._nresidues - 1
+            self._broken |= bool(is_break.any())
+            return
+
+        keys = [columns.get_field(name)[lo:hi][atoms] for name in ("CHAIN_ID", "RESIDUE_SEQUENCE_NUM", "RESIDUE_INSERTION_CODE")]
+        nbreaks = np.cumsum(is_break)[atoms] # break records up to each atom row
+        broken = np.diff(nbreaks, prepend = 0) > 0
+        broken[0] |= self._broken
+        changed = np.zeros(len(atoms), dtype = bool)
+        for key in keys:
+            changed[1:] |= key[1:] != key[:-1]
+        changed[0] = self._last_key is None or tuple(key[0] for key in keys) != self._last_key
+        chain_changed = np.concatenate(([self._last_key is None or keys[0][0] != self._last_key[0]], keys[0][1:] != keys[0][:-1]))
+        is_new = changed | broken # first atom of a residue
+        is_new_chain = is_new & (chain_changed | broken)
+
+        idxs_new = np.flatnonzero(is_new)
+        nresidues = self._nresidues + len(idxs_new)
+        nchains = self._nchains + int(np.count_nonzero(is_new_chain))
+        self._starts = mp.Utils.ensure_capacity(self._starts, nresidues)
+        self._ends = mp.Utils.ensure_capacity(self._ends, nresidues)
+        self._chains = mp.Utils.ensure_capacity(self._chains, nresidues)
+        self._firsts_chains = mp.Utils.ensure_capacity(self._firsts_chains, nchains)
+
+        self._starts[self._nresidues:nresidues] = atoms[idxs_new] + lo
+        self._chains[self._nresidues:nresidues] = (np.cumsum(is_new_chain) + self._nchains - 1)[idxs_new]
+        self._firsts_chains[self._nchains:nchains] = np.flatnonzero(is_new_chain[idxs_new]) + self._nresidues
+        residues_atoms = np.cumsum(is_new) + self._nresidues - 1
+        is_last = np.append(residues_atoms[1:] != residues_atoms[:-1], True) # last atom of each residue (so far)
+        self._ends[residues_atoms[is_last]] = atoms[is_last] + lo + 1
+
+        is_start = np.zeros(hi - lo, dtype = bool)
+        is_start[atoms[idxs_new]] = True
+        self._residues[lo:hi] = np.cumsum(is_start) + self._nresidues - 1
+        self._nresidues, self._nchains = nresidues, nchains
+        self._last_key = tuple(key[-1] for key in keys)
+        self._broken = bool(is_break[atoms[-1] + 1:].any())
+
+    # --------------------------------------------------------------------------
+    def count(self, level: str) -> int:
+        return self._nresidues if level == "residue" else self._nchains
+
+    # --------------------------------------------------------------------------
+    def get_group(self, row: int, level: str) -> int:
+        """Index of the residue or chain (depending on 'level') of 'row', or of the last one before it (-1 if none)"""
+        residue = int(self._residues[row])
+        if level == "residue" or residue < 0: return residue
+        return int(self._chains[residue])
+
+    # --------------------------------------------------------------------------
+    def get_groups(self, rows: np.ndarray, level: str) -> np.ndarray:
+        """Same as get_group, for every one of 'rows'"""
+        residues = self._residues[rows]
+        if level == "residue" or not self._nresidues: return residues
+        return np.where(residues >= 0, self._chains[:self._nresidues][np.maximum(residues, 0)], -1)
+
+    # --------------------------------------------------------------------------
+    def get_range(self, group: int, level: str) -> tuple[int, int]:
+        """[start,end[ rows of a residue or chain, from its first atom row to its last one"""
+        if level == "residue": return int(self._starts[group]), int(self._ends[group])
+        first, last = self._get_residues_chain(group)
+        return int(self._starts[first]), int(self._ends[last])
+
+    # --------------------------------------------------------------------------
+    def get_ends(self, level: str) -> np.ndarray:
+        """Row after the last atom of every residue or chain"""
+        if level == "residue": return self._ends[:self._nresidues]
+        lasts = np.append(self._firsts_chains[1:self._nchains], self._nresidues) - 1
+        return self._ends[lasts]
+
+    # --------------------------------------------------------------------------
+    def count_residues(self, chain: int) -> int:
+        first, last = self._get_residues_chain(chain)
+        return last - first + 1
+
+    # --------------------------------------------------------------------------
+    def _get_residues_chain(self, chain: int) -> tuple[int, int]:
+        """First and last residues of a chain"""
+        first = int(self._firsts_chains[chain])
+        last = int(self._firsts_chains[chain + 1]) - 1 if chain + 1 < self._nchains else self._nresidues - 1
+        return first, last
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,193 @@
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolIndex:
+    """Bitmask index over the rows of a MolData: one packed mask per MolKind and per filter value,
+    combined into a cached array with the indices of the currently visible rows"""
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        self._nrows: int = 0
+        self._masks_kinds: dict[mp.MolKind, np.ndarray] = {
+            kind: np.empty(0, dtype = np.uint8) for kind in mp.MolKind
+        }
+        self._codes: dict[str, np.ndarray] = {} # per filter key, index of each row's value in the filter refs (-1 if none)
+        self._masks_values: dict[tuple[str, int], np.ndarray] = {}
+        self._counts: dict[tuple[str, mp.MolKind], np.ndarray] = {} # per filter key and kind, number of rows of each code
+        self._visible_state: tuple | None = None
+        self._visible_rows = np.empty(0, dtype = np.int64)
+        self._nvisible: int = 0
+        self._rows_none: tuple[int, np.ndarray] | None = None # terminator rows, with the number of rows they were found among
+
+    # --------------------------------------------------------------------------
+    def __len__(self):
+        return self._nrows
+
+    # --------------------------------------------------------------------------
+    def reset(self):
+        self.__init__()
+
+    # --------------------------------------------------------------------------
+    def extend(self, kinds: np.ndarray, codes: dict[str, np.ndarray], remaps: dict[str, np.ndarray] = {}):
+        """Index new rows, described by the MolKind values in 'kinds' and their filter codes in 'codes'.
+        'remaps' maps the old codes of some filter keys to new ones, for when new reference values got inserted."""
+        lo = self._nrows
+        hi = lo + len(kinds)
+
+        for kind in mp.MolKind:
+            self._masks_kinds[kind] = self._append_bits(self._masks_kinds[kind], lo, kinds == kind.value)
+
+        for key,arr in codes.items():
+            old = self._codes.get(key, np.empty(0, dtype = arr.dtype))
+            dtype = np.promote_types(old.dtype, arr.dtype)
+            if key in remaps:
+                codes_old, valid = old[:lo], old[:lo] >= 0
+                old = np.full(lo, -1, dtype = dtype)
+                old[valid] = remaps[key][codes_old[valid]]
+            new = mp.Utils.ensure_capacity(old.astype(dtype, copy = False), hi)
+            new[lo:hi] = arr
+            self._codes[key] = new
+
+            for kind in (mp.MolKind.ATOM, mp.MolKind.HETE): # the only ones with codes
+                counts = self._counts.get((key, kind), np.zeros(0, dtype = np.int64))
+                if key in remaps and len(counts):
+                    counts_old, counts = counts, np.zeros(remaps[key].max() + 1, dtype = np.int64)
+                    counts[remaps[key][:len(counts_old)]] = counts_old
+                counts_new = np.bincount(arr[kinds == kind.value], minlength = len(counts))
+                counts_new[:len(counts)] += counts
+                self._counts[(key, kind)] = counts_new
+
+        self._nrows = hi
+        if remaps: # cached masks refer to outdated codes
+            self._masks_values.clear()
+            self._visible_state = None
+            return
+
+        for (key, idx),mask in self._masks_values.items():
+            self._masks_values[(key, idx)] = self._append_bits(mask, lo, codes[key] == idx)
+
+        if self._visible_state is not None:
+            filter_idxs, kinds_shown = map(dict, self._visible_state)
+            rows = np.flatnonzero(self._get_mask_chunk(lo, hi, filter_idxs, kinds_shown)) + lo
+            nvisible = self._nvisible + len(rows)
+            self._visible_rows = mp.Utils.ensure_capacity(self._visible_rows, nvisible)
+            self._visible_rows[self._nvisible:nvisible] = rows
+            self._nvisible = nvisible
+
+    # --------------------------------------------------------------------------
+    def get_codes(self, key: str) -> np.ndarray:
+        return self._codes[key][:self._nrows]
+
+    # --------------------------------------------------------------------------
+    def count_values(self, key: str, kinds_shown: dict[mp.MolKind, bool], nvalues: int) -> np.ndarray:
+        """Number of rows of each of the 'nvalues' reference values of the filter 'key', among the kinds shown.
+        They're kept up to date as rows are indexed, so this takes no time at all."""
+        counts = np.zeros(nvalues, dtype = np.int64)
+        for kind in (mp.MolKind.ATOM, mp.MolKind.HETE):
+            if not kinds_shown.get(kind, False) or (key, kind) not in self._counts: continue
+            counts_kind = self._counts[(key, kind)]
+            counts[:len(counts_kind)] += counts_kind
+        return counts
+
+    # --------------------------------------------------------------------------
+    def get_mask_value(self, key: str, idx: int) -> np.ndarray:
+        """Return the packed mask of the rows whose value for the filter 'key' is the idx-th reference.
+        Masks are built on first use and kept, so their memory is only spent on the values actually browsed."""
+        mask = self._masks_values.get((key, idx), None)
+        if mask is None:
+            mask = np.packbits(self.get_codes(key) == idx)
+            self._masks_values[(key, idx)] = mask
+        return mask
+
+    # --------------------------------------------------------------------------
+    def get_visible_rows(self, filter_idxs: dict[str, int | None], kinds_shown: dict[mp.MolKind, bool]) -> np.ndarray:
+        """Return the indices of the rows matching the given filter state.
+        The result is cached until the state changes or the index is rebuilt."""
+        state = (tuple(filter_idxs.items()), tuple(kinds_shown.items()))
+        if state == self._visible_state:
+            return self._visible_rows[:self._nvisible]
+
+        nbytes = self._get_nbytes_packed()
+        packed = np.zeros(nbytes, dtype = np.uint8)
+        for kind,shown in kinds_shown.items():
+            if shown: packed |= self._masks_kinds[kind][:nbytes]
+
+        for key,idx in filter_idxs.items():
+            if idx is None: continue
+            packed &= self.get_mask_value(key, idx)[:nbytes]
+
+        packed |= self._masks_kinds[mp.MolKind.NONE][:nbytes] # terminator rows are always visible
+
+        rows = np.flatnonzero(np.unpackbits(packed, count = self._nrows))
+        self._visible_rows = rows.astype(np.int32) if self._nrows < np.iinfo(np.int32).max else rows
+        self._nvisible = len(rows)
+        self._visible_state = state
+        return self._visible_rows[:self._nvisible]
+
+    # --------------------------------------------------------------------------
+    def get_rows(self, lo: int, hi: int, filter_idxs: dict[str, int | None], kinds_shown: dict[mp.MolKind, bool]) -> np.ndarray:
+        """Same as get_visible_rows, but only among the rows [lo,hi[ and without caching the result"""
+        return np.flatnonzero(self._get_mask_chunk(lo, hi, filter_idxs, kinds_shown)) + lo
+
+    # --------------------------------------------------------------------------
+    def select_rows(self, rows: np.ndarray, filter_idxs: dict[str, int | None], kinds_shown: dict[mp.MolKind, bool]) -> np.ndarray:
+        """Same as get_visible_rows, but only among the sorted 'rows' (plus the terminator rows), in time proportional to their number"""
+        rows = rows[rows < self._nrows]
+        mask = np.zeros(len(rows), dtype = bool)
+        for kind,shown in kinds_shown.items():
+            if shown: mask |= self._get_bits_at(self._masks_kinds[kind], rows)
+
+        for key,idx in filter_idxs.items():
+            if idx is None: continue
+            mask &= self._codes[key][rows] == idx
+
+        if self._rows_none is None or self._rows_none[0] != self._nrows:
+            bits = np.unpackbits(self._masks_kinds[mp.MolKind.NONE][:self._get_nbytes_packed()], count = self._nrows)
+            self._rows_none = (self._nrows, np.flatnonzero(bits))
+        return np.union1d(rows[mask], self._rows_none[1])
+
+    # --------------------------------------------------------------------------
+    def _get_nbytes_packed(self) -> int:
+        return (self._nrows + 7) // 8
+
+    # --------------------------------------------------------------------------
+    def _get_mask_chunk(self, lo: int, hi: int, filter_idxs: dict[str, int | None], kinds_shown: dict[mp.MolKind, bool]) -> np.ndarray:
+        """Unpacked equivalent of get_visible_rows' mask, for the rows [lo,hi[ only"""
+        mask = np.zeros(hi - lo, dtype = bool)
+        for kind,shown in kinds_shown.items():
+            if shown: mask |= self._get_bits(self._masks_kinds[kind], lo, hi)
+
+        for key,idx in filter_idxs.items():
+            if idx is None: continue
+            mask &= self._codes[key][lo:hi] == idx
+
+        mask |= self._get_bits(self._masks_kinds[mp.MolKind.NONE], lo, hi)
+        return mask
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _get_bits(packed: np.ndarray, lo: int, hi: int) -> np.ndarray:
+        byte_lo = lo // 8
+        bits = np.unpackbits(packed[byte_lo : (hi + 7) // 8], count = hi - 8 * byte_lo).astype(bool)
+        return bits[lo - 8 * byte_lo:]
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _get_bits_at(packed: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        return ((packed[rows >> 3] >> (7 - (rows & 7)).astype(np.uint8)) & 1).astype(bool)
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _append_bits(packed: np.ndarray, nbits: int, bits: np.ndarray) -> np.ndarray:
+        """Append 'bits' to the first 'nbits' bits of 'packed', returning the (possibly reallocated) packed array"""
+        byte_lo = nbits // 8
+        head = np.unpackbits(packed[byte_lo : byte_lo + 1], count = nbits % 8) # incomplete last byte
+        tail = np.packbits(np.concatenate((head.astype(bool), bits)))
+        packed = mp.Utils.ensure_capacity(packed, byte_lo + len(tail))
+        packed[byte_lo : byte_lo + len(tail)] = tail
+        return packed
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -2,9 +2,10 @@ import molprisma as mp
 
 # //////////////////////////////////////////////////////////////////////////////
 class MolLine:
-    def __init__(self, text: str, kind: "mp.MolKind"):
+    def __init__(self, text: str, kind: "mp.MolKind", idx: int | None = None):
         self.text = text
         self.kind = kind
+        self.idx = idx # row index inside its MolData, if any
 
     # --------------------------------------------------------------------------
     def get_section_data(self, name_section: str):
@@ -0,0 +1,79 @@
+import numpy as np
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolModels:
+    """Row ranges of the MODEL/ENDMDL blocks of a MolData (e.g. NMR ensembles or MD frames)"""
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        self._starts: list[int] = [] # row of each MODEL record
+        self._ends: list[int | None] = [] # row after each ENDMDL record (None while the block is still open)
+        self._numbers: list[int] = [] # serial number of each model, as written in its MODEL record
+        self._idxs_numbers: dict[int, int] = {}
+
+    # --------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._starts)
+
+    # --------------------------------------------------------------------------
+    def reset(self):
+        self.__init__()
+
+    # --------------------------------------------------------------------------
+    def extend(self, rows_model: list[int], numbers: list[int | None], rows_endmdl: list[int]):
+        """Register new MODEL records (at 'rows_model', with the given serial 'numbers') and ENDMDL records (at 'rows_endmdl').
+        Rows must come after the ones already registered. Missing numbers are replaced by the model's ordinal."""
+        events = sorted(
+            [(row, False, number) for row,number in zip(rows_model, numbers)] +
+            [(row, True,  None)   for row in rows_endmdl]
+        )
+        for row, is_end, number in events:
+            is_open = bool(self._ends) and self._ends[-1] is None
+            if is_end:
+                if is_open: self._ends[-1] = row + 1
+                continue
+
+            if is_open: self._ends[-1] = row # MODEL without ENDMDL, close it at the next one
+            if number is None or number in self._idxs_numbers:
+                number = len(self._starts) + 1
+            self._idxs_numbers[number] = len(self._starts)
+            self._starts.append(row)
+            self._ends.append(None)
+            self._numbers.append(number)
+
+    # --------------------------------------------------------------------------
+    def get_range(self, idx: int, nrows: int) -> tuple[int, int]:
+        """Return the [start,end[ rows of the idx-th model. 'nrows' closes the last block if it has no ENDMDL."""
+        end = self._ends[idx]
+        return self._starts[idx], nrows if end is None else end
+
+    # --------------------------------------------------------------------------
+    def get_number(self, idx: int) -> int:
+        return self._numbers[idx]
+
+    # --------------------------------------------------------------------------
+    def find_number(self, number: int) -> int | None:
+        """Return the index of the model with the given serial number, if any"""
+        return self._idxs_numbers.get(number, None)
+
+    # --------------------------------------------------------------------------
+    def select_rows(self, rows: np.ndarray, idx: int, nrows: int) -> np.ndarray:
+        """Filter the sorted 'rows' down to those of the idx-th model, plus those outside of every model (e.g. headers)"""
+        first, _ = self.get_range(0, nrows)
+        _, last  = self.get_range(len(self) - 1, nrows)
+        start, end = self.get_range(idx, nrows)
+        a, b, c, d = np.searchsorted(rows, (first, start, end, last))
+        return np.concatenate((rows[:a], rows[b:c], rows[d:]))
+
+    # --------------------------------------------------------------------------
+    def get_idxs(self, rows: np.ndarray, nrows: int) -> np.ndarray:
+        """Index of the model of each of 'rows', -1 for those outside of every model"""
+        if not len(self): return np.full(len(rows), -1, dtype = np.int64)
+        ends = np.array([nrows if end is None else end for end in self._ends])
+        idxs = np.searchsorted(np.array(self._starts), rows, side = "right") - 1
+        inside = idxs >= 0
+        inside[inside] = rows[inside] < ends[idxs[inside]]
+        return np.where(inside, idxs, -1)
+
+
+# //////////////////////////////////////////////////////////////////////////////
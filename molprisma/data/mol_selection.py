@@ -0,0 +1,243 @@
+import math
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolSelection:
+    """Selection expression over the sections of the atom rows, e.g. 'chain A and resname ALA,GLY and bfactor > 40 and not altloc B'.
+    The text is parsed once into a tree of closures, each computing a boolean mask over whole columns, so evaluating it
+    costs a few vectorized operations per term whatever the number of rows. Compiled selections are cached by text (see 'compile').
+
+    Grammar (keywords and fields are case-insensitive, values aren't):
+        expr := term ('or' term)* ; term := factor ('and' factor)* ; factor := 'not' factor | '(' expr ')' | 'all' | 'none' | 'atom' | 'hetatm' | test
+        test := FIELD value (',' value)*  |  FIELD OP number
+    where FIELD is a section name (e.g. 'residue_name') or one of its ALIASES, OP is one of ==, =, !=, <, <=, >, >=,
+    and numeric values can be ranges such as '10:20' (both ends included). Quote values to match spaces or keywords, '' matches blanks.
+    Rows missing a numeric value (blank or unparsable) never pass a test on it, and only ATOM/HETATM rows are ever selected."""
+    ALIASES = {
+        "serial": "SERIAL_NUM",
+        "name": "ATOM_NAME", "atomname": "ATOM_NAME",
+        "altloc": "ALTLOC",
+        "resname": "RESIDUE_NAME",
+        "chain": "CHAIN_ID",
+        "resseq": "RESIDUE_SEQUENCE_NUM", "resid": "RESIDUE_SEQUENCE_NUM", "resi": "RESIDUE_SEQUENCE_NUM",
+        "icode": "RESIDUE_INSERTION_CODE", "insertion": "RESIDUE_INSERTION_CODE",
+        "x": "X_COORDINATES", "y": "Y_COORDINATES", "z": "Z_COORDINATES",
+        "occupancy": "OCCUPANCY", "occ": "OCCUPANCY",
+        "bfactor": "TEMPERATURE_FACTOR", "b": "TEMPERATURE_FACTOR",
+        "segid": "SEGMENT_ID",
+        "element": "ELEMENT_SYMBOL",
+        "charge": "CHARGE",
+    }
+    KEYWORDS_KINDS = {"all": ("ATOM", "HETE"), "atom": ("ATOM",), "hetatm": ("HETE",), "none": ()}
+    OPERATORS = {
+        "==": np.equal, "=": np.equal, "!=": np.not_equal,
+        "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+    }
+    OPERATORS_RANGES = { # numeric comparisons as ranges of MolSorted.get_mask_values: (value as lower bound, as upper bound, negated)
+        "==": (True, True, False), "=": (True, True, False), "!=": (True, True, True),
+        "<": (True, False, True), "<=": (False, True, False), ">": (False, True, True), ">=": (True, False, False),
+    }
+    RE_TOKEN = re.compile(r"""\s*(?:(?P<op>[<>!]=|==|[<>=])|(?P<punct>[(),])|'(?P<squote>[^']*)'|"(?P<dquote>[^"]*)"|(?P<word>[^\s(),<>=!'"]+)|(?P<error>\S))""")
+    NCACHED = 64 # compiled selections kept by 'compile'
+    NVALUES_COMPARED = 8 # lists of up to this many values are compared one by one, longer ones with np.isin
+
+    _cache: OrderedDict[str, "MolSelection"] = OrderedDict()
+
+    # --------------------------------------------------------------------------
+    def __init__(self, text: str):
+        """Parse 'text', raising a ValueError (with the position of the problem) if it isn't a valid selection"""
+        self.text = text.strip()
+        self.names: set[str] = set() # sections read by the selection
+        self._tokens = self._tokenize(self.text)
+        self._pos = 0
+        if not self._tokens: raise ValueError("Invalid selection, it's empty")
+        self._evaluate = self._parse_or()
+        if self._pos < len(self._tokens): self._raise("expected 'and', 'or' or the end of the selection")
+        del self._tokens
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def compile(cls, text: str) -> "MolSelection":
+        """Same as MolSelection(text), reusing the selections compiled recently"""
+        key = text.strip()
+        selection = cls._cache.get(key, None)
+        if selection is None:
+            selection = cls._cache[key] = cls(key)
+            if len(cls._cache) > cls.NCACHED: cls._cache.popitem(last = False)
+        else:
+            cls._cache.move_to_end(key)
+        return selection
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_names_fields(cls) -> list[str]:
+        """Every field accepted by selections: the lowercase section names, and their ALIASES"""
+        return [name.lower() for name,_,_ in mp.MolColumns.iter_layout()] + list(cls.ALIASES.keys())
+
+    # --------------------------------------------------------------------------
+    def evaluate(self, get_field: callable, kinds: np.ndarray) -> np.ndarray:
+        """Mask of the selected rows among the ones described by the MolKind values in 'kinds',
+        'get_field(name)' returning the parsed values of their section 'name' (as in MolColumns.get_field)"""
+        fields = {}
+        def get_field_once(name: str) -> np.ndarray:
+            if name not in fields: fields[name] = get_field(name)
+            return fields[name]
+        mask = self._evaluate(get_field_once, kinds)
+        return mask & ((kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value))
+
+    # --------------------------------------------------------------------------
+    def evaluate_columns(self, columns: mp.MolColumns, lo: int = 0, hi: int | None = None) -> np.ndarray:
+        """Mask of the selected rows among the rows [lo,hi[ of 'columns'"""
+        hi = len(columns) if hi is None else hi
+        return self.evaluate(lambda name: columns.get_field(name)[lo:hi], columns.get_kinds()[lo:hi])
+
+    # --------------------------------------------------------------------------
+    def _tokenize(self, text: str) -> list[tuple[str, str, int]]:
+        """Split 'text' into (type, value, position) tokens, the type being 'op', 'punct', 'quoted' or 'word'"""
+        tokens = []
+        pos = 0
+        while pos < len(text):
+            match = self.RE_TOKEN.match(text, pos)
+            if match is None: break # trailing spaces
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == "error":
+                raise ValueError(f"Invalid selection, unexpected '{value}' at position {match.start(kind) + 1}")
+            tokens.append(("quoted" if kind in ("squote", "dquote") else kind, value, match.start(kind)))
+            pos = match.end()
+        return tokens
+
+    # --------------------------------------------------------------------------
+    def _peek(self) -> tuple[str, str, int] | None:
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    # --------------------------------------------------------------------------
+    def _accept(self, kind: str, value: str | None = None) -> bool:
+        """Consume the next token if it's of the given type (and value, case-insensitive)"""
+        token = self._peek()
+        if token is None or token[0] != kind: return False
+        if value is not None and token[1].lower() != value: return False
+        self._pos += 1
+        return True
+
+    # --------------------------------------------------------------------------
+    def _raise(self, message: str):
+        token = self._peek()
+        where = f"at position {token[2] + 1}" if token is not None else "at the end"
+        raise ValueError(f"Invalid selection, {message} {where}")
+
+    # --------------------------------------------------------------------------
+    def _parse_or(self) -> callable:
+        terms = [self._parse_and()]
+        while self._accept("word", "or"): terms.append(self._parse_and())
+        if len(terms) == 1: return terms[0]
+        def evaluate(get_field, kinds):
+            mask = terms[0](get_field, kinds)
+            for term in terms[1:]: mask |= term(get_field, kinds)
+            return mask
+        return evaluate
+
+    # --------------------------------------------------------------------------
+    def _parse_and(self) -> callable:
+        factors = [self._parse_not()]
+        while self._accept("word", "and"): factors.append(self._parse_not())
+        if len(factors) == 1: return factors[0]
+        def evaluate(get_field, kinds):
+            mask = factors[0](get_field, kinds)
+            for factor in factors[1:]: mask &= factor(get_field, kinds)
+            return mask
+        return evaluate
+
+    # --------------------------------------------------------------------------
+    def _parse_not(self) -> callable:
+        if self._accept("word", "not"):
+            factor = self._parse_not()
+            return lambda get_field, kinds: ~factor(get_field, kinds)
+
+        if self._accept("punct", "("):
+            expr = self._parse_or()
+            if not self._accept("punct", ")"): self._raise("expected ')'")
+            return expr
+
+        token = self._peek()
+        if token is None or token[0] != "word": self._raise("expected a field or keyword")
+        word = token[1].lower()
+        self._pos += 1
+
+        if word in self.KEYWORDS_KINDS:
+            values = [mp.MolKind[kind].value for kind in self.KEYWORDS_KINDS[word]]
+            return lambda get_field, kinds: np.isin(kinds, values)
+
+        name = self.ALIASES.get(word, word.upper())
+        if name not in {n for n,_,_ in mp.MolColumns.iter_layout()}:
+            self._pos -= 1
+            self._raise(f"unknown field '{token[1]}'")
+        self.names.add(name)
+        return self._parse_test(name)
+
+    # --------------------------------------------------------------------------
+    def _parse_test(self, name: str) -> callable:
+        numeric = name in mp.MolColumns.DTYPES_NUMERIC
+        token = self._peek()
+        if token is not None and token[0] == "op":
+            op = token[1]
+            if not numeric and op not in ("==", "=", "!="): self._raise(f"'{op}' can't compare text values, only numbers,")
+            self._pos += 1
+            value = self._parse_value(numeric, allow_range = False)
+            return self._compile_compare(name, numeric, op, value)
+
+        values = [self._parse_value(numeric, allow_range = True)]
+        while self._accept("punct", ","): values.append(self._parse_value(numeric, allow_range = True))
+        return self._compile_values(name, numeric, values)
+
+    # --------------------------------------------------------------------------
+    def _parse_value(self, numeric: bool, allow_range: bool):
+        """Return the next value: bytes for text sections, a float or a (lo, hi) range of floats for numeric ones"""
+        token = self._peek()
+        if token is None or token[0] not in ("word", "quoted"): self._raise("expected a value")
+        if token[0] == "word" and token[1].lower() in ("and", "or", "not"): self._raise("expected a value")
+        value = token[1]
+        if not numeric:
+            self._pos += 1
+            return value.strip().encode()
+
+        ends = value.split(':', 1) if allow_range and ':' in value[1:] else [value]
+        try: numbers = [float(end) for end in ends]
+        except ValueError: self._raise(f"expected a number{' or a range' if allow_range else ''}")
+        if not all(map(math.isfinite, numbers)): self._raise("expected a finite number")
+        self._pos += 1
+        return tuple(numbers) if len(numbers) == 2 else numbers[0]
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _compile_compare(cls, name: str, numeric: bool, op: str, value) -> callable:
+        if not numeric: return lambda get_field, kinds: cls.OPERATORS[op](get_field(name), value)
+        is_lo, is_hi, negate = cls.OPERATORS_RANGES[op]
+        def evaluate(get_field, kinds):
+            field = get_field(name)
+            mask = mp.MolSorted.get_mask_values(field, value if is_lo else None, value if is_hi else None)
+            return (mp.MolColumns.get_mask_valid(field) & ~mask) if negate else mask
+        return evaluate
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _compile_values(cls, name: str, numeric: bool, values: list) -> callable:
+        points = [v for v in values if not isinstance(v, tuple)]
+        ranges = [v for v in values if isinstance(v, tuple)]
+        def evaluate(get_field, kinds):
+            field = get_field(name)
+            if len(points) > cls.NVALUES_COMPARED: mask = np.isin(field, points)
+            else: # cheaper than sorting for a few values
+                mask = np.zeros(len(field), dtype = bool)
+                for point in points: mask |= mp.MolSorted.get_mask_values(field, point, point) if numeric else field == point
+            for lo,hi in ranges: mask |= mp.MolSorted.get_mask_values(field, lo, hi)
+            return (mask & mp.MolColumns.get_mask_valid(field)) if numeric else mask
+        return evaluate
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,222 @@
+import glob
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolSession:
+    """Several structure files browsed together, each one parsed into its own MolData.
+    The current file is parsed first (in this process, so its first rows show up right away) and its neighbours are
+    prefetched by a pool of processes, closest first. At most 'max_resident' MolData are kept, evicting the least recently used."""
+    SUFFIXES = (".pdb", ".ent", ".cif", ".mmcif") # files searched when given a directory, optionally compressed
+    MAX_RESIDENT = 16
+    NBYTES_PREFETCH = mp.Parser.NBYTES_LAZY # bigger files aren't prefetched, but memory-mapped when opened
+
+    # --------------------------------------------------------------------------
+    def __init__(self, paths: list[str | Path], max_resident: int | None = None, njobs: int | None = None, init_mol: callable = None,
+        follow: bool = False
+    ):
+        """'init_mol' is called on every MolData the first time it's opened, e.g. to set the default filters.
+        When a MolData gets evicted and is parsed again later, its view state is restored instead.
+        If 'follow' is True, the files that can be followed keep getting the rows appended to them while resident (see Parser),
+        and nothing is prefetched (as the copy parsed by another process wouldn't grow)."""
+        assert paths, "A session needs at least one file"
+        self.paths: list[Path] = [Path(p) for p in paths]
+        self.current: int = 0
+        self.max_resident: int = max(1, max_resident or self.MAX_RESIDENT)
+        self.njobs: int = njobs or os.cpu_count() or 1
+        self.init_mol: callable = init_mol or (lambda mol: None)
+        self.follow: bool = follow
+
+        self._mols: OrderedDict[int, mp.MolData] = OrderedDict() # resident MolData, least recently used first
+        self._parsers: dict[int, mp.Parser] = {} # files being parsed in this process
+        self._futures: dict[int, Future] = {}   # files being parsed by the pool
+        self._view_states: dict[int, dict] = {} # of the evicted MolData
+        self._errors: dict[int, str] = {} # of the files that couldn't be parsed (shown instead as empty placeholders)
+        self._pool: ProcessPoolExecutor | None = None
+
+    # --------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.paths)
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def find_paths(cls, patterns: list[str]) -> list[Path]:
+        """Expand the given paths: directories into the structure files inside them, and glob patterns into their matches"""
+        paths = []
+        for pattern in patterns:
+            path = Path(pattern)
+            if path.is_dir():
+                paths.extend(sorted(p for p in path.iterdir() if p.is_file() and cls.is_structure(p)))
+            elif not path.exists() and glob.has_magic(pattern):
+                paths.extend(sorted(Path(p) for p in glob.glob(pattern, recursive = True) if Path(p).is_file()))
+            else:
+                paths.append(path)
+        return paths
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def is_structure(cls, path: str | Path) -> bool:
+        return any(s.lower() in cls.SUFFIXES for s in Path(path).suffixes)
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def get_parser_class(path: str | Path) -> type:
+        return mp.ParserCIF if mp.ParserCIF.is_cif(path) else mp.ParserPDB
+
+    # --------------------------------------------------------------------------
+    def open(self, idx: int) -> mp.MolData:
+        """Make the idx-th file the current one and return its MolData, which might still be growing (see MolData.progress)"""
+        self.current = idx % len(self.paths)
+        self.update()
+
+        mol = self._mols.get(self.current, None)
+        if mol is None:
+            self._errors.pop(self.current, None)
+            path = self.paths[self.current]
+            try:
+                future = self._futures.pop(self.current, None)
+                if future is not None and not future.cancel(): # already being parsed by the pool, wait for it
+                    mol = future.result()
+                else:
+                    parser_class = self.get_parser_class(path)
+                    parser = parser_class(path, follow = self.follow and parser_class.can_follow(path))
+                    mol = parser.parse_async()
+                    self._parsers[self.current] = parser
+            except (OSError, ValueError) as e: # e.g. a malformed file
+                self._errors[self.current] = str(e)
+                mol = self._get_placeholder(path)
+            self._add(self.current, mol)
+
+        self._mols.move_to_end(self.current)
+        self.update()
+        return mol
+
+    # --------------------------------------------------------------------------
+    def update(self):
+        """Collect the files parsed by the pool, and prefetch the neighbours of the current one"""
+        for idx,future in list(self._futures.items()):
+            if not future.done(): continue
+            del self._futures[idx]
+            if future.cancelled() or future.exception() is not None: continue # e.g. a malformed file, parsed again (getting its error) when opened
+            self._add(idx, future.result())
+
+        for idx,parser in list(self._parsers.items()):
+            if not parser.is_done(): continue
+            try: self._parsers.pop(idx).join()
+            except (OSError, ValueError) as e: # the rows parsed until then are kept
+                self._errors[idx] = str(e)
+
+        if len(self.paths) == 1 or self.follow: return
+        wanted = self._get_wanted()
+        for idx,future in list(self._futures.items()): # the current file moved away from these
+            if idx not in wanted and future.cancel(): del self._futures[idx]
+
+        for idx in wanted[1:]: # the current file is parsed by 'open'
+            if idx in self._mols or idx in self._futures or idx in self._parsers: continue
+            if not self._make_room(wanted): break
+            path = self.paths[idx]
+            if not path.is_file() or path.stat().st_size > self.NBYTES_PREFETCH: continue
+            if self._pool is None: # not forked, as parsing threads might be running
+                self._pool = ProcessPoolExecutor(self.njobs, mp_context = multiprocessing.get_context("spawn"))
+            self._futures[idx] = self._pool.submit(self._parse, path)
+
+    # --------------------------------------------------------------------------
+    def close(self):
+        """Stop every parsing still going on, re-raising the first error found by the background parsers (if any)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait = False, cancel_futures = True)
+            self._pool = None
+        self._futures.clear()
+
+        for parser in self._parsers.values():
+            parser.cancel()
+        error = None
+        for parser in self._parsers.values():
+            try: parser.join()
+            except Exception as e: error = error or e
+        self._parsers.clear()
+        if error is not None: raise error
+
+    # --------------------------------------------------------------------------
+    def is_busy(self) -> bool:
+        """Whether files are still being prefetched"""
+        return bool(self._futures)
+
+    # --------------------------------------------------------------------------
+    def get_error(self, idx: int | None = None) -> str | None:
+        """Why the idx-th file (by default, the current one) couldn't be parsed (entirely), if so"""
+        return self._errors.get(self.current if idx is None else idx, None)
+
+    # --------------------------------------------------------------------------
+    def count_resident(self) -> int:
+        return len(self._mols)
+
+    # --------------------------------------------------------------------------
+    def get_name(self, idx: int | None = None) -> str:
+        return self.paths[self.current if idx is None else idx].name
+
+    # --------------------------------------------------------------------------
+    def _add(self, idx: int, mol: mp.MolData):
+        state = self._view_states.pop(idx, None)
+        with mol.lock:
+            if state is None: self.init_mol(mol)
+            else: mol.set_view_state(state)
+        self._mols[idx] = mol
+        self._make_room(self._get_wanted(), nextra = 0)
+
+    # --------------------------------------------------------------------------
+    def _make_room(self, wanted: list[int], nextra: int = 1) -> bool:
+        """Evict the least recently used MolData until there's room for 'nextra' more files (counting the ones being prefetched).
+        The current file and the ones in 'wanted' are never evicted. Returns whether enough room was made."""
+        nused = len(self._mols) + len(self._futures) + nextra
+        for idx in list(self._mols.keys()):
+            if nused <= self.max_resident: break
+            if idx == self.current or idx in wanted: continue
+            self._evict(idx)
+            nused -= 1
+        return nused <= self.max_resident
+
+    # --------------------------------------------------------------------------
+    def _evict(self, idx: int):
+        mol = self._mols.pop(idx)
+        parser = self._parsers.pop(idx, None)
+        if parser is not None:
+            parser.cancel()
+            parser.join()
+        with mol.lock:
+            self._view_states[idx] = mol.get_view_state()
+
+    # --------------------------------------------------------------------------
+    def _get_wanted(self) -> list[int]:
+        """Return the files that should be resident, by priority: the current one, then its neighbours (closest first)"""
+        wanted = [self.current]
+        for distance in range(1, len(self.paths)):
+            if len(wanted) >= min(self.max_resident, len(self.paths)): break
+            for idx in (self.current + distance, self.current - distance):
+                if 0 <= idx < len(self.paths) and idx not in wanted and len(wanted) < self.max_resident:
+                    wanted.append(idx)
+        return wanted
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _get_placeholder(path: Path) -> mp.MolData:
+        """Empty MolData shown instead of a file that couldn't be parsed"""
+        mol = mp.MolData(path.name)
+        mol.init_sections()
+        mol.append(mp.MolLine('', mp.MolKind.NONE))
+        mol.pad_lines()
+        return mol
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _parse(cls, path: Path) -> mp.MolData:
+        """Parse a whole file in a worker process. It's read instead of memory-mapped, as the MolData is pickled back."""
+        return cls.get_parser_class(path)(path, lazy = False).parse()
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,106 @@
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolSorted:
+    """Sorted permutation indexes over the numeric columns of a MolData (see MolColumns.DTYPES_NUMERIC), for range queries
+    in two binary searches: each index holds the rows with a valid value (i.e. the atoms) sorted by it, along with the sorted values.
+    Indexes are built on the first query of their column, and only rebuilt once the data doubled since:
+    rows appended in between (e.g. still being parsed) are compared one by one, which costs at most as much as the rebuild would."""
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        self._indexes: dict[str, tuple[int, np.ndarray, np.ndarray]] = {} # per column, (rows indexed, sorted rows, sorted values)
+
+    # --------------------------------------------------------------------------
+    def reset(self):
+        self.__init__()
+
+    # --------------------------------------------------------------------------
+    def get_mask(self, columns: mp.MolColumns, name: str, lo: float | None = None, hi: float | None = None) -> np.ndarray:
+        """Mask of the rows of 'columns' whose value for the numeric section 'name' is within [lo,hi] (None for no bound).
+        Rows missing the value (blank or unparsable, e.g. non-atom rows) are never included."""
+        nrows, rows = self._get_rows_indexed(columns, name, lo, hi)
+        mask = np.zeros(len(columns), dtype = bool)
+        mask[rows] = True
+        mask[nrows:] = self._get_mask_tail(columns, name, nrows, lo, hi)
+        return mask
+
+    # --------------------------------------------------------------------------
+    def get_rows(self, columns: mp.MolColumns, name: str, lo: float | None = None, hi: float | None = None) -> np.ndarray:
+        """Same as get_mask, but returning the sorted indices of the rows instead, in time proportional to their number"""
+        nrows, rows = self._get_rows_indexed(columns, name, lo, hi)
+        tail = np.flatnonzero(self._get_mask_tail(columns, name, nrows, lo, hi)) + nrows
+        return np.concatenate((np.sort(rows), tail.astype(rows.dtype)))
+
+    # --------------------------------------------------------------------------
+    def _get_rows_indexed(self, columns: mp.MolColumns, name: str, lo: float | None, hi: float | None) -> tuple[int, np.ndarray]:
+        """Rows indexed, and the (unsorted) ones among them within [lo,hi]: a slice of the sorted permutation"""
+        assert columns.is_numeric(name), f"Can't query a range of the non-numeric section '{name}'"
+        nrows, order, values = self._get_index(columns, name)
+        bounds = self._cast_bounds(lo, hi, values.dtype)
+        if bounds is None: return nrows, order[:0]
+        lo, hi = bounds
+        start = 0 if lo is None else int(np.searchsorted(values, lo, side = "left"))
+        end = len(values) if hi is None else int(np.searchsorted(values, hi, side = "right"))
+        return nrows, order[start:end]
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_mask_values(cls, values: np.ndarray, lo: float | None = None, hi: float | None = None) -> np.ndarray:
+        """Mask of the numeric 'values' within [lo,hi] (None for no bound), compared in their own dtype (see _cast_bounds).
+        Missing values are never included."""
+        mask = mp.MolColumns.get_mask_valid(values)
+        bounds = cls._cast_bounds(lo, hi, values.dtype)
+        if bounds is None: return np.zeros_like(mask)
+        lo, hi = bounds
+        if lo is not None: mask &= values >= lo
+        if hi is not None: mask &= values <= hi
+        return mask
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _cast_bounds(cls, lo: float | None, hi: float | None, dtype: np.dtype) -> tuple | None:
+        """Both (finite) bounds converted by _cast_bound, or None if no value of 'dtype' can be within them.
+        Bounds beyond the range of 'dtype' on their own side don't restrict anything, and become None."""
+        info = np.iinfo(dtype) if np.issubdtype(dtype, np.integer) else np.finfo(dtype)
+        vmin, vmax = float(info.min), float(info.max) # compared as Python floats, numpy would cast the bounds to 'dtype' instead
+        if (lo is not None and lo > vmax) or (hi is not None and hi < vmin): return
+        return (
+            None if lo is None or lo <= vmin else cls._cast_bound(lo, dtype, upper = False),
+            None if hi is None or hi >= vmax else cls._cast_bound(hi, dtype, upper = True),
+        )
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _cast_bound(bound: float, dtype: np.dtype, upper: bool):
+        """Convert 'bound' (within the range of 'dtype', see _cast_bounds) to the dtype of the values,
+        so that comparing them doesn't cast all of them to a wider one, rounding it inwards (the values within the bound don't change)"""
+        if np.issubdtype(dtype, np.integer):
+            return dtype.type(np.floor(bound) if upper else np.ceil(bound))
+        info = np.finfo(dtype)
+        cast = dtype.type(bound)
+        if upper and float(cast) > bound: return np.nextafter(cast, info.min)
+        if not upper and float(cast) < bound: return np.nextafter(cast, info.max)
+        return cast
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _get_mask_tail(cls, columns: mp.MolColumns, name: str, nrows: int, lo: float | None, hi: float | None) -> np.ndarray:
+        """Mask of the rows appended since the index was built (the ones from 'nrows' on) within [lo,hi]"""
+        return cls.get_mask_values(columns.get_field(name)[nrows:], lo, hi)
+
+    # --------------------------------------------------------------------------
+    def _get_index(self, columns: mp.MolColumns, name: str) -> tuple[int, np.ndarray, np.ndarray]:
+        index = self._indexes.get(name, None)
+        if index is None or 2 * index[0] < len(columns):
+            field = columns.get_field(name)
+            rows = np.flatnonzero(mp.MolColumns.get_mask_valid(field))
+            order = rows[np.argsort(field[rows], kind = "stable")] # rows of equal values keep their order
+            order = order.astype(np.int32) if len(field) < np.iinfo(np.int32).max else order
+            index = self._indexes[name] = (len(field), order, field[order])
+        return index
+
+
+# //////////////////////////////////////////////////////////////////////////////
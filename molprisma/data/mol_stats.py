@@ -0,0 +1,61 @@
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolStats:
+    """Summary of the values of a section over some rows: extent, mean and histogram for numeric sections,
+    and the most common values for the others. Missing values (blank or unparsable numbers) are only counted."""
+    NBINS = 10 # histogram bins of numeric sections
+    NTOP = 10  # most common values kept for the other sections
+
+    # --------------------------------------------------------------------------
+    def __init__(self, name: str, nrows: int = 0):
+        self.name = name
+        self.numeric: bool = name in mp.MolColumns.DTYPES_NUMERIC
+        self.nrows: int = nrows
+        self.nmissing: int = 0 # rows without a value, only for numeric sections (blanks are just another value otherwise)
+        self.extent: tuple[float, float] | None = None # (min, max)
+        self.mean: float | None = None
+        self.histogram: tuple[np.ndarray, np.ndarray] | None = None # (counts, bin edges)
+        self.top: list[tuple[str, int]] = [] # (value, count) of the most common values, most common first
+        self.ndistinct: int = 0
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def from_values(cls, name: str, values: np.ndarray) -> "MolStats":
+        """Summarize the parsed 'values' of the section 'name' (as in MolColumns.get_field)"""
+        stats = cls(name, len(values))
+        if not stats.numeric:
+            uniques, inverse = mp.Utils.unique_bytes(values)
+            stats._set_counts([v.decode(errors = "replace") for v in uniques], np.bincount(inverse, minlength = len(uniques)))
+            return stats
+
+        values = values[mp.MolColumns.get_mask_valid(values)]
+        stats.nmissing = stats.nrows - len(values)
+        if not len(values): return stats
+        lo, hi = values.min().item(), values.max().item()
+        stats.extent = (lo, hi)
+        stats.mean = float(values.mean(dtype = np.float64))
+        stats.histogram = np.histogram(values, bins = cls.NBINS, range = (lo, hi) if lo < hi else (lo - 0.5, hi + 0.5))
+        return stats
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def from_codes(cls, name: str, codes: np.ndarray, refs: list[str]) -> "MolStats":
+        """Same as from_values for a text section whose values are given as their indices in 'refs' (e.g. a filter's codes),
+        which are counted directly instead of sorting the values"""
+        stats = cls(name, len(codes))
+        counts = np.bincount(codes[codes >= 0], minlength = len(refs))
+        present = np.flatnonzero(counts)
+        stats._set_counts([refs[i] for i in present], counts[present])
+        return stats
+
+    # --------------------------------------------------------------------------
+    def _set_counts(self, values: list[str], counts: np.ndarray):
+        order = np.argsort(-counts, kind = "stable")[:self.NTOP] # ties keep the given order
+        self.top = [(values[i], int(counts[i])) for i in order]
+        self.ndistinct = len(values)
+
+
+# //////////////////////////////////////////////////////////////////////////////
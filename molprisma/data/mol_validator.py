@@ -0,0 +1,228 @@
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class MolValidator:
+    """Checks of the ATOM/HETATM rows against the fixed-width layout of PDB_CONSTANTS: numbers that don't parse,
+    misaligned values, missing or inconsistent elements, characters between sections, truncated records and serial numbers going back.
+    Every check is a vectorized mask over a block of records, and each row gets a bit per failed check (see get_checks),
+    so the rows with errors are just the non-zero flags. Serial numbers are compared across blocks (restarting at MODEL records)."""
+    NAMES_REQUIRED = ("SERIAL_NUM", "ATOM_NAME", "RESIDUE_NAME", "RESIDUE_SEQUENCE_NUM",
+        "X_COORDINATES", "Y_COORDINATES", "Z_COORDINATES", "ELEMENT_SYMBOL")
+    NAMES_RIGHT_JUSTIFIED = ("RESIDUE_NAME",) # besides the numbers
+    LENGTH_MIN = mp.PDB_CONSTANTS["ELEMENT_SYMBOL_END"] # the charge is usually blank, and its trailing spaces stripped
+    SERIAL_WRAP = 99999 # the largest serial that fits, after which many programs start again from 0
+    SPAN_RECORD = (0, 6) # highlighted for errors of the whole record
+
+    _checks: dict[str, tuple[str, tuple[tuple[int, int], ...]]] | None = None
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        self._size: int = 0
+        self._flags = np.empty(0, dtype = np.uint32)
+        self._serial_last: int | None = None # serial of the last atom checked, None after a MODEL record
+        self._cache_invalid: tuple[int, np.ndarray] | None = None # rows with errors, with the rows checked when computed
+
+    # --------------------------------------------------------------------------
+    def __len__(self):
+        return self._size
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_checks(cls) -> dict[str, tuple[str, tuple[tuple[int, int], ...]]]:
+        """Every check by key, with its message and the [start,end[ columns it's about. The i-th check sets the i-th bit of the flags."""
+        if cls._checks is not None: return cls._checks
+        layout = {name: (start, end) for name, start, end in mp.MolColumns.iter_layout()}
+        checks = {}
+        for name,span in layout.items():
+            if name in mp.MolColumns.DTYPES_NUMERIC:
+                checks[f"{name}:number"] = (f"{name}: not a number", (span,))
+            if name in mp.MolColumns.DTYPES_NUMERIC or name in cls.NAMES_RIGHT_JUSTIFIED:
+                ndecimals = mp.MolColumns.NDECIMALS.get(name, None)
+                details = "" if ndecimals is None else f" with {ndecimals} decimals"
+                checks[f"{name}:justified"] = (f"{name}: not right-justified{details}", (span,))
+            if name in cls.NAMES_REQUIRED:
+                checks[f"{name}:missing"] = (f"{name}: missing", (span,))
+
+        checks["ELEMENT_SYMBOL:name"] = ("ELEMENT_SYMBOL: doesn't match the ATOM_NAME", (layout["ATOM_NAME"], layout["ELEMENT_SYMBOL"]))
+        checks["CHARGE:format"] = ("CHARGE: not written as e.g. '2+'", (layout["CHARGE"],))
+        checks["SERIAL_NUM:order"] = ("SERIAL_NUM: not greater than the previous one", (layout["SERIAL_NUM"],))
+
+        covered = np.zeros(mp.LENGTH_RECORD, dtype = bool)
+        covered[slice(*cls.SPAN_RECORD)] = True
+        for start,end in layout.values(): covered[start:end] = True
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], ~covered, [0])).astype(np.int8)))
+        for start,end in zip(edges[0::2].tolist(), edges[1::2].tolist()):
+            checks[f"GAP:{start}"] = ("characters between the sections", ((start, end),))
+        checks["LENGTH:short"] = (f"record shorter than {cls.LENGTH_MIN} characters", (cls.SPAN_RECORD,))
+        checks["LENGTH:long"] = (f"record longer than {mp.LENGTH_RECORD} characters", (cls.SPAN_RECORD,))
+
+        assert len(checks) <= 32, "Too many checks for the flags' bits"
+        cls._checks = checks
+        return checks
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def describe(cls, flags: int) -> list[str]:
+        """Messages of the checks failed by a row with the given flags"""
+        return [message for i,(message, _) in enumerate(cls.get_checks().values()) if flags >> i & 1]
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_spans(cls, flags: int) -> list[tuple[int, int]]:
+        """[start,end[ columns of the checks failed by a row with the given flags"""
+        return [span for i,(_, spans) in enumerate(cls.get_checks().values()) if flags >> i & 1 for span in spans]
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def count_errors(flags: np.ndarray) -> int:
+        """Total of failed checks in 'flags' (i.e. its bits set)"""
+        flags = flags[flags != 0]
+        return int(np.unpackbits(np.ascontiguousarray(flags, dtype = np.uint32).view(np.uint8)).sum())
+
+    # --------------------------------------------------------------------------
+    def extend_buffer(self, buffer: mp.MolBuffer, kinds: np.ndarray, nrows: int | None = None, get_field: callable = None):
+        """Check the rows of 'buffer' (classified by the MolKind values in 'kinds') from the first one not checked yet
+        up to 'nrows' (by default, all of them), and keep their flags. See check_buffer for 'get_field'."""
+        nrows = len(buffer) if nrows is None else nrows
+        if nrows <= self._size: return
+        flags = self.check_buffer(buffer, kinds, self._size, nrows, get_field)
+        self._flags = mp.Utils.ensure_capacity(self._flags, nrows)
+        self._flags[self._size:nrows] = flags
+        self._size = nrows
+
+    # --------------------------------------------------------------------------
+    def check_buffer(self, buffer: mp.MolBuffer, kinds: np.ndarray, lo: int = 0, hi: int | None = None,
+            get_field: callable = None, nrows_chunk: int = 1 << 16) -> np.ndarray:
+        """Same as 'check' for the rows [lo,hi[ of 'buffer', in chunks of rows.
+        If given, 'get_field(name, lo, hi)' returns the already parsed values of some rows (as in MolColumns.get_field)."""
+        hi = len(buffer) if hi is None else hi
+        lengths = buffer.get_lengths()
+        flags = np.zeros(hi - lo, dtype = np.uint32)
+        for start in range(lo, hi, nrows_chunk):
+            end = min(start + nrows_chunk, hi)
+            get_field_chunk = None if get_field is None else lambda name: get_field(name, start, end)
+            flags[start - lo : end - lo] = self.check(buffer.get_records(start, end), kinds[start:end], lengths[start:end], get_field_chunk)
+        return flags
+
+    # --------------------------------------------------------------------------
+    def check(self, records: np.ndarray, kinds: np.ndarray, lengths: np.ndarray, get_field: callable = None) -> np.ndarray:
+        """Return the flags of 'records', a (nrows, LENGTH_RECORD) uint8 matrix whose rows are described by the MolKind values in 'kinds'
+        and are 'lengths' characters long. They must follow the rows checked before (if any), for comparing their serial numbers.
+        Numeric sections are parsed from 'records', unless 'get_field(name)' returns their values. Rows other than ATOM/HETATM are never flagged."""
+        checks = self.get_checks()
+        bits = {key: np.uint32(1 << i) for i,key in enumerate(checks.keys())}
+        flags = np.zeros(len(records), dtype = np.uint32)
+        is_atom = (kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value)
+        if not is_atom.any():
+            if self._get_mask_model(records).any(): self._serial_last = None
+            return flags
+
+        def flag(key: str, mask: np.ndarray):
+            flags[mask & is_atom] |= bits[key]
+
+        filled = records != mp.MolBuffer.CHAR_SPACE
+        blank = lambda start, end: ~filled[:, start:end].any(axis = 1)
+
+        serials = None
+        for name, start, end in mp.MolColumns.iter_layout():
+            chars = records[:, start:end]
+            is_blank = blank(start, end)
+            if f"{name}:missing" in bits:
+                flag(f"{name}:missing", is_blank)
+            if name in mp.MolColumns.DTYPES_NUMERIC:
+                values = mp.MolColumns.parse_section(name, chars, is_atom) if get_field is None else get_field(name)
+                flag(f"{name}:number", ~is_blank & ~mp.MolColumns.get_mask_valid(values))
+                if name == "SERIAL_NUM": serials = values
+            if f"{name}:justified" in bits:
+                misaligned = chars[:, -1] == mp.MolBuffer.CHAR_SPACE
+                ndecimals = mp.MolColumns.NDECIMALS.get(name, None)
+                if ndecimals is not None: misaligned |= chars[:, -1 - ndecimals] != ord('.')
+                flag(f"{name}:justified", ~is_blank & misaligned)
+
+        flag("ELEMENT_SYMBOL:name", self._get_mask_element_mismatch(records))
+        flag("CHARGE:format", self._get_mask_charge_malformed(records[:, slice(*self._get_span("CHARGE"))]))
+        flag("SERIAL_NUM:order", self._get_mask_serial_unordered(records, is_atom, serials))
+
+        for key,(_, spans) in checks.items():
+            if key.startswith("GAP:"): flag(key, ~blank(*spans[0]))
+        flag("LENGTH:short", lengths < self.LENGTH_MIN)
+        flag("LENGTH:long", lengths > mp.LENGTH_RECORD)
+        return flags
+
+    # --------------------------------------------------------------------------
+    def get_flags(self) -> np.ndarray:
+        return self._flags[:self._size]
+
+    # --------------------------------------------------------------------------
+    def get_rows_invalid(self) -> np.ndarray:
+        """Sorted rows with any error, among the ones checked"""
+        if self._cache_invalid is None or self._cache_invalid[0] != self._size:
+            self._cache_invalid = (self._size, np.flatnonzero(self.get_flags()))
+        return self._cache_invalid[1]
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _get_span(cls, name: str) -> tuple[int, int]:
+        return mp.PDB_CONSTANTS[f"{name}_START"], mp.PDB_CONSTANTS[f"{name}_END"]
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _get_mask_element_mismatch(cls, records: np.ndarray) -> np.ndarray:
+        """Rows whose element isn't the one its atom name starts with. Per the PDB format, the element is right-justified
+        in the first two columns of the name (e.g. ' CA ' for carbon, 'CA  ' for calcium), except for 4-character names
+        of 1-letter elements (e.g. 'HH22'). 2-letter elements shifted a column right (e.g. ' FE ', as some programs write them)
+        still match. Rows with a blank name or element aren't compared."""
+        start_name, _ = cls._get_span("ATOM_NAME")
+        start_elem, _ = cls._get_span("ELEMENT_SYMBOL")
+        space = np.uint16(mp.MolBuffer.CHAR_SPACE)
+        n0, n1, n2, n3 = (records[:, start_name + i].astype(np.uint16) for i in range(4))
+        e0, e1 = (records[:, start_elem + i].astype(np.uint16) for i in (0, 1))
+
+        element = np.where(e0 == space, (e1 << 8) | space, (e0 << 8) | e1) # left-justified, as 2 characters
+        is_letter = ((n0 | 0x20) >= ord('a')) & ((n0 | 0x20) <= ord('z'))
+        shifted = (n0 == space) | ((n0 >= ord('0')) & (n0 <= ord('9'))) # e.g. ' CA ' or old-style hydrogens such as '1HB '
+        expected = np.where(shifted, (n1 << 8) | space, (n0 << 8) | n1)
+        expected_long = np.where(is_letter & (n3 != space), (n0 << 8) | space, expected)
+
+        expected_shifted = np.where(n0 == space, (n1 << 8) | n2, expected)
+
+        compared = (element != ((space << 8) | space)) & ~((n0 == space) & (n1 == space))
+        return compared & (element != expected) & (element != expected_long) & (element != expected_shifted)
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _get_mask_charge_malformed(chars: np.ndarray) -> np.ndarray:
+        """Rows whose (non-blank) charge isn't a digit followed by its sign"""
+        space = mp.MolBuffer.CHAR_SPACE
+        blank = (chars[:, 0] == space) & (chars[:, 1] == space)
+        well_formed = ((chars[:, 0] - np.uint8(ord('0'))) < 10) & ((chars[:, 1] == ord('+')) | (chars[:, 1] == ord('-')))
+        return ~blank & ~well_formed
+
+    # --------------------------------------------------------------------------
+    def _get_mask_serial_unordered(self, records: np.ndarray, is_atom: np.ndarray, serials: np.ndarray) -> np.ndarray:
+        """Atom rows whose serial number isn't greater than the one of the previous atom, unless a MODEL record is between them
+        or the previous one is SERIAL_WRAP (or more). Rows without a valid serial are skipped."""
+        mask = np.zeros(len(records), dtype = bool)
+        is_model = self._get_mask_model(records)
+        rows = np.flatnonzero(is_atom & (serials != mp.MolColumns.MISSING_INT))
+        if not len(rows):
+            if is_model.any(): self._serial_last = None
+            return mask
+
+        models = np.cumsum(is_model)[rows] # MODEL records before each atom, within these rows
+        current = serials[rows].astype(np.int64)
+        previous = np.concatenate(([-1 if self._serial_last is None else self._serial_last], current[:-1]))
+        continued = np.concatenate(([self._serial_last is not None and models[0] == 0], models[1:] == models[:-1]))
+        mask[rows] = continued & (current <= previous) & (previous < self.SERIAL_WRAP)
+        self._serial_last = None if models[-1] < is_model.sum() else int(current[-1])
+        return mask
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _get_mask_model(records: np.ndarray) -> np.ndarray:
+        return (records[:, :6] == np.frombuffer(b"MODEL ", dtype = np.uint8)).all(axis = 1)
+
+
+# //////////////////////////////////////////////////////////////////////////////
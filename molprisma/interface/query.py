@@ -0,0 +1,231 @@
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class QueryMolPrisma:
+    """Non-interactive counterpart of TUIMolPrisma: streams the rows of PDB files that match
+    the same filters (MolData.KEYS_FILTERS), selection and shown kinds, chunk by chunk, in constant memory.
+    Rows are written as they are, or in any other format of MolExport."""
+    PATH_STDIN = "-"
+    NBYTES_SPILL = 1 << 20 # results of a file bigger than this are passed from the workers through a temporary file
+    NTASKS_PER_JOB = 2 # files being queried (or waiting to be written) per process, bounding memory and disk usage
+
+    # --------------------------------------------------------------------------
+    def __init__(self, values: dict[str, str] = {}, kinds_shown: dict[mp.MolKind, bool] = {}, selection: str | None = None,
+        fmt: str = "pdb"):
+        """'values' maps some MolData.KEYS_FILTERS keys to the value their section must hold (once stripped).
+        Kinds missing in 'kinds_shown' follow the TUI's defaults: atoms and hetatms shown, metadata hidden.
+        'selection' is a MolSelection expression the rows must match too (raises a ValueError if it isn't valid).
+        'fmt' is one of MolExport.FORMATS, the columnar ones needing 'out' to be a MolExport (see run)."""
+        for key in values: assert key in mp.MolData.KEYS_FILTERS, f"Invalid key for MolData's filter: '{key}'"
+        self._values: dict[str, bytes] = {
+            mp.MolData.KEYS_FILTERS[key]: value.strip().encode() for key,value in values.items()
+        }
+        self._kinds_shown: dict[mp.MolKind, bool] = {
+            mp.MolKind.ATOM: True, mp.MolKind.HETE: True, mp.MolKind.META: False, **kinds_shown
+        }
+        self._layout: dict[str, tuple[int, int]] = {name: (start, end) for name, start, end in mp.MolColumns.iter_layout()}
+        self._selection: str | None = selection.strip() if selection and selection.strip() else None # compiled by each process
+        if self._selection is not None: mp.MolSelection.compile(self._selection)
+        self._format: str = mp.MolExport.get_format("", fmt)
+
+
+    # --------------------------------------------------------------------------
+    def run(self, paths: list[str], njobs: int = 1, out = None, err = None) -> bool:
+        """Write the matching rows of every file in 'paths' (PATH_STDIN for the standard input) to 'out', file after file,
+        and a summary of each one to 'err'. Files are queried by a pool of 'njobs' processes. Returns whether all files could be read."""
+        out = sys.stdout.buffer if out is None else out
+        err = sys.stderr if err is None else err
+        paths = list(paths) or [self.PATH_STDIN]
+        ok = True
+        try:
+            if self._format == "csv": out.write(mp.MolExport.get_header_csv())
+            for path,(result, counts) in zip(paths, self._iter_results(paths, njobs, out)):
+                if isinstance(result, BaseException):
+                    err.write(f"{path}: {result}\n")
+                    ok = False
+                    continue
+                self._write_result(result, out)
+                err.write(self._format_summary(path, counts))
+            out.flush()
+        except BrokenPipeError: # e.g. piped into 'head', nothing else is wanted
+            if out is sys.stdout.buffer: # avoid another error when the interpreter flushes it at exit
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return ok
+
+
+    # --------------------------------------------------------------------------
+    def query_file(self, path: str, write: callable) -> dict[str, int]:
+        """Call 'write' with the matching rows of the file at 'path', as consecutive blocks of bytes.
+        Compressed files are decompressed on the fly. Returns the counts of rows read and matched."""
+        counts = self._new_counts()
+        for data,lo,hi in self._iter_chunks(path):
+            write(self.query_chunk(data, lo, hi, counts))
+        return counts
+
+
+    # --------------------------------------------------------------------------
+    def query_chunk(self, data: np.ndarray, lo: int, hi: int, counts: dict[str, int]) -> bytes:
+        """Return the matching rows among the ones in data[lo:hi] (formatted by MolExport.format_rows), adding them to 'counts'"""
+        buffer = mp.MolBuffer.from_bytes(data, lo, hi)
+        kinds = mp.ParserPDB.get_kinds(buffer)
+        mask = np.zeros(len(kinds), dtype = bool)
+        for kind,shown in self._kinds_shown.items():
+            if shown: mask |= kinds == kind.value
+
+        if self._values: # same as MolData.match_filters: only atoms and hetatms hold values
+            mask &= (kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value)
+        for name,value in self._values.items():
+            start, end = self._layout[name]
+            chars = np.ascontiguousarray(buffer.get_records(0, len(buffer), start, end)).view(f"S{end - start}")[:,0]
+            mask &= np.char.strip(chars) == value
+
+        is_atom = (kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value)
+        def get_field(name: str, rows: slice | np.ndarray = slice(None)) -> np.ndarray: # only the sections needed are parsed
+            start, end = self._layout[name]
+            return mp.MolColumns.parse_section(name, buffer.get_records(0, len(buffer), start, end)[rows], is_atom[rows])
+
+        if self._selection is not None:
+            mask &= mp.MolSelection.compile(self._selection).evaluate(get_field, kinds)
+
+        rows = np.flatnonzero(mask)
+        counts["rows"] += len(kinds)
+        for kind in (mp.MolKind.ATOM, mp.MolKind.HETE, mp.MolKind.META):
+            counts[kind.name] += int(np.count_nonzero(kinds[rows] == kind.value))
+        return mp.MolExport.format_rows(self._format, buffer, rows, kinds[rows], lambda name: get_field(name, rows))
+
+
+    # --------------------------------------------------------------------------
+    def _iter_results(self, paths: list[str], njobs: int, out):
+        """Yield the (result, counts) of each file in 'paths', in order. 'result' is either the matching rows as bytes,
+        the path of a temporary file holding them, or the exception that prevented reading the file"""
+        if njobs <= 1 or len(paths) == 1: # nothing to parallelize, stream the rows right away
+            for path in paths:
+                try: yield b'', self.query_file(path, out.write)
+                except BrokenPipeError: raise
+                except Exception as e: yield e, None
+            return
+
+        with ProcessPoolExecutor(njobs) as pool:
+            pending = []
+            try:
+                for path in paths:
+                    if path == self.PATH_STDIN: # can't be read from another process
+                        pending.append(None)
+                    else:
+                        pending.append(pool.submit(self._query_task, path))
+
+                    while len(pending) > njobs * self.NTASKS_PER_JOB:
+                        yield self._get_result(pending.pop(0), out)
+                while pending:
+                    yield self._get_result(pending.pop(0), out)
+            finally: # e.g. the output was closed, drop the results that won't be written
+                for future in pending:
+                    if future is not None and not future.cancel(): self._discard_result(future)
+
+
+    # --------------------------------------------------------------------------
+    def _get_result(self, future, out) -> tuple:
+        try:
+            if future is None: return b'', self.query_file(self.PATH_STDIN, out.write)
+            return future.result()
+        except BrokenPipeError: raise
+        except Exception as e: return e, None
+
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _discard_result(future):
+        try: result, _ = future.result()
+        except Exception: return
+        if isinstance(result, Path): os.remove(result)
+
+
+    # --------------------------------------------------------------------------
+    def _query_task(self, path: str) -> tuple[bytes | Path, dict[str, int]]:
+        """Run query_file in a worker process. Big results are spilled to a temporary file, whose path is returned instead."""
+        blocks, nbytes, spill = [], 0, None
+        def write(block: bytes):
+            nonlocal nbytes, spill
+            if spill is not None:
+                spill.write(block)
+                return
+            blocks.append(block)
+            nbytes += len(block)
+            if nbytes > self.NBYTES_SPILL:
+                spill = tempfile.NamedTemporaryFile(prefix = "molprisma-query-", delete = False)
+                spill.writelines(blocks)
+                blocks.clear()
+
+        try:
+            counts = self.query_file(path, write)
+        except BaseException:
+            if spill is not None:
+                spill.close()
+                os.remove(spill.name)
+            raise
+
+        if spill is None: return b''.join(blocks), counts
+        spill.close()
+        return Path(spill.name), counts
+
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _write_result(result: bytes | Path, out):
+        if not isinstance(result, Path):
+            out.write(result)
+            return
+        try:
+            with open(result, "rb") as file:
+                while block := file.read(1 << 20): out.write(block)
+        finally:
+            os.remove(result)
+
+
+    # --------------------------------------------------------------------------
+    def _iter_chunks(self, path: str):
+        """Yield the (data, lo, hi) chunks of whole rows of the file at 'path' (or of the standard input), see Parser._iter_chunks"""
+        if path == self.PATH_STDIN:
+            chunks = self._iter_chunks_stream(sys.stdin.buffer)
+        else:
+            chunks = mp.ParserPDB(path, lazy = True)._iter_chunks()
+        for data,lo,hi,_ in chunks:
+            yield data, lo, hi
+
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _iter_chunks_stream(stream, nbytes: int = mp.Parser.NBYTES_CHUNK):
+        """Same as Parser._iter_chunks, but for a non-seekable stream (e.g. the standard input)"""
+        tail = b''
+        while block := stream.read(nbytes):
+            data = tail + block
+            hi = data.rfind(b'\n') + 1
+            tail = data[hi:]
+            if hi: yield np.frombuffer(data, dtype = np.uint8), 0, hi, 0.0
+        if tail: yield np.frombuffer(tail, dtype = np.uint8), 0, len(tail), 1.0
+
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _new_counts() -> dict[str, int]:
+        return {"rows": 0, mp.MolKind.ATOM.name: 0, mp.MolKind.HETE.name: 0, mp.MolKind.META.name: 0}
+
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _format_summary(cls, path: str, counts: dict[str, int]) -> str:
+        nmatched = sum(counts[kind.name] for kind in (mp.MolKind.ATOM, mp.MolKind.HETE, mp.MolKind.META))
+        return f"{'<stdin>' if path == cls.PATH_STDIN else path}: {nmatched} of {counts['rows']} rows matched " +\
+            f"({counts['ATOM']} atoms, {counts['HETE']} hetatms, {counts['META']} metadata)\n"
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -1,3 +1,8 @@
+import math
+import os
+import time
+from itertools import groupby
+
 import prismatui as pr
 
 import molprisma as mp
@@ -8,10 +13,31 @@ class TUIMolPrisma(pr.Terminal):
     PDB_WIDTH = 80
     H_GUIDES = 2
     H_PDB_SECTIONS = 18
+    W_PDB_SECTIONS = 48 # the statistics panel takes the rest of the width
     XPOS_FILTERS = 15
+    FPS_LOADING = 20 # the screen is refreshed without waiting for keys while the data is still being parsed
+    FPS_MAX = 60 # keys pressed faster than this are handled together, by a single frame
 
     KEY_SCROLL_TOP    = ord('-')
     KEY_SCROLL_BOTTOM = ord('+')
+    KEY_PREV_MODEL    = ord('[')
+    KEY_NEXT_MODEL    = ord(']')
+    KEY_NEXT_FILE     = ord('\t')
+    KEY_PREV_FILE     = pr.KEY_BTAB # shift+tab
+    KEY_SEARCH_FORWARD  = ord('/')
+    KEY_SEARCH_BACKWARD = ord('?')
+    KEY_PREV_RESIDUE = ord('<')
+    KEY_NEXT_RESIDUE = ord('>')
+    KEY_PREV_CHAIN   = ord('{')
+    KEY_NEXT_CHAIN   = ord('}')
+    KEY_TOGGLE_GROUP = ord(' ')
+    KEYS_SCROLL = (pr.KEY_UP, pr.KEY_DOWN, pr.KEY_PPAGE, pr.KEY_NPAGE) # merged when repeated, see TUIMolPrisma._scroll_keys
+
+    KEYS_PROMPT_ACCEPT = (ord('\n'), ord('\r'), pr.KEY_ENTER)
+    KEYS_PROMPT_DELETE = (pr.KEY_BACKSPACE, 127, 8)
+    KEY_PROMPT_CANCEL  = 27 # ESC
+
+    LABEL_EXPORT = "export visible rows to (.pdb .csv .parquet .arrow)"
 
     COLOR_GRAY = 8
     COLOR_YELLOW_SOFT = 9
@@ -19,14 +45,30 @@ class TUIMolPrisma(pr.Terminal):
     COLOR_CYAN_SOFT = 11
 
     # --------------------------------------------------------------------------
-    def __init__(self, mol_data: mp.MolData):
+    def __init__(self, mol_data: mp.MolData, session: mp.MolSession | None = None, profiler: mp.Profiler | None = None):
+        """If given, 'session' holds the other files that can be switched to (with 'mol_data' being its current one),
+        and 'profiler' (already started) gets every frame timed, with its summary shown on the top right corner"""
         super().__init__()
         self._mol: mp.MolData = mol_data
-        self._show_atom: bool = True
-        self._show_hete: bool = True
-        self._show_meta: bool = False # start with metadata hidden by default
-        self._filter_key: callable[mp.MolLine] =\
-            lambda line: line.kind != mp.MolKind.META
+        self._session: mp.MolSession | None = session
+        self._profiler: mp.Profiler | None = profiler
+        self.init_mol(self._mol)
+
+        self._prompt: str | None = None # text being typed by the user, if any
+        self._prompt_label: str = ""
+        self._prompt_accept: callable = lambda text: None
+        self._message: str | None = None # shown at the bottom until the next key, e.g. when a search finds nothing
+        self._search: tuple[str, bool] | None = None # last searched pattern, and whether it was searched backward
+
+        self._panel_states: dict[str, tuple] = {} # inputs each panel was last drawn with, see TUIMolPrisma._redraw_panel
+        self._dirty: bool = True # whether any panel was redrawn during this frame
+        self._attr_rows: dict[tuple[mp.MolKind, int | None, int], list[int]] = {} # shared attribute rows, see TUIMolPrisma._get_attr_array
+        self._pinned_end: bool = False # whether the view sticks to the last row of a followed file as it grows
+        self._keys: list[int] = [-1] # keys read since the last frame, see TUIMolPrisma._read_keys
+        self._t_render: float = 0.0 # time.perf_counter of the last render
+        self._sections_dirty: list[pr.Section] = [] # redrawn since the last render, see TUIMolPrisma._render
+        self._render_all: bool = True # whether the whole screen must be rendered again (e.g. after a resize)
+        self._stats_pending: bool = False # whether the statistics shown are still being computed in the background
 
         ### this mask is used in TUIMolPrisma._get_attr_array for choosing appropriate column colors
         ### this is not a boolean mask. instead, it has 3 possible values
@@ -48,6 +90,13 @@ class TUIMolPrisma(pr.Terminal):
         ]
 
 
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def init_mol(mol: mp.MolData):
+        """Default view of a MolData when first shown"""
+        mol.set_kind_shown(mp.MolKind.META, False) # start with metadata hidden by default
+
+
     # --------------------------------------------------------------------------
     def on_start(self):
         pr.init_color(self.COLOR_GRAY, 400, 400, 400)
@@ -66,6 +115,10 @@ class TUIMolPrisma(pr.Terminal):
         self.pair_help_0    = pr.init_pair(8,  pr.COLOR_WHITE, pr.COLOR_RED)
         self.pair_help_1    = pr.init_pair(9,  pr.COLOR_BLACK, pr.COLOR_GREEN)
         self.pair_help_soft = pr.init_pair(10, pr.COLOR_WHITE, self.COLOR_CYAN_SOFT)
+        self.pair_error     = pr.init_pair(11, pr.COLOR_WHITE, pr.COLOR_RED)
+        self.pair_added     = pr.init_pair(12, pr.COLOR_BLACK, pr.COLOR_GREEN)
+        self.pair_removed   = pr.init_pair(13, pr.COLOR_WHITE, pr.COLOR_RED)
+        self.pair_changed   = pr.init_pair(14, pr.COLOR_WHITE, pr.COLOR_BLUE)
 
         w_lsect = self.PDB_WIDTH + 2
 
@@ -74,27 +127,169 @@ class TUIMolPrisma(pr.Terminal):
 
         self.lsect_body   = self.lsect.create_child(-self.H_GUIDES, 1.0,  0, 0)
         self.lsect_footer = self.lsect.create_child( self.H_GUIDES, 1.0, -1, 0)
-        self.rsect_top    = self.rsect.create_child( self.H_PDB_SECTIONS, 1.0, 0, 0)
+        self.rsect_top    = self.rsect.create_child( self.H_PDB_SECTIONS,  self.W_PDB_SECTIONS, 0, 0)
+        self.rsect_stats  = self.rsect.create_child( self.H_PDB_SECTIONS, -self.W_PDB_SECTIONS, 0, self.W_PDB_SECTIONS)
         self.rsect_bottom = self.rsect.create_child(-self.H_PDB_SECTIONS, 1.0, self.H_PDB_SECTIONS, 0)
+        self.overlay      = self.rsect.create_child(1, 1.0, 0, 0) # drawn over the top border, blank pixels are transparent
 
 
     # --------------------------------------------------------------------------
     def on_update(self):
-        self._handle_key_press()
-        self._draw_borders()
-        self._draw_lsect_body()
-        self._draw_rsect_top()
-        self._draw_rsect_bottom()
-        self._draw_lsect_footer()
+        if not self._handle_keys(): return
+        with self._mol.lock: # the data might be growing in a background thread
+            if self._mol.is_validated(): self._mol.validate() # keep checking the rows appended since
+            self._pinned_end = self._mol.following and self._mol.current_line >= self._get_last_line()
+            mol = self._mol
+            kinds = tuple(mol.is_kind_shown(kind) for kind in mp.MolKind)
+            filters = (tuple(mol._filter_idxs.items()), mol._near, mol.get_selection(), tuple(mol._ranges.items()), mol.current_model, len(mol))
+            self._redraw_panel("body", self.lsect_body, self._draw_lsect_body,
+                (mol.current_line, mol.current_section, kinds, filters, mol.progress, mol.following, self._pinned_end,
+                 self._prompt, self._prompt_label, self._message, self._get_error(), self._is_prefetching(), mol.is_validated(), mol.get_fold(), mol._expanded)
+            )
+            self._redraw_panel("sections", self.rsect_top, self._draw_rsect_top, (mol.current_section,))
+            self._redraw_panel("stats", self.rsect_stats, self._draw_rsect_stats, (mol.current_section, kinds, filters, self._is_stats_ready()))
+            self._redraw_panel("filters", self.rsect_bottom, self._draw_rsect_bottom, filters)
+            self._redraw_panel("footer", self.lsect_footer, self._draw_lsect_footer, (kinds, mol.any_filter_active()))
+            if self._profiler is not None and self._dirty: # updated along with the rest, so that unchanged frames still aren't rendered
+                self._redraw_panel("profiler", self.overlay, self._draw_overlay, (self._profiler.get_overlay(),))
+            self._update_loading()
+
+
+    # --------------------------------------------------------------------------
+    def on_resize(self):
+        self._panel_states.clear() # every panel must be drawn again
+        self._render_all = True
 
 
     # --------------------------------------------------------------------------
     def should_stop(self):
+        if self._prompt is not None: return False
         return self.key == pr.KEY_Q_LOWER or self.key == pr.KEY_Q_UPPER
 
 
+    # --------------------------------------------------------------------------
+    def _on_update(self):
+        """Same as pr.Terminal._on_update, except that the screen isn't cleared beforehand:
+        on_update clears and redraws only the panels whose inputs changed, and frames without changes aren't rendered.
+        Every key read since the last frame is handled by the next one (see TUIMolPrisma._read_keys), quitting there if asked to."""
+        self._dirty = False
+        t_start = time.perf_counter()
+        self.on_update()
+        if not self._running: return
+        if self._dirty: self._render()
+        if self._profiler is not None: self._profiler.end_frame(t_start, self._dirty)
+
+        self._read_keys()
+        self._wait()
+
+
+    # --------------------------------------------------------------------------
+    def _render(self):
+        """Same as pr.Terminal._render, except that only the areas of the panels redrawn since the last render are aggregated
+        (along with the panels overlapping them) and written to the terminal, e.g. just the body while scrolling.
+        Flushing the output has no public counterpart in prismatui, hence the exact version pinned in requirements.txt."""
+        sections, self._sections_dirty = self._sections_dirty, []
+        self._t_render = time.perf_counter()
+        if self._render_all:
+            self._render_all = False
+            super()._render()
+            return
+
+        for section in dict.fromkeys(sections): # unique, in order
+            layer = pr.Layer(section.h, section.w)
+            self._aggregate_area(layer, section.y, section.x)
+            for i,(chars,attrs) in enumerate(zip(layer.get_chars_row_as_strs(), layer.get_attrs())):
+                x = 0
+                for attr,group in groupby(attrs):
+                    n = sum(1 for _ in group)
+                    pr.write_text(section.y + i, section.x + x, chars[x:x + n], attr)
+                    x += n
+        pr._CURRENT_BACKEND._refresh()
+
+
+    # --------------------------------------------------------------------------
+    def _aggregate_area(self, layer: pr.Layer, y: int, x: int):
+        """Same as self.root.aggregate_layers, but into a 'layer' covering only the area of the screen starting at ('y','x').
+        Only the panels (sections without children) are aggregated, as the layers of the sections containing them are never drawn on."""
+        for section in self._iter_panels(self.root):
+            y0, y1 = max(y, section.y), min(y + layer.h, section.y + section.h)
+            x0, x1 = max(x, section.x), min(x + layer.w, section.x + section.w)
+            if y0 >= y1 or x0 >= x1: continue
+            rows, cols = slice(y0 - section.y, y1 - section.y), slice(x0 - section.x, x1 - section.x)
+            for layer_section in section.iter_layers():
+                chars = [row[cols] for row in layer_section.get_chars_row_as_strs()[rows]]
+                attrs = [row[cols] for row in layer_section.get_attrs()[rows]]
+                layer.draw_matrix(y0 - y, x0 - x, chars, attrs, layer_section.blend_mode)
+
+
+    # --------------------------------------------------------------------------
+    def _iter_panels(self, section: pr.Section):
+        children = list(section.iter_children())
+        if not children: yield section
+        for child in children:
+            yield from self._iter_panels(child)
+
+
+    # --------------------------------------------------------------------------
+    def _redraw_panel(self, name: str, section: pr.Section, draw: callable, state: tuple):
+        """Clear 'section' and call 'draw', unless the panel was already drawn with the same 'state'"""
+        if self._panel_states.get(name, None) == state: return
+        section.clear()
+        draw()
+        self._panel_states[name] = state
+        self._sections_dirty.append(section)
+        self._dirty = True
+
+
+    # --------------------------------------------------------------------------
+    def _read_keys(self):
+        """Wait for a key as usual, then take the ones already pending too (e.g. repeated while holding a key down),
+        until a frame interval (see FPS_MAX) passes since the last render. They're all handled by the next frame."""
+        self._keys = [self.fetch_key()]
+        if self._keys[0] == -1: return # no-delay mode, nothing pressed
+
+        pr.set_nodelay(True)
+        t_end = self._t_render + 1 / self.FPS_MAX
+        while True:
+            key = self.fetch_key()
+            if key != -1: self._keys.append(key)
+            elif time.perf_counter() < t_end: pr.sleep(1)
+            else: break
+        pr.set_nodelay(self._no_delay)
+
+
+    # --------------------------------------------------------------------------
+    def _handle_keys(self) -> bool:
+        """Handle the keys read since the last frame, in order. Consecutive scrolling keys are merged into a single move.
+        Returns False if asked to quit (the keys after that one are ignored)."""
+        keys, self._keys = self._keys, [-1]
+        i = 0
+        while i < len(keys):
+            self.key = keys[i]
+            if self.should_stop():
+                self.stop()
+                return False
+
+            j = i + 1
+            if self._prompt is None and self.key in self.KEYS_SCROLL:
+                while j < len(keys) and keys[j] in self.KEYS_SCROLL: j += 1
+
+            self._update_session()
+            with self._mol.lock:
+                self._update_pinned()
+                if j - i > 1: self._scroll_keys(keys[i:j])
+                else: self._handle_key_press()
+            i = j
+        return True
+
+
     # --------------------------------------------------------------------------
     def _handle_key_press(self):
+        if self._prompt is not None:
+            self._handle_prompt_key()
+            return
+        if self.key != -1: self._message = None
+
         match self.key:
             case pr.KEY_1:       self._toggle_all()
             case pr.KEY_1:       self._toggle_all()
@@ -126,6 +321,57 @@ class TUIMolPrisma(pr.Terminal):
             case pr.KEY_K_UPPER: self._reset_filters()
             case self.KEY_SCROLL_TOP:    self._scroll_up(float("inf"))
             case self.KEY_SCROLL_BOTTOM: self._scroll_down(float("inf"))
+            case self.KEY_PREV_MODEL:    self._prev_model()
+            case self.KEY_NEXT_MODEL:    self._next_model()
+            case pr.KEY_G_LOWER: self._start_prompt("go to model", self._jump_model)
+            case pr.KEY_G_UPPER: self._start_prompt("go to model", self._jump_model)
+            case pr.KEY_W_LOWER: self._start_prompt("within Å of the top atom", lambda text: self._filter_near(text, residue = False))
+            case pr.KEY_W_UPPER: self._start_prompt("within Å of the top residue", lambda text: self._filter_near(text, residue = True))
+            case pr.KEY_S_LOWER: self._start_prompt("select", self._select, self._mol.get_selection() or "")
+            case pr.KEY_S_UPPER: self._start_prompt("select", self._select, self._mol.get_selection() or "")
+            case pr.KEY_V_LOWER: self._start_prompt("range (e.g. bfactor 40:60)", self._filter_range)
+            case pr.KEY_V_UPPER: self._start_prompt("range (e.g. bfactor 40:60)", self._filter_range)
+            case pr.KEY_J_LOWER: self._start_prompt("jump to serial", self._jump_serial)
+            case pr.KEY_J_UPPER: self._start_prompt("jump to residue (e.g. A 52 or A 52B)", self._jump_residue)
+            case self.KEY_SEARCH_FORWARD:  self._start_prompt("search", lambda text: self._find(text, backward = False))
+            case self.KEY_SEARCH_BACKWARD: self._start_prompt("search backward", lambda text: self._find(text, backward = True))
+            case pr.KEY_N_LOWER: self._find_again(reverse = False)
+            case pr.KEY_N_UPPER: self._find_again(reverse = True)
+            case pr.KEY_X_LOWER: self._next_error(backward = False)
+            case pr.KEY_X_UPPER: self._next_error(backward = True)
+            case pr.KEY_O_LOWER: self._start_prompt(self.LABEL_EXPORT, self._export)
+            case pr.KEY_O_UPPER: self._start_prompt(self.LABEL_EXPORT, self._export)
+            case pr.KEY_F_LOWER: self._next_fold(backward = False)
+            case pr.KEY_F_UPPER: self._next_fold(backward = True)
+            case self.KEY_TOGGLE_GROUP: self._toggle_group()
+            case self.KEY_PREV_RESIDUE: self._next_group("residue", backward = True)
+            case self.KEY_NEXT_RESIDUE: self._next_group("residue", backward = False)
+            case self.KEY_PREV_CHAIN:   self._next_group("chain", backward = True)
+            case self.KEY_NEXT_CHAIN:   self._next_group("chain", backward = False)
+
+
+    # --------------------------------------------------------------------------
+    def _update_session(self):
+        """Switch to another file if asked to, before taking the lock of the current one"""
+        if self._session is None: return
+        self._session.update()
+        if self._prompt is not None: return
+        match self.key:
+            case self.KEY_NEXT_FILE: self._set_mol(self._session.open(self._session.current + 1))
+            case self.KEY_PREV_FILE: self._set_mol(self._session.open(self._session.current - 1))
+
+
+    # --------------------------------------------------------------------------
+    def _handle_prompt_key(self):
+        if self.key in self.KEYS_PROMPT_ACCEPT:
+            text, self._prompt = self._prompt, None
+            self._prompt_accept(text)
+        elif self.key == self.KEY_PROMPT_CANCEL:
+            self._prompt = None
+        elif self.key in self.KEYS_PROMPT_DELETE:
+            self._prompt = self._prompt[:-1]
+        elif 32 <= self.key < 127: # printable ASCII
+            self._prompt += chr(self.key)
 
 
     # --------------------------------------------------------------------------
@@ -133,23 +379,54 @@ class TUIMolPrisma(pr.Terminal):
         hdisplay = self.lsect_body.h - 2
         self.NLINES_FAST_SCROLL = hdisplay // 2 # dinamically adjust fast scroll based on terminal height
 
-        lines = tuple(self._mol.iter_lines(self._filter_key, hdisplay))
+        lines = tuple(self._mol.iter_lines(nlines = hdisplay))
         chars = [line.text for line in lines]
         attrs = [self._get_attr_array(line) for line in lines]
 
         self.lsect_body.draw_matrix(1, 1, chars, attrs)
 
+        self.lsect_body.draw_border()
+        xpos = 2 + self.lsect_body.draw_text(0, 2, f" {self._mol.name} ", pr.A_BOLD)
+        if self._session is not None and len(self._session) > 1:
+            xpos += self.lsect_body.draw_text(0, xpos, f" {self._session.current + 1}/{len(self._session)}  tab: next file ", self.pair_help)
+        if self._mol.get_fold() is not None:
+            xpos += self.lsect_body.draw_text(0, xpos, f" {self._mol.get_fold()}s folded  space: expand  f: next ", self.pair_help)
+        diff = self._mol.get_diff()
+        if diff is not None:
+            self.lsect_body.draw_text(0, xpos, f" {diff.nchanged} changed  {diff.nadded} added  {diff.nremoved} removed ", self.pair_help)
+        if self._mol.count_models():
+            self.lsect_body.draw_text(0, -2,
+                f" model {self._mol.get_model_number()} ({self._mol.current_model + 1}/{self._mol.count_models()})  [/]: prev/next  g: go to ",
+                self.pair_help
+            )
+        if self._prompt is not None:
+            self.lsect_body.draw_text(-1, 2, f" {self._prompt_label}: {self._prompt}_ ", pr.A_REVERSE)
+        elif self._message is not None:
+            self.lsect_body.draw_text(-1, 2, f" {self._message} ", self.pair_help_0)
+        elif self._get_error() is not None:
+            self.lsect_body.draw_text(-1, 2, f" {self._get_error()} ", self.pair_help_0)
+        elif diff is not None and lines and lines[0].idx is not None and lines[0].idx < len(diff): # what changed in the top atom
+            self.lsect_body.draw_text(-1, 2, f" {diff.describe(lines[0].idx)} ", self.pair_help_soft)
+        if self._mol.progress < 1: # drawn on the border right above the guides
+            self.lsect_body.draw_text(-1, -2, f" loading {self._mol.progress:4.0%} ", self.pair_help_0)
+        elif self._is_prefetching():
+            self.lsect_body.draw_text(-1, -2, " prefetching... ", self.pair_help_0)
+        elif self._mol.following:
+            self.lsect_body.draw_text(-1, -2, " following (at the end) " if self._pinned_end else " following  +: go to end ",
+                self.pair_help_1 if self._pinned_end else self.pair_help
+            )
+
 
     # --------------------------------------------------------------------------
     def _draw_lsect_footer(self):
-        showing_all = self._show_atom and self._show_hete and self._show_meta
+        self.lsect_footer.draw_border(bl = '│', bs = ' ', br = '│')
         self.lsect_footer.draw_matrix(0, 2, # "top" guides
             *self._get_guides_matrices(guides = (
                 ("toggle...",     None),
-                ("1: all",        showing_all),
-                ("2: atoms",      self._show_atom),
-                ("3: hetatms",    self._show_hete),
-                ("4: metadata",   self._show_meta),
+                ("1: all",        self._is_showing_all()),
+                ("2: atoms",      self._mol.is_kind_shown(mp.MolKind.ATOM)),
+                ("3: hetatms",    self._mol.is_kind_shown(mp.MolKind.HETE)),
+                ("4: metadata",   self._mol.is_kind_shown(mp.MolKind.META)),
                 ("arecil: filter", self._mol.any_filter_active()),
             ))
         )
@@ -170,6 +447,8 @@ class TUIMolPrisma(pr.Terminal):
 
     # --------------------------------------------------------------------------
     def _draw_rsect_top(self):
+        self.rsect_top.draw_border()
+        self.rsect_top.draw_text(0, 2, " PDB Sections ", pr.A_BOLD)
         self.rsect_top.draw_text(1, 2, self._str_sections_header, pr.A_UNDERLINE)
         for i,chars in enumerate(self._strs_sections_body):
             self.rsect_top.draw_text(2+i, 2, chars,
@@ -177,8 +456,42 @@ class TUIMolPrisma(pr.Terminal):
             )
 
 
+    # --------------------------------------------------------------------------
+    def _draw_rsect_stats(self):
+        self.rsect_stats.draw_border()
+        if self._mol.current_section is None:
+            self.rsect_stats.draw_text(0, 2, " Statistics ", pr.A_BOLD)
+            self.rsect_stats.draw_text(1, 2,
+                "Highlight a section with ←/→ to summarize\nits values over the visible atoms.",
+                attr = self.pair_help_soft, blend = pr.BlendMode.OVERWRITE
+            )
+            return
+
+        name = self._mol._sections[self._mol.current_section].name
+        stats = self._mol.get_stats(name, wait = False)
+        if stats is None:
+            self.rsect_stats.draw_text(0, 2, f" {name} ", pr.A_BOLD)
+            self.rsect_stats.draw_text(1, 2, "Computing...", attr = self.pair_help_soft, blend = pr.BlendMode.OVERWRITE)
+            return
+
+        self.rsect_stats.draw_text(0, 2, f" {stats.name} ", pr.A_BOLD)
+        for i,line in enumerate(self._format_stats(stats, self.rsect_stats.w - 4)[:self.rsect_stats.h - 2], start = 1):
+            self.rsect_stats.draw_text(i, 2, line)
+
+
     # --------------------------------------------------------------------------
     def _draw_rsect_bottom(self):
+        self.rsect_bottom.draw_border()
+        self.rsect_bottom.draw_text(0, 2, " Filters ", pr.A_BOLD)
+        self.rsect_bottom.draw_text(-1, 2,
+            "Press [s] to show only atoms matching an expression, e.g.\n" +\
+            "  chain A and resname ALA,GLY and bfactor > 40\n" +\
+            "Press [v] to show only atoms within a range, e.g. resi 10:20\n" +\
+            "Press [w]/[W] to show only rows near the top atom/residue.\n" +\
+            "Press [a]/[r]/[e]/[c]/[i]/[l] to show only rows matching...\n" +\
+            "... a specific atom/residue/element/chain/insertion/altloc.",
+            attr = self.pair_help_soft, blend = pr.BlendMode.OVERWRITE
+        )
         w_max = max(0, self.rsect_bottom.w - self.XPOS_FILTERS - 4) # 1 (border) + 3 (ellipses)
         for i,k in enumerate(self._mol.KEYS_FILTERS.keys(), start = 1):
             chars, attrs = self._mol.get_filter_render_data(k, w_max)
@@ -189,24 +502,48 @@ class TUIMolPrisma(pr.Terminal):
             self.rsect_bottom.draw_text(i, 2, f"{k}:")
             self.rsect_bottom.draw_text(i, self.XPOS_FILTERS, chars, attrs)
 
+        near = self._mol.describe_near()
+        self.rsect_bottom.draw_text(len(self._mol.KEYS_FILTERS) + 1, 2, "[w]ithin:")
+        if near is not None:
+            self.rsect_bottom.draw_text(len(self._mol.KEYS_FILTERS) + 1, self.XPOS_FILTERS, near[:w_max + 3], pr.A_REVERSE)
+
+        selection = self._mol.get_selection()
+        self.rsect_bottom.draw_text(len(self._mol.KEYS_FILTERS) + 2, 2, "[s]elect:")
+        if selection is not None:
+            self.rsect_bottom.draw_text(len(self._mol.KEYS_FILTERS) + 2, self.XPOS_FILTERS, selection[:w_max + 3], pr.A_REVERSE)
+
+        ranges = self._mol.describe_ranges()
+        self.rsect_bottom.draw_text(len(self._mol.KEYS_FILTERS) + 3, 2, "[v]alues:")
+        if ranges is not None:
+            self.rsect_bottom.draw_text(len(self._mol.KEYS_FILTERS) + 3, self.XPOS_FILTERS, ranges[:w_max + 3], pr.A_REVERSE)
+
 
     # --------------------------------------------------------------------------
-    def _draw_borders(self):
-        self.lsect_body.draw_border()
-        self.lsect_body.draw_text(0, 2, f" {self._mol.name} ", pr.A_BOLD)
+    def _draw_overlay(self):
+        self.overlay.draw_text(0, -2, self._profiler.get_overlay(), self.pair_help_0)
 
-        self.lsect_footer.draw_border(bl = '│', bs = ' ', br = '│')
 
-        self.rsect_top.draw_border()
-        self.rsect_top.draw_text(0, 2, " PDB Sections ", pr.A_BOLD)
+    # --------------------------------------------------------------------------
+    def _update_loading(self):
+        """Keep refreshing the screen while the data is being parsed, then go back to waiting for keys"""
+        loading = self._mol.progress < 1 or self._is_prefetching() or self._mol.following or self._stats_pending
+        if loading == self._no_delay: return
+        self.set_fps(self.FPS_LOADING if loading else 0)
+        pr.set_nodelay(self._no_delay)
+
+
+    # --------------------------------------------------------------------------
+    def _update_pinned(self):
+        """Keep the view at the last row of a followed file while rows are appended to it, if it already was there"""
+        if self._pinned_end and self._mol.following:
+            self._mol.current_line = self._get_last_line()
 
-        self.rsect_bottom.draw_border()
-        self.rsect_bottom.draw_text(0, 2, " Filters ", pr.A_BOLD)
-        self.rsect_bottom.draw_text(-1, 2,
-            "Press [a]/[r]/[e]/[c]/[i]/[l] to show only rows matching...\n" +\
-            "... a specific atom/residue/element/chain/insertion/altloc.",
-            attr = self.pair_help_soft, blend = pr.BlendMode.OVERWRITE
-        )
+
+    # --------------------------------------------------------------------------
+    def _set_mol(self, mol: mp.MolData):
+        self._mol = mol
+        self._pinned_end = False
+        self._panel_states.clear() # everything might have changed
 
 
     # --------------------------------------------------------------------------
@@ -216,60 +553,266 @@ class TUIMolPrisma(pr.Terminal):
 
     # --------------------------------------------------------------------------
     def _scroll_down(self, nlines: int):
-        nlines_available = self._mol.count_lines(self._filter_key) - 1 # account for NONE terminator line
-        self._mol.current_line = min(self._mol.current_line + nlines, nlines_available - 1)
+        self._mol.current_line = min(self._mol.current_line + nlines, self._get_last_line())
+
+
+    # --------------------------------------------------------------------------
+    def _scroll_keys(self, keys: list[int]):
+        """Move once to where scrolling with every one of 'keys' in order would have led"""
+        self._message = None
+        line, line_last = self._mol.current_line, self._get_last_line()
+        for key in keys:
+            line = min(max(0, line + self._get_scroll_step(key)), line_last)
+        self._mol.current_line = line
+
+
+    # --------------------------------------------------------------------------
+    def _get_scroll_step(self, key: int) -> int:
+        """Lines moved by one of KEYS_SCROLL, the same as when pressed alone (page keys depend on the height of the screen)"""
+        match key:
+            case pr.KEY_UP:    return -1
+            case pr.KEY_DOWN:  return 1
+            case pr.KEY_PPAGE: return -self.NLINES_FAST_SCROLL
+            case pr.KEY_NPAGE: return self.NLINES_FAST_SCROLL
+
+
+    # --------------------------------------------------------------------------
+    def _get_last_line(self) -> int:
+        """Last row that can be scrolled to. The NONE terminator line (absent while following) is only shown below it."""
+        nlines_available = self._mol.count_lines() - (0 if self._mol.following else 1)
+        return max(0, nlines_available - 1)
 
 
     # --------------------------------------------------------------------------
     def _toggle_all(self):
-        was_showing_all = self._show_atom and self._show_hete and self._show_meta
-        self._show_meta = not was_showing_all
-        self._show_atom = not was_showing_all
-        self._show_hete = not was_showing_all
-        self._update_filter_key()
+        was_showing_all = self._is_showing_all()
+        for kind in (mp.MolKind.META, mp.MolKind.ATOM, mp.MolKind.HETE):
+            self._mol.set_kind_shown(kind, not was_showing_all)
         self._update_pos()
 
 
     # --------------------------------------------------------------------------
     def _toggle_meta(self):
-        self._show_meta = not self._show_meta
-        self._update_filter_key()
-        self._update_pos()
+        self._toggle_kind(mp.MolKind.META)
 
 
     # --------------------------------------------------------------------------
     def _toggle_atom(self):
-        self._show_atom = not self._show_atom
-        self._update_filter_key()
-        self._update_pos()
+        self._toggle_kind(mp.MolKind.ATOM)
 
 
     # --------------------------------------------------------------------------
     def _toggle_hete(self):
-        self._show_hete = not self._show_hete
-        self._update_filter_key()
+        self._toggle_kind(mp.MolKind.HETE)
+
+
+    # --------------------------------------------------------------------------
+    def _toggle_kind(self, kind: mp.MolKind):
+        self._mol.set_kind_shown(kind, not self._mol.is_kind_shown(kind))
         self._update_pos()
 
 
     # --------------------------------------------------------------------------
     def _next_filter(self, name: str):
         self._mol.next_filter(name)
-        self._update_filter_key()
         self._update_pos()
 
 
+    # --------------------------------------------------------------------------
+    def _prev_model(self):
+        self._mol.prev_model()
+        self._update_pos()
+
+
+    # --------------------------------------------------------------------------
+    def _next_model(self):
+        self._mol.next_model()
+        self._update_pos()
+
+
+    # --------------------------------------------------------------------------
+    def _jump_model(self, text: str):
+        if not text.strip().isdigit(): return
+        if self._mol.jump_model(int(text)):
+            self._update_pos()
+
+
+    # --------------------------------------------------------------------------
+    def _filter_near(self, text: str, residue: bool):
+        """Show only the rows within the typed radius of the top row (or of its residue). Anything but a radius clears the filter."""
+        try: radius = float(text)
+        except ValueError: radius = None
+        if radius is not None and radius >= 0: # also rejects NaN
+            self._mol.filter_near(radius, residue) # nothing changes if the top row isn't an atom
+            return
+        self._mol.clear_near()
+        self._update_pos()
+
+
+    # --------------------------------------------------------------------------
+    def _select(self, text: str):
+        """Show only the atoms matching the typed selection (an empty one clears it).
+        If it's invalid, the prompt is shown again with the error, keeping the text for fixing it."""
+        try: self._mol.set_selection(text)
+        except ValueError as error:
+            self._start_prompt(f"select ({error})", self._select, text)
+            return
+        self._update_pos()
+
+
+    # --------------------------------------------------------------------------
+    def _filter_range(self, text: str):
+        """Show only the atoms whose typed numeric section is within the typed range, e.g. 'bfactor 40:' or 'resi 10:20'.
+        A section alone clears its range, and nothing at all clears every range. Invalid input is prompted again with the error."""
+        words = text.split()
+        if not words:
+            self._mol.clear_ranges()
+            self._update_pos()
+            return
+        try:
+            name = mp.MolSelection.ALIASES.get(words[0].lower(), words[0].upper())
+            if name not in mp.MolColumns.DTYPES_NUMERIC: raise ValueError(f"'{words[0]}' isn't a numeric section")
+            if len(words) > 2: raise ValueError("expected a section and a range")
+            bounds = words[1].split(':', 1) if len(words) > 1 else ["", ""]
+            lo, hi = (float(bound) if bound else None for bound in (bounds * 2)[:2])
+            if not all(bound is None or math.isfinite(bound) for bound in (lo, hi)): raise ValueError("bounds must be finite numbers")
+        except ValueError as error:
+            self._start_prompt(f"range ({error})", self._filter_range, text)
+            return
+        self._mol.set_range(name, lo, hi)
+        self._update_pos()
+
+
+    # --------------------------------------------------------------------------
+    def _find(self, text: str, backward: bool):
+        """Move to the next (or previous) visible row matching the typed regex. Invalid ones are prompted again with the error."""
+        if not text: return
+        try: found = self._mol.find(text, backward)
+        except ValueError as error:
+            self._start_prompt(f"search ({error})", lambda text: self._find(text, backward), text)
+            return
+        self._search = (text, backward)
+        if not found: self._message = f"Pattern not found: {text}"
+
+
+    # --------------------------------------------------------------------------
+    def _find_again(self, reverse: bool):
+        """Repeat the last search, in the same direction (or the opposite one if 'reverse')"""
+        if self._search is None: return
+        text, backward = self._search
+        if not self._mol.find(text, backward != reverse):
+            self._message = f"Pattern not found: {text}"
+
+
+    # --------------------------------------------------------------------------
+    def _jump_serial(self, text: str):
+        try: serial = int(text)
+        except ValueError: return
+        if not self._mol.jump_serial(serial):
+            self._message = f"No visible atom with serial {serial}"
+
+
+    # --------------------------------------------------------------------------
+    def _jump_residue(self, text: str):
+        """Jump to a residue typed as its chain and number (with the insertion code, if any, right after it)"""
+        words = text.split()
+        if len(words) == 1: words.insert(0, "") # blank chain
+        if len(words) != 2: return
+        chain, number = words
+        icode = number[-1] if number[-1:].isalpha() else ""
+        try: resseq = int(number[:len(number) - len(icode)])
+        except ValueError: return
+        if not self._mol.jump_residue(chain, resseq, icode):
+            self._message = f"No visible residue {text.strip()}"
+
+
+    # --------------------------------------------------------------------------
+    def _next_error(self, backward: bool):
+        """Move to the next (or previous) visible row with format errors, describing them. The whole file is validated on first use."""
+        if not self._mol.next_error(backward):
+            ninvalid = len(self._mol.validate().get_rows_invalid())
+            self._message = f"No format errors in the visible rows ({ninvalid} rows hidden)" if ninvalid else "No format errors"
+            return
+        idx = int(self._mol.get_visible_rows()[self._mol.current_line])
+        self._message = f"Line {idx + 1}: {'; '.join(self._mol.get_errors(idx))}"
+
+
+    # --------------------------------------------------------------------------
+    def _export(self, text: str):
+        """Write the visible rows to the typed path, in the format given by its suffix (see MolExport).
+        Unknown formats, missing dependencies and unwritable paths are prompted again with the error."""
+        path = os.path.expanduser(text.strip())
+        if not path: return
+        try: nrows = self._mol.export(path)
+        except (ValueError, ImportError, OSError) as error:
+            self._start_prompt(f"{self.LABEL_EXPORT} ({error})", self._export, text)
+            return
+        self._message = f"Exported {nrows} rows to {path}"
+
+
+    # --------------------------------------------------------------------------
+    def _next_fold(self, backward: bool):
+        """Cycle between showing every row, one line per residue and one line per chain"""
+        levels = (None,) + mp.MolHierarchy.LEVELS
+        idx = levels.index(self._mol.get_fold()) + (-1 if backward else 1)
+        self._mol.set_fold(levels[idx % len(levels)]) # keeping the top row
+
+
+    # --------------------------------------------------------------------------
+    def _toggle_group(self):
+        if not self._mol.toggle_expanded():
+            self._message = "No residue or chain at the top row" if self._mol.get_fold() else "Nothing folded (f: fold residues/chains)"
+
+
+    # --------------------------------------------------------------------------
+    def _next_group(self, level: str, backward: bool):
+        if not self._mol.next_group(level, backward):
+            self._message = f"No {'previous' if backward else 'next'} {level}"
+
+
+    # --------------------------------------------------------------------------
+    def _start_prompt(self, label: str, on_accept: callable, text: str = ""):
+        """Start capturing the keys pressed as text (after the initial 'text'), until ENTER (calling 'on_accept' with it) or ESC"""
+        self._prompt = text
+        self._prompt_label = label
+        self._prompt_accept = on_accept
+
+
     # --------------------------------------------------------------------------
     def _reset_filters(self):
-        self._show_atom = True
-        self._show_hete = True
-        self._show_meta = False
+        self._mol.set_kind_shown(mp.MolKind.ATOM, True)
+        self._mol.set_kind_shown(mp.MolKind.HETE, True)
+        self._mol.set_kind_shown(mp.MolKind.META, False)
         self._mol.reset_filter_idxs()
-        self._update_filter_key()
+        self._mol.clear_near()
+        self._mol.set_selection(None)
+        self._mol.clear_ranges()
         self._update_pos()
 
 
     # --------------------------------------------------------------------------
     def _get_attr_array(self, line: mp.MolLine) -> list[int]:
+        """Return the attributes of every column of 'line'. They only depend on its kind, the highlighted section,
+        its format errors (if validated) and its changes (if comparing files), so the same (read-only) list is shared by all rows alike"""
+        flags = 0 if line.idx is None else self._mol.get_error_flags(line.idx)
+        flags_diff = 0 if line.idx is None else self._mol.get_diff_flags(line.idx)
+        key = (line.kind, self._mol.current_section, flags, flags_diff)
+        attrs = self._attr_rows.get(key, None)
+        if attrs is None:
+            attrs = self._build_attr_array(line.kind)
+            start, end = mp.MolDiff.SPAN_RECORD # record name of the atoms only in one of the files
+            if flags_diff & mp.MolDiff.FLAG_ADDED: attrs[start:end] = [self.pair_added | pr.A_BOLD] * (end - start)
+            if flags_diff & mp.MolDiff.FLAG_REMOVED: attrs[start:end] = [self.pair_removed | pr.A_BOLD] * (end - start)
+            for start,end in mp.MolDiff.get_spans(flags_diff): # cells of the changed fields
+                attrs[start:end] = [self.pair_changed | pr.A_BOLD] * (end - start)
+            for start,end in mp.MolValidator.get_spans(flags): # cells of the failed checks
+                attrs[start:end] = [self.pair_error | pr.A_BOLD] * (end - start)
+            self._attr_rows[key] = attrs
+        return attrs
+
+
+    # --------------------------------------------------------------------------
+    def _build_attr_array(self, kind: mp.MolKind) -> list[int]:
         def get_attr_atoms(i):
             idx_sect = self._mol.get_idx_section(i)
             if idx_sect is None: return pr.A_NORMAL
@@ -277,7 +820,7 @@ class TUIMolPrisma(pr.Terminal):
 
         get_attr_other = lambda _: pr.A_NORMAL
 
-        match line.kind: #               color_empty   | color_standard| color_alt         | highligh or normal attr
+        match kind: #                    color_empty   | color_standard| color_alt         | highligh or normal attr
             case mp.MolKind.NONE: tup = (self.pair_none, self.pair_none, self.pair_none,     get_attr_other)
             case mp.MolKind.META: tup = (self.pair_meta, self.pair_meta, self.pair_meta,     get_attr_other)
             case mp.MolKind.ATOM: tup = (self.pair_meta, self.pair_atom, self.pair_atom_alt, get_attr_atoms)
@@ -291,26 +834,62 @@ class TUIMolPrisma(pr.Terminal):
 
 
     # --------------------------------------------------------------------------
-    def _update_filter_key(self):
-        def filterkey(line: mp.MolLine) -> bool:
-            if line.kind == mp.MolKind.NONE: return True
-            if not self._mol.match_filters(line): return False
-            match line.kind:
-                case mp.MolKind.META: return self._show_meta
-                case mp.MolKind.ATOM: return self._show_atom
-                case mp.MolKind.HETE: return self._show_hete
-                case _: raise ValueError("Unknown MolKind")
+    def _is_showing_all(self) -> bool:
+        return all(self._mol.is_kind_shown(kind) for kind in (mp.MolKind.META, mp.MolKind.ATOM, mp.MolKind.HETE))
 
-        self._filter_key = filterkey
+
+    # --------------------------------------------------------------------------
+    def _is_stats_ready(self) -> bool:
+        """Whether the statistics of the highlighted section (if any) are ready to be shown, computing them otherwise"""
+        self._stats_pending = self._mol.current_section is not None and \
+            self._mol.get_stats(self._mol._sections[self._mol.current_section].name, wait = False) is None
+        return not self._stats_pending
+
+
+    # --------------------------------------------------------------------------
+    def _get_error(self) -> str | None:
+        """Why the current file of the session couldn't be parsed (entirely), if so"""
+        return self._session.get_error() if self._session is not None else None
+
+
+    # --------------------------------------------------------------------------
+    def _is_prefetching(self) -> bool:
+        return self._session is not None and self._session.is_busy()
 
 
     # --------------------------------------------------------------------------
     def _update_pos(self):
         self._mol.current_line = 0
-        for idx, line in enumerate(self._mol.iter_lines(self._filter_key)):
-            if not self._filter_key(line): continue
-            self._mol.current_line = idx
-            return
+
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _format_stats(stats: mp.MolStats, width: int) -> list[str]:
+        """Lines summarizing 'stats' within 'width' characters: extent, mean and a histogram for numeric sections, the most common values otherwise"""
+        def get_bar(count: int, count_max: int, w_bar: int) -> str:
+            return '█' * round(w_bar * count / count_max) if count_max else ''
+
+        if not stats.nrows: return ["No visible atoms."]
+        if not stats.numeric:
+            BLANK = "''"
+            lines = [f"atoms {stats.nrows}   distinct values {stats.ndistinct}", ""]
+            w_value = max(len(value) for value,_ in stats.top) if stats.top else 0
+            w_count = len(str(stats.top[0][1])) if stats.top else 0
+            w_bar = max(0, width - max(2, w_value) - w_count - 9)
+            for value,count in stats.top:
+                bar = get_bar(count, stats.top[0][1], w_bar)
+                lines.append(f"{value or BLANK:<{max(2, w_value)}} {bar:<{w_bar}} {count:>{w_count}} {count / stats.nrows:6.1%}")
+            return [line[:width] for line in lines]
+
+        lines = [f"atoms {stats.nrows}   missing values {stats.nmissing}"]
+        if stats.extent is None: return lines
+        lines += [f"min {stats.extent[0]:g}   max {stats.extent[1]:g}   mean {stats.mean:.6g}", ""]
+        counts, edges = stats.histogram
+        w_count = len(str(counts.max()))
+        w_bar = max(0, width - w_count - 13)
+        for count,edge in zip(counts.tolist(), edges.tolist()):
+            lines.append(f"{edge:>10.6g} ┤{get_bar(count, counts.max(), w_bar):<{w_bar}} {count:>{w_count}}")
+        return [line[:width] for line in lines]
 
 
     # --------------------------------------------------------------------------
@@ -0,0 +1,68 @@
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class ValidateMolPrisma(mp.QueryMolPrisma):
+    """Non-interactive counterpart of the viewer's format checks (see MolValidator): streams the errors of PDB files,
+    chunk by chunk and in constant memory, as 'path:line:column: message' lines. Files are checked in parallel like queries."""
+
+    # --------------------------------------------------------------------------
+    def __init__(self):
+        super().__init__()
+        self._ninvalid: int = 0 # files with errors, among the ones reported by 'run'
+
+
+    # --------------------------------------------------------------------------
+    def run(self, paths: list[str], njobs: int = 1, out = None, err = None) -> bool:
+        """Same as QueryMolPrisma.run, writing the errors instead of the rows. Returns whether all files could be read and have no errors."""
+        self._ninvalid = 0
+        ok = super().run(paths, njobs, out, err)
+        return ok and not self._ninvalid
+
+
+    # --------------------------------------------------------------------------
+    def query_file(self, path: str, write: callable) -> dict[str, int]:
+        """Call 'write' with the errors of the file at 'path', as consecutive blocks of bytes. Returns the counts of rows checked and errors."""
+        counts = self._new_counts()
+        validator = mp.MolValidator() # carries the last serial number over to the next chunk
+        for data,lo,hi in self._iter_chunks(path):
+            buffer = mp.MolBuffer.from_bytes(data, lo, hi)
+            kinds = mp.ParserPDB.get_kinds(buffer)
+            flags = validator.check_buffer(buffer, kinds)
+            write(self._format_errors(path, counts["rows"], flags))
+
+            counts["rows"] += len(kinds)
+            counts["atoms"] += int(np.count_nonzero((kinds == mp.MolKind.ATOM.value) | (kinds == mp.MolKind.HETE.value)))
+            counts["invalid"] += int(np.count_nonzero(flags))
+            counts["errors"] += mp.MolValidator.count_errors(flags)
+        return counts
+
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _format_errors(cls, path: str, offset: int, flags: np.ndarray) -> bytes:
+        """One line per failed check of the rows with the given 'flags', the first one being the row 'offset' of the file"""
+        name = "<stdin>" if path == cls.PATH_STDIN else str(path)
+        columns_messages = [f"{spans[0][0] + 1}: {message}\n" for message,spans in mp.MolValidator.get_checks().values()]
+        rows = np.flatnonzero(flags)
+        failed = (flags[rows, None] >> np.arange(len(columns_messages), dtype = np.uint32)) & 1 # (rows, checks), in the order of the lines
+        idxs_rows, idxs_checks = np.nonzero(failed)
+        lines = (rows[idxs_rows] + offset + 1).tolist()
+        return ''.join([f"{name}:{line}:{columns_messages[i]}" for line,i in zip(lines, idxs_checks.tolist())]).encode()
+
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _new_counts() -> dict[str, int]:
+        return {"rows": 0, "atoms": 0, "invalid": 0, "errors": 0}
+
+
+    # --------------------------------------------------------------------------
+    def _format_summary(self, path: str, counts: dict[str, int]) -> str:
+        if counts["invalid"]: self._ninvalid += 1
+        return f"{'<stdin>' if path == self.PATH_STDIN else path}: {counts['errors']} errors in {counts['invalid']} of {counts['atoms']} " +\
+            f"atom rows ({counts['rows']} rows)\n"
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import re
+import stat
+import time
+from pathlib import Path
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class Cache:
+    """Files derived from the user's inputs (e.g. decompressed copies), kept across sessions.
+    Entries are keyed by the resolved path, size and modification time of their source,
+    so editing or replacing a source file invalidates them.
+    The whole cache is kept under a size limit by removing the least recently used entries."""
+    NAME_DIR = "molprisma"
+    MAX_BYTES = 1 << 34 # 16 GiB, unless $MOLPRISMA_CACHE_MAX_BYTES says otherwise
+    SUFFIX_TMP = ".tmp" # entries being written
+    SECONDS_STALE_TMP = 24 * 3600 # temporary files older than this were left behind by interrupted writes
+    NSAMPLES_FINGERPRINT = 16
+    REGEX_ENTRY = re.compile(rf"[0-9a-f]{{40}}(\.\w+)(\.\d+{re.escape(SUFFIX_TMP)})?") # sha1 key, suffix, and the pid of the writer for temporary files
+    NBYTES_SAMPLE = 1 << 16
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_dir(cls) -> Path:
+        """$MOLPRISMA_CACHE_DIR if set, otherwise a 'molprisma' folder in $XDG_CACHE_HOME (~/.cache by default)"""
+        path = os.environ.get("MOLPRISMA_CACHE_DIR", None)
+        if path: return Path(path)
+        return Path(os.environ.get("XDG_CACHE_HOME", None) or Path.home() / ".cache") / cls.NAME_DIR
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_max_bytes(cls) -> int:
+        """$MOLPRISMA_CACHE_MAX_BYTES if set to an integer, otherwise MAX_BYTES"""
+        value = os.environ.get("MOLPRISMA_CACHE_MAX_BYTES", None)
+        try: return int(value) if value else cls.MAX_BYTES
+        except ValueError: return cls.MAX_BYTES
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_path(cls, path_source: str | Path, suffix: str) -> Path:
+        """Path of the cache entry derived from 'path_source' (which might not exist yet)"""
+        path_source = Path(path_source).resolve()
+        stat = path_source.stat()
+        key = hashlib.sha1(f"{path_source}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+        return cls.get_dir() / f"{key}{suffix}"
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def find(cls, path_source: str | Path, suffix: str) -> Path | None:
+        """Path of the cache entry derived from 'path_source', or None if there's no such entry.
+        Found entries are marked as recently used."""
+        path = cls.get_path(path_source, suffix)
+        if not path.is_file(): return
+        try: os.utime(path)
+        except OSError: pass
+        return path
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_fingerprint(cls, path: str | Path) -> str:
+        """Hash of the size and some evenly spaced blocks of the file at 'path'. It's cheap even for huge files,
+        and catches contents replaced without changing the size or modification time (e.g. copied preserving them)."""
+        size = Path(path).stat().st_size
+        digest = hashlib.sha1(str(size).encode())
+        with open(path, "rb") as file:
+            step = max(size // cls.NSAMPLES_FINGERPRINT, cls.NBYTES_SAMPLE)
+            for offset in range(0, size, step):
+                file.seek(offset)
+                digest.update(file.read(cls.NBYTES_SAMPLE))
+            file.seek(max(size - cls.NBYTES_SAMPLE, 0))
+            digest.update(file.read(cls.NBYTES_SAMPLE))
+        return digest.hexdigest()
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def evict(cls, keep: str | Path | None = None):
+        """Remove the least recently used entries (but 'keep') until the cache fits in get_max_bytes().
+        Entries being written are left alone, unless they're stale. Only the files written by this package are considered,
+        as the directory might be shared with others (e.g. $MOLPRISMA_CACHE_DIR pointing to /tmp)."""
+        entries = []
+        now = time.time()
+        suffixes = (mp.MolCache.SUFFIX, mp.ParserPDB.SUFFIX_SIDECAR, mp.ParserCIF.SUFFIX_SIDECAR)
+        try:
+            for path in cls.get_dir().iterdir():
+                match = cls.REGEX_ENTRY.fullmatch(path.name)
+                if match is None or match[1] not in suffixes: continue
+                info = path.lstat()
+                if not stat.S_ISREG(info.st_mode): continue
+                if match[2] is not None:
+                    if now - info.st_mtime > cls.SECONDS_STALE_TMP: cls.remove(path)
+                    continue
+                entries.append((info.st_mtime, info.st_size, path))
+        except OSError:
+            return
+
+        nbytes = sum(size for _,size,_ in entries)
+        for _,size,path in sorted(entries):
+            if nbytes <= cls.get_max_bytes(): break
+            if keep is not None and path == Path(keep): continue
+            cls.remove(path)
+            nbytes -= size
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def remove(path: str | Path):
+        try: os.remove(path)
+        except OSError: pass
+
+
+# //////////////////////////////////////////////////////////////////////////////
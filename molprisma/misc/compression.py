@@ -0,0 +1,35 @@
+import bz2
+import gzip
+import lzma
+from pathlib import Path
+
+# //////////////////////////////////////////////////////////////////////////////
+class Compression:
+    """Detection and streaming decompression of gzip/bz2/xz files, based on their magic bytes (not their extension)"""
+    MAGIC_BYTES = {
+        "gzip": b"\x1f\x8b",
+        "bz2" : b"BZh",
+        "xz"  : b"\xfd7zXZ\x00",
+    }
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def detect(cls, path: str | Path) -> str | None:
+        """Return the compression format of the file at 'path', or None if it isn't compressed"""
+        with open(path, "rb") as file:
+            head = file.read(max(map(len, cls.MAGIC_BYTES.values())))
+        return next((name for name,magic in cls.MAGIC_BYTES.items() if head.startswith(magic)), None)
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def open(fileobj, compression: str):
+        """Wrap the binary file object 'fileobj' into a decompressing one.
+        The position of 'fileobj' keeps telling how much of the compressed stream has been consumed."""
+        match compression:
+            case "gzip": return gzip.GzipFile(fileobj = fileobj, mode = "rb")
+            case "bz2" : return bz2.BZ2File(fileobj, mode = "rb")
+            case "xz"  : return lzma.LZMAFile(fileobj, mode = "rb")
+            case _: raise ValueError(f"Unknown compression format: '{compression}'")
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,183 @@
+import cProfile
+import functools
+import inspect
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class Profiler:
+    """Opt-in instrumentation of the stages behind parsing, filtering and every frame of the viewer, for performance bug reports.
+    While started, the methods listed in STAGES are replaced by timed wrappers (so nothing is paid when profiling is off),
+    each call being a sample of its "Class.method" stage. Generators are timed while producing items, and their items counted.
+    Stage times are inclusive (e.g. 'ParserPDB.parse' contains 'ParserPDB.iter_parse'), and stages run by background threads
+    (e.g. parsing the rest of a file) are recorded too. Frames are reported by the viewer itself (see 'end_frame').
+
+    On stop, a JSON report (environment, stage and frame summaries, every frame) is written to 'path'.
+    If 'path' ends with one of SUFFIXES_PSTATS, the main thread also runs under cProfile, whose stats are written there instead
+    (loadable with 'pstats' or tools like snakeviz), and the JSON report goes next to it."""
+    ENV_PATH = "MOLPRISMA_PROFILE" # path of the report, profiling the viewer when set
+    SUFFIXES_PSTATS = (".prof", ".pstats")
+    NFRAMES_RECENT = 512 # frames summarized by the overlay
+    STAGE_ROWS = "MolData.iter_lines" # the items of this stage are the rows scanned by a frame
+    STAGES = {
+        "ParserPDB": ("parse", "iter_parse", "_load_cache", "_store_cache"),
+        "ParserCIF": ("parse", "iter_parse", "_load_cache", "_store_cache"),
+        "MolData": (
+            "init_filters", "update_filters", "next_filter", "set_model", "_get_filter_choices",
+            "get_visible_rows", "count_lines", "iter_lines", "get_line", "get_stats", "get_filter_counts", "validate", "export",
+            "next_group", "set_fold", "toggle_expanded",
+        ),
+        "TUIMolPrisma": (
+            "on_update", "_handle_keys", "_handle_key_press",
+            "_draw_lsect_body", "_draw_lsect_footer", "_draw_rsect_top", "_draw_rsect_stats", "_draw_rsect_bottom",
+            "_get_attr_array", "_render",
+        ),
+    }
+
+    # --------------------------------------------------------------------------
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._samples: dict[str, list[float]] = {} # seconds of every call, by stage
+        self._nitems: dict[str, int] = {} # items produced by generator stages
+        self._frames: list[tuple[float, float, int, bool]] = [] # (start, seconds, rows scanned, rendered)
+        self._recent: deque[float] = deque(maxlen = self.NFRAMES_RECENT)
+        self._nrows_frame = 0
+        self._originals: list[tuple[type, str, object]] = [] # (class, method name, attribute in the class' own dict or None)
+        self._cprofile: cProfile.Profile | None = None
+        self._t_start = 0.0
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def from_env(cls) -> "Profiler | None":
+        path = os.environ.get(cls.ENV_PATH)
+        return cls(path) if path else None
+
+    # --------------------------------------------------------------------------
+    def start(self):
+        self._t_start = time.perf_counter()
+        for name_class, names in self.STAGES.items():
+            cls = getattr(mp, name_class)
+            for name in names:
+                func = getattr(cls, name)
+                self._originals.append((cls, name, cls.__dict__.get(name)))
+                setattr(cls, name, self._wrap(f"{name_class}.{name}", func))
+
+        if self.path.suffix in self.SUFFIXES_PSTATS:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    # --------------------------------------------------------------------------
+    def stop(self):
+        """Restore the original methods and write the report(s)"""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        for cls,name,original in reversed(self._originals):
+            if original is None: delattr(cls, name) # inherited
+            else: setattr(cls, name, original)
+        self._originals.clear()
+
+        path_json = self.path
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(self.path)
+            path_json = self.path.with_suffix(".json")
+        path_json.write_text(json.dumps(self.get_report(), indent = 1))
+
+    # --------------------------------------------------------------------------
+    def end_frame(self, t_start: float, rendered: bool):
+        """Record a frame of the viewer that started at 't_start' (a time.perf_counter value) and ends now"""
+        seconds = time.perf_counter() - t_start
+        with self._lock:
+            self._frames.append((t_start - self._t_start, seconds, self._nrows_frame, rendered))
+            self._recent.append(seconds)
+            self._nrows_frame = 0
+
+    # --------------------------------------------------------------------------
+    def get_overlay(self) -> str:
+        """Summary of the last frame and the recent ones, as shown by the viewer"""
+        with self._lock:
+            if not self._frames: return " profiling... "
+            _, seconds, nrows, _ = self._frames[-1]
+            p50, p99 = np.percentile(self._recent, (50, 99)) * 1e3
+        return f" frame {seconds * 1e3:.1f} ms  p50 {p50:.1f}  p99 {p99:.1f}  {nrows} rows "
+
+    # --------------------------------------------------------------------------
+    def get_report(self) -> dict:
+        with self._lock:
+            return {
+                "argv": sys.argv,
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "seconds": time.perf_counter() - self._t_start,
+                "frames": self._summarize([f[1] for f in self._frames]) | {
+                    "rendered": sum(f[3] for f in self._frames),
+                    "all": [
+                        {"t_ms": t * 1e3, "ms": seconds * 1e3, "rows": nrows, "rendered": rendered}
+                        for t,seconds,nrows,rendered in self._frames
+                    ],
+                },
+                "stages": {
+                    stage: self._summarize(samples) | ({"items": self._nitems[stage]} if stage in self._nitems else {})
+                    for stage,samples in sorted(self._samples.items(), key = lambda item: -sum(item[1]))
+                },
+            }
+
+    # --------------------------------------------------------------------------
+    def _record(self, stage: str, seconds: float, nitems: int | None = None):
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+            if nitems is None: return
+            self._nitems[stage] = self._nitems.get(stage, 0) + nitems
+            if stage == self.STAGE_ROWS: self._nrows_frame += nitems
+
+    # --------------------------------------------------------------------------
+    def _wrap(self, stage: str, func: callable) -> callable:
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                seconds, nitems = 0.0, 0
+                generator = func(*args, **kwargs)
+                try:
+                    while True:
+                        t = time.perf_counter()
+                        try: item = next(generator)
+                        except StopIteration: return
+                        finally: seconds += time.perf_counter() - t
+                        nitems += 1
+                        yield item
+                finally: # also when the caller stops early
+                    generator.close()
+                    self._record(stage, seconds, nitems)
+            return wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            t = time.perf_counter()
+            try: return func(*args, **kwargs)
+            finally: self._record(stage, time.perf_counter() - t)
+        return wrapper
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _summarize(samples: list[float]) -> dict:
+        if not samples: return {"calls": 0}
+        ms = np.asarray(samples) * 1e3
+        p50, p99 = np.percentile(ms, (50, 99))
+        return {
+            "calls": len(ms), "total_ms": float(ms.sum()), "mean_ms": float(ms.mean()),
+            "p50_ms": float(p50), "p99_ms": float(p99), "max_ms": float(ms.max()),
+        }
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -1,3 +1,5 @@
+import numpy as np
+
 # //////////////////////////////////////////////////////////////////////////////
 class Utils:
     @staticmethod
@@ -13,5 +15,42 @@ class Utils:
         if current is None: return 0
         return current + 1
 
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def ensure_capacity(arr: np.ndarray, size: int) -> np.ndarray:
+        """Return 'arr' itself or a geometrically grown copy of it, able to hold at least 'size' rows"""
+        if len(arr) >= size: return arr
+        grown = np.empty((max(size, 2 * len(arr)),) + arr.shape[1:], dtype = arr.dtype)
+        grown[:len(arr)] = arr
+        return grown
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def unique_bytes(arr: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Same as np.unique(arr, return_inverse = True) for fixed-width bytes arrays, but much faster:
+        values are reinterpreted as big-endian integers (which preserves their lexicographic order) before sorting"""
+        width = arr.dtype.itemsize
+        nbytes_int = next((n for n in (1, 2, 4, 8) if n >= width), None)
+        if nbytes_int is None:
+            return np.unique(arr, return_inverse = True)
+
+        padded = np.zeros((len(arr), nbytes_int), dtype = np.uint8)
+        padded[:,:width] = np.ascontiguousarray(arr).view(np.uint8).reshape(len(arr), width)
+        ints = padded.view(f">u{nbytes_int}")[:,0]
+
+        if nbytes_int <= 2: # small domain, a lookup table avoids sorting
+            counts = np.bincount(ints, minlength = 1 << (8 * nbytes_int))
+            values = np.flatnonzero(counts)
+            lut = np.zeros(len(counts), dtype = np.int64)
+            lut[values] = np.arange(len(values))
+            inverse = lut[ints]
+        else:
+            values, inverse = np.unique(ints, return_inverse = True)
+
+        values = np.ascontiguousarray(values.astype(f">u{nbytes_int}")).view(np.uint8).reshape(len(values), nbytes_int)
+        values = np.ascontiguousarray(values[:,:width]).view(arr.dtype)[:,0]
+        dtype_inverse = np.int16 if len(values) < np.iinfo(np.int16).max else np.int32
+        return values, inverse.astype(dtype_inverse)
+
 
 # //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,71 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+from pathlib import Path
+
+# //////////////////////////////////////////////////////////////////////////////
+class Watcher:
+    """Waits for a file to be written: through inotify on Linux, or by just sleeping elsewhere (i.e. polling the file).
+    Either way, waits are bounded by a timeout, so the caller can check the file and whether to stop regularly."""
+    IN_MODIFY      = 0x002
+    IN_ATTRIB      = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVE_SELF   = 0x800
+    IN_DELETE_SELF = 0x400
+    NBYTES_EVENTS = 1 << 12
+
+    # --------------------------------------------------------------------------
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._fd: int | None = self._init_inotify()
+
+    # --------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # --------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # --------------------------------------------------------------------------
+    def is_polling(self) -> bool:
+        return self._fd is None
+
+    # --------------------------------------------------------------------------
+    def wait(self, timeout: float):
+        """Block until the file is written to (or replaced, or deleted), or 'timeout' seconds pass"""
+        if self._fd is None:
+            time.sleep(timeout)
+            return
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if readable:
+            try: os.read(self._fd, self.NBYTES_EVENTS) # the events themselves don't matter, the file is checked anyway
+            except BlockingIOError: pass
+
+    # --------------------------------------------------------------------------
+    def close(self):
+        if self._fd is None: return
+        os.close(self._fd)
+        self._fd = None
+
+    # --------------------------------------------------------------------------
+    def _init_inotify(self) -> int | None:
+        """Return an inotify file descriptor watching the file, or None if inotify isn't available"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno = True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError, TypeError): # e.g. not on Linux
+            return
+
+        fd = init(os.O_NONBLOCK | os.O_CLOEXEC) # same values as IN_NONBLOCK and IN_CLOEXEC
+        if fd < 0: return
+        mask = self.IN_MODIFY | self.IN_ATTRIB | self.IN_CLOSE_WRITE | self.IN_MOVE_SELF | self.IN_DELETE_SELF
+        if add_watch(fd, os.fsencode(self.path), mask) < 0:
+            os.close(fd)
+            return
+        return fd
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,279 @@
+import abc
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class Parser(abc.ABC):
+    """Base class of the parsers: reads (or memory-maps, or decompresses) a file as chunks of whole rows,
+    which subclasses turn into the rows of a MolData in 'iter_parse'"""
+    NBYTES_LAZY = 1 << 28 # files bigger than this are memory-mapped instead of read, unless told otherwise
+    NBYTES_FIRST_CHUNK = 1 << 20 # kept small, so that the first screen is available as soon as possible
+    NBYTES_CHUNK = 1 << 25
+    NBYTES_SIDECAR = 1 << 24 # compressed files bigger than this get their decompressed copy cached for later opens
+    NBYTES_CACHE = 1 << 24 # files bigger than this get their parsed data cached for later opens (see MolCache)
+    SUFFIX_SIDECAR = ""
+    TEXT_FROM_FILE = False # whether the rows' text is the (decompressed) file itself, at the same offsets
+    SECONDS_FOLLOW = 0.25 # followed files are checked for new rows at least this often
+
+    # --------------------------------------------------------------------------
+    def __init__(self, path: str | Path, lazy: bool | None = None, cache: bool | None = None, follow: bool = False):
+        """If 'lazy' is True, the file is memory-mapped and its rows only decoded when needed.
+        If it's None, this is decided based on the file size.
+        Compressed files (gzip/bz2/xz) are decompressed while parsing, unless a decompressed copy was cached by a previous open:
+        in that case the copy is read instead (and memory-mapped if big enough).
+        If 'cache' is True, the parsed data is loaded from the MolCache entry of the file when there's a valid one
+        (memory-mapping it, whatever 'lazy' says), or stored there once parsed. If it's None, this is decided based on the file size.
+        If 'follow' is True, parse_async keeps watching the file once parsed, appending the rows written to it afterwards until cancelled
+        (e.g. a running simulation's output). Followed files are always memory-mapped and never cached, see also 'can_follow'."""
+        if follow and not self.can_follow(path):
+            raise ValueError(f"'{path}' can't be followed: only uncompressed files whose rows are their own text (e.g. PDB) can")
+        self.path = Path(path)
+        self.follow = follow
+        self.compression = mp.Compression.detect(self.path)
+        self._path_data: Path | None = self.path if self.compression is None else \
+            mp.Cache.find(self.path, self.SUFFIX_SIDECAR) # None if the file has to be decompressed
+
+        nbytes = self._path_data.stat().st_size if self._path_data is not None else 0
+        self.lazy = (nbytes > self.NBYTES_LAZY) if lazy is None else lazy
+        if cache is None: cache = self.path.stat().st_size > self.NBYTES_CACHE
+        if follow: self.lazy, cache = True, False
+        self._cache: mp.MolCache | None = mp.MolCache(self.path, type(self).__name__) if cache else None
+        self._mol = mp.MolData(self.path.name)
+        self._thread: threading.Thread | None = None
+        self._cancelled = threading.Event()
+        self._error: BaseException | None = None
+
+
+    # --------------------------------------------------------------------------
+    def parse(self) -> mp.MolData:
+        assert not self.follow, "Followed files never end, parse them with parse_async"
+        if self._load_cache(): return self._mol
+        for _ in self.iter_parse(): pass
+        self._store_cache()
+        return self._mol
+
+
+    # --------------------------------------------------------------------------
+    def parse_async(self) -> mp.MolData:
+        """Parse the first chunk of the file right away, and the rest of it on a background thread.
+        The returned MolData grows meanwhile: hold its 'lock' while using it, and check its 'progress'.
+        Once parsed, the MolData is stored in the cache (if enabled) on the same thread."""
+        if self._load_cache(): return self._mol
+        chunks = self.iter_parse()
+        next(chunks, None)
+
+        self._cancelled.clear()
+        self._thread = threading.Thread(target = self._parse_remaining, args = (chunks,), daemon = True)
+        self._thread.start()
+        return self._mol
+
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def can_follow(cls, path: str | Path) -> bool:
+        """Whether the file at 'path' can be followed: its rows must be its own text, so that new ones are just memory-mapped"""
+        return cls.TEXT_FROM_FILE and mp.Compression.detect(path) is None
+
+
+    # --------------------------------------------------------------------------
+    def cancel(self):
+        """Stop a background parsing started by parse_async, leaving the MolData incomplete"""
+        self._cancelled.set()
+
+
+    # --------------------------------------------------------------------------
+    def is_done(self) -> bool:
+        """Whether the background thread started by parse_async (if any) is over, i.e. join won't block"""
+        return self._thread is None or not self._thread.is_alive()
+
+
+    # --------------------------------------------------------------------------
+    def join(self):
+        """Wait for a background parsing to finish, re-raising any error it found"""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+    # --------------------------------------------------------------------------
+    @abc.abstractmethod
+    def iter_parse(self):
+        """Parse the file chunk by chunk, yielding the fraction of it parsed so far after each chunk"""
+
+
+    # --------------------------------------------------------------------------
+    def _parse_remaining(self, chunks):
+        try:
+            for _ in chunks:
+                if self._cancelled.is_set(): return
+            self._store_cache()
+        except BaseException as e:
+            self._error = e
+            with self._mol.lock:
+                self._mol.progress = 1.0 # stop waiting for more rows
+
+
+    # --------------------------------------------------------------------------
+    def _load_cache(self) -> bool:
+        """Replace the MolData by the one stored in the cache, if any. Returns whether it was found."""
+        mol = self._cache.load() if self._cache is not None else None
+        if mol is None: return False
+        self._mol = mol
+        return True
+
+
+    # --------------------------------------------------------------------------
+    def _store_cache(self):
+        if self._cache is None: return
+        path_text = self._path_data if self.TEXT_FROM_FILE else None
+        self._cache.store(self._mol, path_text, self._cancelled.is_set)
+
+
+    # --------------------------------------------------------------------------
+    def _iter_chunks(self):
+        """Yield the (data, lo, hi, progress) byte ranges of consecutive chunks of whole rows of the file"""
+        if self.follow:
+            yield from self._iter_chunks_follow()
+        elif self._path_data is None:
+            yield from self._iter_chunks_compressed()
+        else:
+            yield from self._iter_chunks_plain()
+
+
+    # --------------------------------------------------------------------------
+    def _iter_chunks_plain(self):
+        """Same as _iter_chunks, but all the chunks share the same 'data' array.
+        Unless lazy, the file is read progressively: 'data' is only guaranteed to be filled up to 'hi' on each chunk."""
+        size = self._path_data.stat().st_size
+        if not size: return
+
+        with open(self._path_data, "rb") as file:
+            if self.lazy:
+                data = np.memmap(file, dtype = np.uint8, mode = 'r', shape = (size,))
+                nread = size
+            else:
+                data = np.empty(size, dtype = np.uint8)
+                nread = 0
+
+            lo, nbytes = 0, self.NBYTES_FIRST_CHUNK
+            while lo < size:
+                hi = min(lo + nbytes, size)
+                while nread < hi:
+                    n = file.readinto(memoryview(data)[nread:hi])
+                    if not n: raise EOFError(f"'{self._path_data}' was truncated while being read")
+                    nread += n
+
+                if hi < size: # cut the chunk after its last complete row
+                    newlines = np.flatnonzero(data[lo:hi] == mp.MolBuffer.CHAR_NEWLINE)
+                    if not len(newlines): # rows longer than the chunk, try again with a bigger one
+                        nbytes *= 2
+                        continue
+                    hi = lo + int(newlines[-1]) + 1
+
+                yield data, lo, hi, hi / size
+                lo, nbytes = hi, self.NBYTES_CHUNK
+
+
+    # --------------------------------------------------------------------------
+    def _iter_chunks_follow(self):
+        """Same as _iter_chunks_plain (memory-mapping the file), but instead of stopping at its end, wait for rows appended to it
+        and yield them as new chunks, until cancelled. Each chunk maps the file again, as it grew: MolBuffer.extend takes it for the same data.
+        The MolData is marked as 'following' meanwhile, and its progress set to 1 once the rows present when opened are parsed.
+        An incomplete last row is left for later, as it might still be being written.
+        If the file shrinks (e.g. it was written again from scratch), the MolData is emptied and the file parsed again from its start."""
+        with self._mol.lock:
+            self._mol.following = True
+        lo, nbytes = 0, self.NBYTES_FIRST_CHUNK
+        size_initial = self._path_data.stat().st_size
+        try:
+            with mp.Watcher(self._path_data) as watcher:
+                while not self._cancelled.is_set():
+                    size = self._path_data.stat().st_size
+                    if size < lo:
+                        with self._mol.lock:
+                            self._mol.reset()
+                            self._mol.init_sections()
+                            self._mol.progress = 0.0
+                        lo, nbytes, size_initial = 0, self.NBYTES_FIRST_CHUNK, size
+                        continue
+
+                    hi = min(lo + nbytes, size)
+                    data = np.memmap(self._path_data, dtype = np.uint8, mode = 'r', shape = (size,)) if size else None
+                    newlines = np.flatnonzero(data[lo:hi] == mp.MolBuffer.CHAR_NEWLINE) if hi > lo else ()
+                    if len(newlines):
+                        hi = lo + int(newlines[-1]) + 1
+                        yield data, lo, hi, min(hi / size_initial, 1.0) if size_initial else 1.0
+                        lo, nbytes = hi, self.NBYTES_CHUNK
+                    elif hi < size: # rows longer than the chunk, try again with a bigger one
+                        nbytes *= 2
+                    else: # up to date, wait for more rows
+                        with self._mol.lock:
+                            self._mol.progress = 1.0
+                        watcher.wait(self.SECONDS_FOLLOW)
+        finally:
+            with self._mol.lock:
+                self._mol.following = False
+
+
+    # --------------------------------------------------------------------------
+    def _iter_chunks_compressed(self):
+        """Same as _iter_chunks_plain, but decompressing the file on the fly: each chunk comes in its own 'data' array.
+        Big files are also copied into a sidecar cache entry, which later opens read directly instead."""
+        size = self.path.stat().st_size
+        with open(self.path, "rb") as raw, mp.Compression.open(raw, self.compression) as file:
+            path_sidecar = mp.Cache.get_path(self.path, self.SUFFIX_SIDECAR)
+            sidecar = self._open_sidecar(path_sidecar) if size > self.NBYTES_SIDECAR else None
+            completed = False
+            try:
+                tail = np.empty(0, dtype = np.uint8) # incomplete last row of the previous chunk
+                nbytes = self.NBYTES_FIRST_CHUNK
+                while True:
+                    block = file.read(nbytes)
+                    if sidecar is not None: sidecar.write(block)
+                    data = np.concatenate((tail, np.frombuffer(block, dtype = np.uint8)))
+                    if not block: break
+
+                    newlines = np.flatnonzero(data == mp.MolBuffer.CHAR_NEWLINE)
+                    if not len(newlines): # rows longer than the chunk, keep reading
+                        tail = data
+                        continue
+
+                    hi = int(newlines[-1]) + 1
+                    tail = data[hi:].copy()
+                    yield data, 0, hi, raw.tell() / size
+                    nbytes = self.NBYTES_CHUNK
+
+                if len(data): yield data, 0, len(data), 1.0
+                completed = True
+
+            finally:
+                if sidecar is not None:
+                    sidecar.close()
+                    if completed:
+                        os.replace(sidecar.name, path_sidecar)
+                        mp.Cache.evict(keep = path_sidecar)
+                    else: os.remove(sidecar.name)
+
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _open_sidecar(path: Path):
+        """Open a temporary file for the decompressed copy of the input, or return None if the cache isn't writable.
+        It's only moved to 'path' once complete, so concurrent or interrupted opens never leave a partial copy behind."""
+        try:
+            path.parent.mkdir(parents = True, exist_ok = True)
+            return open(f"{path}.{os.getpid()}{mp.Cache.SUFFIX_TMP}", "wb")
+        except OSError:
+            return None
+
+
+# //////////////////////////////////////////////////////////////////////////////
@@ -0,0 +1,328 @@
+import re
+from pathlib import Path
+
+import numpy as np
+
+import molprisma as mp
+
+# //////////////////////////////////////////////////////////////////////////////
+class ParserCIF(mp.Parser):
+    """Parser of mmCIF/PDBx files. The rows of the '_atom_site' loop become ATOM/HETATM rows, displayed as PDB-like
+    fixed-width records but with their sections parsed from the whole tokens (so e.g. long chain IDs aren't truncated).
+    Every other line of the file is kept as metadata."""
+    SUFFIXES = (".cif", ".mmcif")
+    SUFFIX_SIDECAR = ".cif"
+
+    PREFIX_ATOM_SITE = b"_atom_site."
+    TAG_GROUP = "group_PDB"
+    TAG_MODEL = "pdbx_PDB_model_num"
+    TAGS_SECTIONS = { # PDB section: mmCIF tags, by order of preference
+        "SERIAL_NUM"            : ("id",),
+        "ATOM_NAME"             : ("auth_atom_id", "label_atom_id"),
+        "ALTLOC"                : ("label_alt_id",),
+        "RESIDUE_NAME"          : ("auth_comp_id", "label_comp_id"),
+        "CHAIN_ID"              : ("auth_asym_id", "label_asym_id"),
+        "RESIDUE_SEQUENCE_NUM"  : ("auth_seq_id", "label_seq_id"),
+        "RESIDUE_INSERTION_CODE": ("pdbx_PDB_ins_code",),
+        "X_COORDINATES"         : ("Cartn_x",),
+        "Y_COORDINATES"         : ("Cartn_y",),
+        "Z_COORDINATES"         : ("Cartn_z",),
+        "OCCUPANCY"             : ("occupancy",),
+        "TEMPERATURE_FACTOR"    : ("B_iso_or_equiv",),
+        "ELEMENT_SYMBOL"        : ("type_symbol",),
+        "CHARGE"                : ("pdbx_formal_charge",),
+    }
+    SECTIONS_LEFT = ("ATOM_NAME", "ALTLOC", "CHAIN_ID", "RESIDUE_INSERTION_CODE", "CHARGE") # the rest are right-justified
+    CHARS_MISSING = (ord('?'), ord('.')) # single-character values meaning "unknown" or "not applicable"
+    CHARS_QUOTE = (ord('"'), ord("'"))
+
+    RE_TAG = re.compile(rb"^_atom_site\.", re.M)
+    RE_TOKEN = re.compile(rb"""'(?:[^'\n]|'(?=\S))*'|"(?:[^"\n]|"(?=\S))*"|\S+""")
+    PREFIXES_END_LOOP = (b"#", b"loop_", b"_", b"data_", b"global_", b"save_")
+
+    STATE_HEADER = 0 # before the '_atom_site' loop
+    STATE_ATOMS  = 1 # inside of it
+    STATE_FOOTER = 2 # after it
+
+    # --------------------------------------------------------------------------
+    def __init__(self, path_cif: str | Path, lazy: bool | None = None, cache: bool | None = None, follow: bool = False):
+        super().__init__(path_cif, lazy, cache, follow)
+        self._reset_state()
+
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def is_cif(cls, path: str | Path) -> bool:
+        """Whether 'path' looks like a mmCIF file, judging by its suffixes (e.g. '.cif' or '.cif.gz')"""
+        return any(s.lower() in cls.SUFFIXES for s in Path(path).suffixes)
+
+
+    # --------------------------------------------------------------------------
+    def _reset_state(self):
+        self._state = self.STATE_HEADER
+        self._ncols = 0 # number of '_atom_site' tags
+        self._idxs_sections: dict[str, int] = {} # column of the tag used for each PDB section
+        self._idx_group: int | None = None
+        self._idx_model: int | None = None
+        self._model_last: bytes | None = None # model number of the last atom row
+        self._model_first: tuple[int, int | None] | None = None # (row, number) of the first model, registered once a second one appears
+        self._models_found = False
+
+
+    # --------------------------------------------------------------------------
+    def iter_parse(self):
+        """Parse the file chunk by chunk, yielding the fraction of it parsed so far after each chunk.
+        Each chunk is tokenized in bulk, and its '_atom_site' rows are parsed column-wise."""
+        with self._mol.lock:
+            self._mol.reset()
+            self._mol.init_sections()
+            self._mol.progress = 0.0
+        self._reset_state()
+
+        pending = b"" # lines that have to be looked at along with the next chunk
+        for data,lo,hi,progress in self._iter_chunks():
+            text = pending + data[lo:hi].tobytes()
+            pending = text[self._consume(text, final = False):]
+            with self._mol.lock:
+                self._mol.progress = progress
+            yield self._mol.progress
+
+        self._consume(pending, final = True)
+        with self._mol.lock:
+            self._mol.append(mp.MolLine('', mp.MolKind.NONE))
+            self._mol.pad_lines()
+            self._mol.progress = 1.0
+        yield self._mol.progress
+
+
+    # --------------------------------------------------------------------------
+    def _consume(self, text: bytes, final: bool) -> int:
+        """Turn the whole lines of 'text' into rows of the MolData, returning how many bytes were consumed.
+        Unless 'final', the tags of a loop that might continue in the next chunk are left unconsumed."""
+        pos = 0
+        while pos < len(text):
+            if self._state == self.STATE_HEADER:
+                match = self.RE_TAG.search(text, pos)
+                if match is None:
+                    self._extend_meta(text[pos:])
+                    return len(text)
+
+                tags, end = self._read_tags(text, match.start())
+                if end >= len(text) and not final:
+                    self._extend_meta(text[pos:match.start()])
+                    return match.start()
+
+                self._extend_meta(text[pos:end])
+                self._set_tags(tags)
+                self._state = self.STATE_ATOMS
+                pos = end
+
+            elif self._state == self.STATE_ATOMS:
+                end = self._find_loop_end(text, pos)
+                self._extend_atoms(text[pos:end])
+                if end == len(text) and not final: # the loop might continue in the next chunk
+                    return len(text)
+
+                self._close_models()
+                self._state = self.STATE_FOOTER
+                pos = end
+
+            else:
+                self._extend_meta(text[pos:])
+                return len(text)
+        return pos
+
+
+    # --------------------------------------------------------------------------
+    def _read_tags(self, text: bytes, pos: int) -> tuple[list[str], int]:
+        """Read the consecutive '_atom_site.*' tag lines starting at 'pos'. Returns the tags and the position after them."""
+        tags = []
+        while text.startswith(self.PREFIX_ATOM_SITE, pos):
+            end = text.find(b'\n', pos)
+            end = len(text) if end < 0 else end + 1
+            tags.append(text[pos + len(self.PREFIX_ATOM_SITE) : end].split()[0].decode())
+            pos = end
+        return tags, pos
+
+
+    # --------------------------------------------------------------------------
+    def _set_tags(self, tags: list[str]):
+        self._ncols = len(tags)
+        self._idx_group = tags.index(self.TAG_GROUP) if self.TAG_GROUP in tags else None
+        self._idx_model = tags.index(self.TAG_MODEL) if self.TAG_MODEL in tags else None
+        self._idxs_sections = {}
+        for name, candidates in self.TAGS_SECTIONS.items():
+            tag = next((t for t in candidates if t in tags), None)
+            if tag is not None: self._idxs_sections[name] = tags.index(tag)
+
+
+    # --------------------------------------------------------------------------
+    def _extend_meta(self, text: bytes):
+        if not text: return
+        buffer = mp.MolBuffer.from_bytes(text)
+        kinds = np.full(len(buffer), mp.MolKind.META.value, dtype = np.int8)
+        columns = mp.MolColumns.from_buffer(buffer, kinds)
+        with self._mol.lock:
+            nrows = len(self._mol)
+            self._mol.extend_parsed(buffer, columns)
+            self._mol.update_filters(nrows)
+
+
+    # --------------------------------------------------------------------------
+    def _find_loop_end(self, text: bytes, pos: int) -> int:
+        """Position of the first line after 'pos' that doesn't belong to the loop (len(text) if none).
+        Only the lines starting like one of PREFIXES_END_LOOP are compared, which is much faster than a multiline regex."""
+        chars = np.frombuffer(text, dtype = np.uint8)[pos:]
+        starts = np.concatenate(([0], np.flatnonzero(chars[:-1] == mp.MolBuffer.CHAR_NEWLINE) + 1))
+        firsts = chars[starts]
+        candidates = np.zeros(len(starts), dtype = bool)
+        for char in set(prefix[0] for prefix in self.PREFIXES_END_LOOP):
+            candidates |= firsts == char
+
+        for start in starts[candidates].tolist():
+            if text.startswith(self.PREFIXES_END_LOOP, pos + start): return pos + start
+        return len(text)
+
+
+    # --------------------------------------------------------------------------
+    def _extend_atoms(self, text: bytes):
+        chars = np.frombuffer(text, dtype = np.uint8)
+        starts, ends = self._tokenize(chars, text)
+        if not len(starts): return
+
+        ### values such as '?' or '.' are blanked by making them empty
+        firsts = chars[starts]
+        is_missing = (ends - starts == 1) & ((firsts == self.CHARS_MISSING[0]) | (firsts == self.CHARS_MISSING[1]))
+        ends[is_missing] = starts[is_missing]
+
+        if self._idx_group is not None:
+            s, e = starts[:, self._idx_group], ends[:, self._idx_group]
+            is_hete = (e - s == len(b"HETATM")) & (chars[s] == ord('H'))
+        else:
+            is_hete = np.zeros(len(starts), dtype = bool)
+        kinds = np.where(is_hete, mp.MolKind.HETE.value, mp.MolKind.ATOM.value).astype(np.int8)
+
+        ### one matrix per section, justified like in a PDB record and at least as wide
+        fields = {}
+        for name, start, end in mp.MolColumns.iter_layout():
+            idx = self._idxs_sections.get(name, None)
+            if idx is None: continue
+            s, e = starts[:, idx], ends[:, idx]
+            width = max(int((e - s).max()), end - start)
+            fields[name] = self._gather(chars, s, e, width, right = name not in self.SECTIONS_LEFT)
+        columns = mp.MolColumns.from_chars(kinds, fields)
+
+        records = self._format_records(chars, starts, ends, fields)
+        buffer = mp.MolBuffer.from_bytes(records.ravel())
+        with self._mol.lock:
+            nrows = len(self._mol)
+            self._mol.extend_parsed(buffer, columns)
+            if self._idx_model is not None:
+                self._extend_models(chars, starts[:, self._idx_model], ends[:, self._idx_model], nrows)
+            self._mol.update_filters(nrows)
+
+
+    # --------------------------------------------------------------------------
+    def _tokenize(self, chars: np.ndarray, text: bytes) -> tuple[np.ndarray, np.ndarray]:
+        """Return the [start,end[ offsets of every value of the '_atom_site' rows in 'chars', as (nrows, ntags) arrays.
+        Values are found in bulk as runs of non-whitespace characters, which only fails for quoted values holding whitespace:
+        the slower regex tokenizer is used then. Quotes are excluded from the offsets."""
+        is_token = np.concatenate(([False], chars > ord(' '), [False])).view(np.int8)
+        edges = np.diff(is_token)
+        starts = np.flatnonzero(edges == 1)
+        ends   = np.flatnonzero(edges == -1)
+
+        quoted = self._is_quote(chars[starts])
+        if quoted.any():
+            s, e = starts[quoted], ends[quoted]
+            if ((e - s < 2) | (chars[e - 1] != chars[s])).any(): # bulk tokenization split a quoted value
+                spans = np.array([m.span() for m in self.RE_TOKEN.finditer(text)], dtype = np.int64).reshape(-1, 2)
+                starts, ends = spans[:,0].copy(), spans[:,1].copy()
+                quoted = self._is_quote(chars[starts])
+            starts[quoted] += 1
+            ends  [quoted] -= 1
+
+        if len(starts) % self._ncols:
+            raise ValueError(f"Malformed '_atom_site' loop in '{self.path}': {len(starts)} values for {self._ncols} tags")
+        return starts.reshape(-1, self._ncols), ends.reshape(-1, self._ncols)
+
+
+    # --------------------------------------------------------------------------
+    def _extend_models(self, chars: np.ndarray, starts: np.ndarray, ends: np.ndarray, nrows: int):
+        """Register a model wherever the model number changes. A single model isn't registered at all."""
+        width = max(int((ends - starts).max()), 1)
+        numbers = np.char.strip(self._gather(chars, starts, ends, width).view(f"S{width}")[:,0])
+        starts_models = (np.flatnonzero(numbers[1:] != numbers[:-1]) + 1).tolist()
+        if numbers[0] != self._model_last: starts_models.insert(0, 0)
+        self._model_last = numbers[-1]
+
+        rows = [nrows + i for i in starts_models]
+        values = [int(numbers[i]) if numbers[i].isdigit() else None for i in starts_models]
+        if not self._models_found:
+            if self._model_first is None and rows:
+                self._model_first = (rows.pop(0), values.pop(0))
+            if not rows: return
+            rows.insert(0, self._model_first[0])
+            values.insert(0, self._model_first[1])
+            self._models_found = True
+        self._mol.extend_models(rows, values, [])
+
+
+    # --------------------------------------------------------------------------
+    def _close_models(self):
+        if not self._models_found: return
+        with self._mol.lock:
+            self._mol.extend_models([], [], [len(self._mol) - 1])
+
+
+    # --------------------------------------------------------------------------
+    def _format_records(self, chars: np.ndarray, starts: np.ndarray, ends: np.ndarray, fields: dict[str, np.ndarray]) -> np.ndarray:
+        """Build the fixed-width PDB records of the atom rows, as a (nrows, LENGTH_RECORD + 1) uint8 matrix ending in newlines.
+        Values too wide for their section are truncated, but only in the displayed text.
+        'fields' holds the already gathered (and justified) values of every section."""
+        records = np.full((len(starts), mp.LENGTH_RECORD + 1), mp.MolBuffer.CHAR_SPACE, dtype = np.uint8)
+        records[:, -1] = mp.MolBuffer.CHAR_NEWLINE
+        if self._idx_group is not None:
+            records[:, :6] = self._gather(chars, starts[:, self._idx_group], ends[:, self._idx_group], 6)
+
+        for name, start, end in mp.MolColumns.iter_layout():
+            idx = self._idxs_sections.get(name, None)
+            if idx is None: continue
+            width = end - start
+            section = fields[name][:, :width] if name in self.SECTIONS_LEFT else fields[name][:, -width:]
+
+            if name == "ATOM_NAME": # PDB convention: names shorter than 4 characters start at the second column
+                is_short = (ends[:, idx] - starts[:, idx]) < width
+                section = section.copy()
+                section[is_short, 1:] = section[is_short, :-1]
+                section[is_short, 0] = mp.MolBuffer.CHAR_SPACE
+            records[:, start:end] = section
+        return records
+
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _is_quote(cls, chars: np.ndarray) -> np.ndarray:
+        return (chars == cls.CHARS_QUOTE[0]) | (chars == cls.CHARS_QUOTE[1])
+
+
+    # --------------------------------------------------------------------------
+    @staticmethod
+    def _gather(chars: np.ndarray, starts: np.ndarray, ends: np.ndarray, width: int, right: bool = False) -> np.ndarray:
+        """Return a (nrows, width) matrix with the characters [starts,ends[ of 'chars', justified and padded with spaces.
+        Longer values are truncated, keeping their first (or last, if right-justified) characters."""
+        cols = np.arange(width)
+        if right:
+            idxs = ends[:,None] - width + cols[None,:]
+            valid = idxs >= starts[:,None]
+        else:
+            idxs = starts[:,None] + cols[None,:]
+            valid = idxs < ends[:,None]
+
+        np.clip(idxs, 0, max(len(chars) - 1, 0), out = idxs)
+        matrix = chars[idxs]
+        matrix[~valid] = mp.MolBuffer.CHAR_SPACE
+        return matrix
+
+
+# //////////////////////////////////////////////////////////////////////////////
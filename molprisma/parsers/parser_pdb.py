@@ -1,44 +1,90 @@
 from pathlib import Path
 
+import numpy as np
+
 import molprisma as mp
 
 # //////////////////////////////////////////////////////////////////////////////
-class ParserPDB:
+class ParserPDB(mp.Parser):
     KEYWORD_ATOM = "ATOM"
     KEYWORD_HETA = "HETATM"
+    KEYWORD_MODEL = "MODEL "
+    KEYWORD_ENDMDL = "ENDMDL"
+
+    NROWS_CHUNK = 1 << 16
+    SUFFIX_SIDECAR = ".pdb"
+    TEXT_FROM_FILE = True
 
     # --------------------------------------------------------------------------
-    def __init__(self, path_pdb: str | Path):
-        self.path_pdb = Path(path_pdb)
-        self._mol = mp.MolData(self.path_pdb.name)
-        self._raw: list[str] = self.path_pdb.read_text().splitlines()
+    def __init__(self, path_pdb: str | Path, lazy: bool | None = None, cache: bool | None = None, follow: bool = False):
+        super().__init__(path_pdb, lazy, cache, follow)
+        self.path_pdb = self.path
 
 
     # --------------------------------------------------------------------------
-    def parse(self) -> mp.MolData:
-        self._mol.reset()
-        self._parse_lines()
-        self._mol.init_sections()
-        self._mol.init_filters()
-        return self._mol
+    def iter_parse(self):
+        """Parse the file chunk by chunk, yielding the fraction of it parsed so far after each chunk.
+        The sections of each chunk are parsed before taking the MolData's lock, which is only held while appending them."""
+        with self._mol.lock:
+            self._mol.reset()
+            self._mol.init_sections()
+            self._mol.progress = 0.0
+
+        for data,lo,hi,progress in self._iter_chunks():
+            buffer = mp.MolBuffer.from_bytes(data, lo, hi)
+            columns = mp.MolColumns.from_buffer(buffer, self.get_kinds(buffer), self.NROWS_CHUNK)
+            rows_model, numbers, rows_endmdl = self.get_models(buffer)
+            with self._mol.lock:
+                nrows = len(self._mol)
+                self._mol.extend_parsed(buffer, columns)
+                self._mol.extend_models(rows_model + nrows, numbers, rows_endmdl + nrows)
+                self._mol.update_filters(nrows)
+                self._mol.progress = progress
+            yield self._mol.progress
+
+        if self.follow: return # cancelled, the file might still be growing: don't close it
+        with self._mol.lock:
+            self._mol.extend_models([], [], [len(self._mol) - 1]) # close a last MODEL lacking its ENDMDL, if any
+            self._mol.append(mp.MolLine('', mp.MolKind.NONE))
+            self._mol.pad_lines()
+            self._mol.progress = 1.0
+        yield self._mol.progress
 
 
     # --------------------------------------------------------------------------
-    def _parse_lines(self):
-        def get_kind(line: str) -> mp.MolKind:
-            if line.startswith(self.KEYWORD_ATOM):
-                return mp.MolKind.ATOM
-            if line.startswith(self.KEYWORD_HETA):
-                return mp.MolKind.HETE
-            return mp.MolKind.META
-
-        self._mol.extend([
-            mp.MolLine(line.rstrip('\n'), get_kind(line))
-            for line in self._raw
-        ])
-        self._mol.append(mp.MolLine('', mp.MolKind.NONE))
-        self._mol.pad_lines()
+    @classmethod
+    def get_kinds(cls, buffer: mp.MolBuffer, lo: int = 0, hi: int | None = None) -> np.ndarray:
+        """Classify the rows [lo,hi[ of 'buffer' as MolKind values, based on their record keyword"""
+        if hi is None: hi = len(buffer)
+        keywords = cls._get_keywords(buffer, lo, hi)
+
+        kinds = np.full(hi - lo, mp.MolKind.META.value, dtype = np.int8)
+        kinds[np.char.startswith(keywords, cls.KEYWORD_ATOM.encode())] = mp.MolKind.ATOM.value
+        kinds[np.char.startswith(keywords, cls.KEYWORD_HETA.encode())] = mp.MolKind.HETE.value
+        return kinds
+
 
+    # --------------------------------------------------------------------------
+    @classmethod
+    def get_models(cls, buffer: mp.MolBuffer) -> tuple[np.ndarray, list[int | None], np.ndarray]:
+        """Return the rows of 'buffer' holding MODEL records, their serial numbers (None if unreadable) and the rows holding ENDMDL records"""
+        keywords = cls._get_keywords(buffer, 0, len(buffer))
+        rows_model  = np.flatnonzero(keywords == cls.KEYWORD_MODEL.encode())
+        rows_endmdl = np.flatnonzero(keywords == cls.KEYWORD_ENDMDL.encode())
+
+        numbers = []
+        for row in rows_model.tolist():
+            serial = buffer.get_text(row)[len(cls.KEYWORD_MODEL):].strip()
+            numbers.append(int(serial) if serial.isdigit() else None)
+        return rows_model, numbers, rows_endmdl
+
+
+    # --------------------------------------------------------------------------
+    @classmethod
+    def _get_keywords(cls, buffer: mp.MolBuffer, lo: int, hi: int) -> np.ndarray:
+        """Return the first characters of the rows [lo,hi[ of 'buffer', as long as the longest keyword"""
+        len_keyword = max(map(len, (cls.KEYWORD_ATOM, cls.KEYWORD_HETA, cls.KEYWORD_MODEL, cls.KEYWORD_ENDMDL)))
+        return np.ascontiguousarray(buffer.get_records(lo, hi, 0, len_keyword)).view(f"S{len_keyword}")[:,0]
 
 
 # //////////////////////////////////////////////////////////////////////////////
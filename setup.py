@@ -19,7 +19,8 @@ setup(
     url="https://github.com/diegobarmor/molprisma",
     license="MIT",
     packages=find_packages(),
-    install_requires=["prismatui==0.3.2"],
+    install_requires=["prismatui==0.3.2", "numpy>=1.24"],
+    extras_require={"parquet": ["pyarrow"]},
     entry_points={
         "console_scripts": [
             "molprisma=molprisma.__main__:main",